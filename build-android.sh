@@ -126,6 +126,16 @@ echo ""
 echo "🔧 Setting up AdMob Plugin..."
 echo "=================================="
 
+echo ""
+echo "🧩 Compiling experience flows..."
+echo "=================================="
+
+# The game prefers the compiled flows, so a stale one must never ship
+if ! python3 "$ROOT_DIR/tools/compile_flows.py" || ! python3 "$ROOT_DIR/tools/compile_flows.py" --check; then
+	echo "❌ Compiled flows are missing or stale; not exporting."
+	exit 1
+fi
+
 echo ""
 echo "🔨 Building Android APK..."
 echo "=================================="
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Indexed chapter catalogue behind `/dlc/catalog`.
+
+Clients used to download the whole manifest_list.json and filter it
+themselves. The catalogue keeps the chapter list in memory, indexed by tag and
+by required engine version, so the server can answer with just the chapters a
+client can use, one page at a time:
+
+    /dlc/catalog?engine=1.2.0&tag=gospels&free=true&since=2026-01-01&limit=20&cursor=...
+
+- engine   client engine version; keeps chapters whose requires_engine_version
+           is not newer (semver ordering, pre-releases sort before releases)
+- tag      keep chapters carrying this tag (repeat for all-of)
+- free     true / false
+- max_price  upper bound on price_usd
+- since    ISO date or timestamp; keeps chapters updated at or after it
+           (updated_at, falling back to release_date)
+- limit    page size, 1..MAX_LIMIT (default DEFAULT_LIMIT)
+- cursor   opaque value from the previous page's next_cursor
+
+Pages are ordered newest release first, then by chapter id. Cursors encode the
+last chapter's sort key, so a page boundary stays put when chapters are added.
+The index is rebuilt whenever manifest_list.json changes on disk, and rendered
+pages (plain and gzip) are memoised until it does. Chapters with a bad date,
+version or price are skipped; if the file itself cannot be read or parsed, the
+last good index keeps serving.
+"""
+import base64
+import bisect
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+CATALOG_PATH = '/dlc/catalog'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Rendered responses kept per catalogue generation, so repeated queries skip JSON and gzip work
+RENDER_CACHE_SIZE = 256
+SEMVER_RE = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$')
+
+
+class CatalogError(ValueError):
+    """A bad query parameter; reported to the client as HTTP 400."""
+
+
+def version_key(text):
+    """Sortable key for a semantic version ('1.2', '1.2.3', '1.2.3-beta.1')."""
+    match = SEMVER_RE.match(str(text).strip())
+    if not match:
+        raise CatalogError(f'invalid version {text!r}')
+    major, minor, patch, pre = match.groups()
+    core = (int(major), int(minor or 0), int(patch or 0))
+    if not pre:
+        return core + ((1,),)
+    # Numeric identifiers sort before alphanumeric ones (semver rule 11)
+    ids = tuple((0, int(p), '') if p.isdigit() else (1, 0, p) for p in pre.split('.'))
+    return core + ((0,) + ids,)
+
+
+def parse_timestamp(text):
+    """Epoch seconds for an ISO date/datetime or a numeric timestamp."""
+    text = str(text).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise CatalogError(f'invalid timestamp {text!r}')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def _parse_bool(text):
+    value = text.strip().lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    raise CatalogError(f'invalid boolean {text!r}')
+
+
+def _parse_price(value):
+    if isinstance(value, bool):
+        raise CatalogError(f'invalid price_usd {value!r}')
+    try:
+        price = float(value or 0.0)
+    except (TypeError, ValueError):
+        raise CatalogError(f'invalid price_usd {value!r}')
+    if not price >= 0 or price == float('inf'):
+        raise CatalogError(f'invalid price_usd {value!r}')
+    return price
+
+
+def encode_cursor(sort_key):
+    raw = json.dumps(sort_key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        released, chapter_id = json.loads(raw)
+        return float(released), str(chapter_id)
+    except (ValueError, TypeError):
+        raise CatalogError('invalid cursor')
+
+
+def parse_query(query_string):
+    """(limit, engine, free, max_price, since, cursor, tags) for a query string; raises CatalogError.
+
+    A repeated parameter takes its last value, except tag, which is all-of.
+    """
+    params = urllib.parse.parse_qs(query_string, keep_blank_values=False)
+    single = lambda name: params[name][-1] if name in params else None
+    limit = single('limit')
+    try:
+        limit = DEFAULT_LIMIT if limit is None else int(limit)
+    except ValueError:
+        raise CatalogError(f'invalid limit {limit!r}')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise CatalogError(f'limit must be between 1 and {MAX_LIMIT}')
+    engine = version_key(single('engine')) if single('engine') else None
+    free = _parse_bool(single('free')) if single('free') is not None else None
+    max_price = single('max_price')
+    try:
+        max_price = float(max_price) if max_price is not None else None
+    except ValueError:
+        raise CatalogError(f'invalid max_price {max_price!r}')
+    since = parse_timestamp(single('since')) if single('since') else None
+    cursor = decode_cursor(single('cursor')) if single('cursor') else None
+    return limit, engine, free, max_price, since, cursor, tuple(sorted(set(params.get('tag', []))))
+
+
+class CatalogIndex:
+    """In-memory index of manifest_list.json chapters."""
+
+    def __init__(self, manifest_list_path):
+        self.path = manifest_list_path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._bad_stamp = None
+        self.generation = 0
+        self._chapters = []
+        self._sort_keys = []
+        self._by_tag = {}
+        self._engine_order = []
+        self._engine_keys = []
+        self._rendered = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the index if manifest_list.json changed. Returns True if it was rebuilt."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp or stamp == self._bad_stamp:
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                chapters = json.load(fh).get('chapters', [])
+            if not isinstance(chapters, list):
+                raise ValueError('chapters must be a list')
+        except (OSError, ValueError, AttributeError) as e:
+            # Half-written or invalid: keep serving the last good index until the file changes again
+            print(f'[catalog] Cannot load {self.path}, keeping the previous catalogue: {e}')
+            self._bad_stamp = stamp
+            return False
+        entries = []
+        for chapter in chapters:
+            if not isinstance(chapter, dict):
+                print(f'[catalog] Skipping chapter entry {chapter!r}: not an object')
+                continue
+            released = chapter.get('release_date')
+            try:
+                released_at = parse_timestamp(released) if released else 0.0
+                updated = chapter.get('updated_at')
+                updated_at = parse_timestamp(updated) if updated else released_at
+                engine = version_key(chapter.get('requires_engine_version', '0.0.0'))
+                price = _parse_price(chapter.get('price_usd', 0.0))
+                tags = chapter.get('tags', [])
+            except CatalogError as e:
+                print(f"[catalog] Skipping chapter {chapter.get('chapter_id')}: {e}")
+                continue
+            entries.append({
+                'chapter': chapter,
+                # Newest first: negate the release time so ascending order is the page order
+                'sort_key': (-released_at, str(chapter.get('chapter_id', ''))),
+                'updated_at': updated_at,
+                'engine': engine,
+                'tags': frozenset(t for t in tags if isinstance(t, str)) if isinstance(tags, list) else frozenset(),
+                'is_free': bool(chapter.get('is_free', False)),
+                'price': price,
+            })
+        entries.sort(key=lambda e: e['sort_key'])
+        by_tag = {}
+        for pos, entry in enumerate(entries):
+            for tag in entry['tags']:
+                by_tag.setdefault(tag, []).append(pos)
+        engine_order = sorted(range(len(entries)), key=lambda p: entries[p]['engine'])
+        with self._lock:
+            self._chapters = entries
+            self._sort_keys = [e['sort_key'] for e in entries]
+            self._by_tag = by_tag
+            self._engine_order = engine_order
+            self._engine_keys = [entries[p]['engine'] for p in engine_order]
+            self._stamp = stamp
+            self.generation += 1
+            self._rendered.clear()
+        return True
+
+    def query(self, query_string):
+        """Answer a catalogue query. Returns the response dict; raises CatalogError."""
+        return self._answer(parse_query(query_string))
+
+    def _answer(self, parsed):
+        limit, engine, free, max_price, since, cursor, tags = parsed
+        with self._lock:
+            entries, sort_keys = self._chapters, self._sort_keys
+            candidates = None
+            for tag in tags:
+                positions = set(self._by_tag.get(tag, ()))
+                candidates = positions if candidates is None else candidates & positions
+            if engine is not None:
+                usable = set(self._engine_order[:bisect.bisect_right(self._engine_keys, engine)])
+                candidates = usable if candidates is None else candidates & usable
+            generation = self.generation
+
+        start = bisect.bisect_right(sort_keys, cursor) if cursor is not None else 0
+        ordered = range(start, len(entries)) if candidates is None else sorted(p for p in candidates if p >= start)
+        page, more = [], False
+        for pos in ordered:
+            entry = entries[pos]
+            if free is not None and entry['is_free'] != free:
+                continue
+            if max_price is not None and entry['price'] > max_price:
+                continue
+            if since is not None and entry['updated_at'] < since:
+                continue
+            if len(page) == limit:
+                more = True
+                break
+            page.append(entry)
+        return {
+            'catalog_generation': generation,
+            'count': len(page),
+            'chapters': [e['chapter'] for e in page],
+            'next_cursor': encode_cursor(list(page[-1]['sort_key'])) if more else None,
+        }
+
+    def render(self, query_string):
+        """Return (body, gzip body, etag) for a query, memoised per generation. Raises CatalogError."""
+        self.refresh()
+        parsed = parse_query(query_string)
+        with self._lock:
+            # Keyed on the values the query uses, so equivalent query strings share a page
+            key = (self.generation,) + parsed
+            cached = self._rendered.get(key)
+            if cached is not None:
+                self._rendered.move_to_end(key)
+                return cached
+        body = json.dumps(self._answer(parsed), separators=(',', ':')).encode('utf-8')
+        rendered = (body, gzip.compress(body, compresslevel=6, mtime=0),
+                    '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+        with self._lock:
+            self._rendered[key] = rendered
+            while len(self._rendered) > RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return rendered
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Reference client for the content-addressed chunk store (chunk_store.py).
+
+Fetches a chapter's chunk manifest, downloads only the chunks missing from the
+local store, verifies each one against its SHA-256, and then assembles the
+chapter directory by copying files out of the store. Installing a second
+chapter that shares files with the first downloads only what is new.
+
+Store files are made read-only. With --link, installed files are hard links
+to them instead of copies, which saves disk space but means an installed file
+is the shared chunk: rewrite it by replacing it (write a new file, then
+rename), never in place, or every chapter that shares it is corrupted. DLCManager can follow the same steps instead of
+downloading the whole zip. A manifest whose paths leave the install directory,
+or whose chunk ids are not SHA-256 hex digests, is rejected before anything is
+downloaded or written.
+
+Usage:
+    python3 dlc_server/chunk_client.py gospels --url http://127.0.0.1:8000 --store /tmp/dlc_store --dest /tmp/gospels
+    python3 dlc_server/chunk_client.py gospels --store /tmp/dlc_store --dest /tmp/gospels --link
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ChunkError(Exception):
+    pass
+
+
+def fetch(url, timeout):
+    """GET `url`, accepting gzip. Returns the decoded body."""
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip', 'User-Agent': 'dlc-chunk-client'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = response.read()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+    return body
+
+
+class ChunkClient:
+    def __init__(self, base_url, store_dir, timeout=30.0, workers=8, link=False):
+        self.base_url = base_url.rstrip('/')
+        self.store_dir = store_dir
+        self.timeout = timeout
+        self.workers = workers
+        self.link = link
+
+    def chunk_path(self, chunk_id):
+        return os.path.join(self.store_dir, chunk_id[:2], chunk_id)
+
+    def has_chunk(self, chunk_id):
+        return os.path.exists(self.chunk_path(chunk_id))
+
+    def fetch_manifest(self, chapter_id):
+        body = fetch(f'{self.base_url}/dlc/chunks/chapters/{chapter_id}.json', self.timeout)
+        return json.loads(body.decode('utf-8'))
+
+    def download_chunk(self, chunk_id):
+        """Download, verify and store one chunk. Returns the number of bytes stored."""
+        data = fetch(f'{self.base_url}/dlc/chunks/{chunk_id[:2]}/{chunk_id}', self.timeout)
+        if hashlib.sha256(data).hexdigest() != chunk_id:
+            raise ChunkError(f'chunk {chunk_id} failed verification')
+        path = self.chunk_path(chunk_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        # Read-only, so a write through a hard-linked install fails instead of corrupting the chunk
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+        return len(data)
+
+    def _targets(self, manifest, dest_dir):
+        """[(chunk id, target path)] for every manifest entry; rejects the manifest if any entry is unsafe."""
+        root = os.path.realpath(dest_dir)
+        targets = []
+        for entry in manifest['files']:
+            if not isinstance(entry, dict):
+                raise ChunkError(f'manifest entry {entry!r} is not an object')
+            chunk_id, path = entry.get('chunk'), entry.get('path')
+            if not isinstance(chunk_id, str) or not CHUNK_ID_RE.match(chunk_id):
+                raise ChunkError(f'manifest entry {path!r} has an invalid chunk id {chunk_id!r}')
+            if not isinstance(path, str) or not path:
+                raise ChunkError(f'manifest entry for chunk {chunk_id} has no path')
+            if path.startswith('/') or os.path.isabs(path):
+                raise ChunkError(f'manifest path {path!r} is absolute')
+            target = os.path.realpath(os.path.join(root, *path.split('/')))
+            if target == root or os.path.commonpath([root, target]) != root:
+                raise ChunkError(f'manifest path {path!r} leaves the install directory')
+            targets.append((chunk_id, target))
+        return targets
+
+    def install(self, chapter_id, dest_dir):
+        """Make `dest_dir` hold the chapter's files. Returns a summary dict."""
+        manifest = self.fetch_manifest(chapter_id)
+        # Checked before anything is downloaded or written
+        targets = self._targets(manifest, dest_dir)
+        wanted = sorted({chunk_id for chunk_id, _ in targets})
+        missing = [c for c in wanted if not self.has_chunk(c)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            downloaded = sum(pool.map(self.download_chunk, missing))
+
+        for chunk_id, target in targets:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.remove(target)
+            if self.link:
+                try:
+                    os.link(self.chunk_path(chunk_id), target)
+                    continue
+                except OSError:
+                    pass
+            shutil.copyfile(self.chunk_path(chunk_id), target)
+        return {
+            'chapter_id': chapter_id,
+            'version': manifest.get('version', ''),
+            'files': len(manifest['files']),
+            'chunks': len(wanted),
+            'chunks_downloaded': len(missing),
+            'bytes_downloaded': downloaded,
+            'bytes_total': manifest['total_bytes'],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Install DLC chapters from the chunk store')
+    parser.add_argument('chapters', nargs='+', help='Chapter ids to install')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+    parser.add_argument('--store', required=True, help='Local chunk store directory (shared by all chapters)')
+    parser.add_argument('--dest', required=True, help='Install directory; each chapter goes to <dest>/<chapter_id>')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel chunk downloads')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--link', action='store_true',
+                        help='Hard-link installed files to the read-only store instead of copying them')
+    args = parser.parse_args()
+
+    client = ChunkClient(args.url, args.store, args.timeout, args.workers, args.link)
+    for chapter_id in args.chapters:
+        try:
+            result = client.install(chapter_id, os.path.join(args.dest, chapter_id))
+        except (OSError, ValueError, ChunkError, urllib.error.URLError) as e:
+            print(f'{chapter_id}: install failed: {e}', file=sys.stderr)
+            sys.exit(1)
+        print(f"{chapter_id}: {result['files']} file(s) from {result['chunks']} chunk(s); "
+              f"downloaded {result['chunks_downloaded']} chunk(s), "
+              f"{result['bytes_downloaded']} of {result['bytes_total']} bytes")
+
+
+if __name__ == '__main__':
+    main()
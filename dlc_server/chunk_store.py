@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Content-addressed chunk store for DLC chapters.
+
+Every file of a published chapter is stored once under its SHA-256:
+
+    dlc/chunks/<sha[:2]>/<sha>              file contents
+    dlc/chunks/<sha[:2]>/<sha>.gz           gzip sibling for text formats
+    dlc/chunks/chapters/<chapter_id>.json   chunk manifest for a chapter
+
+A chunk manifest lists each file's path, chunk id and size. Files shared
+between chapters (particles, common textures, audio stingers) end up as one
+chunk, so the store grows with unique content rather than with the number of
+chapters. Chunk URLs never change content, so the server marks them immutable,
+and chunk_client.py fetches only the chunks a device does not already have.
+The zip packages are unaffected; this is an optional second way to ship a
+chapter.
+
+Usage:
+    python3 dlc_server/chunk_store.py gospels          # publish one chapter
+    python3 dlc_server/chunk_store.py --all --gc       # publish everything, drop unreferenced chunks
+    python3 dlc_server/chunk_store.py --stats
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+from precompress import GZIP_SUFFIX, build_sibling, is_compressible
+
+DLC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dlc')
+CHAPTERS_DIR = os.path.join(DLC_ROOT, 'chapters')
+CHUNK_ROOT = os.path.join(DLC_ROOT, 'chunks')
+CHUNK_MANIFEST_DIR = 'chapters'
+CHUNK_URL_RE = re.compile(r'/dlc/chunks/[0-9a-f]{2}/[0-9a-f]{64}$')
+CHUNK_MANIFEST_FORMAT = 1
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+IGNORED_NAMES = {'.DS_Store', 'Thumbs.db'}
+READ_SIZE = 1024 * 1024
+
+
+def is_chunk_path(url_path):
+    """True for `/dlc/chunks/<xx>/<sha256>` URLs, whose content can never change."""
+    return CHUNK_URL_RE.search(url_path) is not None
+
+
+def chunk_relpath(chunk_id):
+    return f'{chunk_id[:2]}/{chunk_id}'
+
+
+def hash_file(path):
+    """Return (sha256 hex, size) of a file, read in blocks."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as fh:
+        while True:
+            block = fh.read(READ_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def chapter_files(chapter_dir):
+    """Sorted (relative path, absolute path) pairs, skipping dotfiles and prebuilt .gz siblings."""
+    files = []
+    for dirpath, dirs, names in os.walk(chapter_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        present = set(names)
+        for name in names:
+            if name in IGNORED_NAMES or name.startswith('.'):
+                continue
+            if name.endswith(GZIP_SUFFIX) and name[:-len(GZIP_SUFFIX)] in present:
+                continue
+            path = os.path.join(dirpath, name)
+            files.append((os.path.relpath(path, chapter_dir).replace(os.sep, '/'), path))
+    files.sort()
+    return files
+
+
+def store_chunk(source, chunk_id, chunk_root=CHUNK_ROOT):
+    """Copy `source` into the store as `chunk_id`. Returns True if the chunk was new."""
+    dest = os.path.join(chunk_root, chunk_relpath(chunk_id))
+    if os.path.exists(dest):
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + '.tmp'
+    with open(source, 'rb') as src, open(tmp, 'wb') as out:
+        while True:
+            block = src.read(READ_SIZE)
+            if not block:
+                break
+            out.write(block)
+    os.replace(tmp, dest)
+    if is_compressible(source):
+        build_sibling(dest)
+    return True
+
+
+def _write_if_changed(path, text):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            if fh.read() == text:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+    return True
+
+
+def publish_chapter(chapter_id, chapters_dir=CHAPTERS_DIR, chunk_root=CHUNK_ROOT):
+    """Store a chapter's files as chunks and write its chunk manifest. Returns a summary dict."""
+    chapter_dir = os.path.join(chapters_dir, chapter_id)
+    manifest_path = os.path.join(chapter_dir, 'manifest.json')
+    with open(manifest_path, encoding='utf-8') as fh:
+        version = json.load(fh).get('version', '')
+
+    entries = []
+    added = added_bytes = 0
+    for rel, path in chapter_files(chapter_dir):
+        chunk_id, size = hash_file(path)
+        if store_chunk(path, chunk_id, chunk_root):
+            added += 1
+            added_bytes += size
+        entries.append({'path': rel, 'chunk': chunk_id, 'size': size})
+
+    manifest = {
+        'format': CHUNK_MANIFEST_FORMAT,
+        'chapter_id': chapter_id,
+        'version': version,
+        'total_bytes': sum(e['size'] for e in entries),
+        'files': entries,
+    }
+    out_path = os.path.join(chunk_root, CHUNK_MANIFEST_DIR, f'{chapter_id}.json')
+    _write_if_changed(out_path, json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    return {'files': len(entries), 'chunks_added': added, 'bytes_added': added_bytes,
+            'total_bytes': manifest['total_bytes']}
+
+
+def load_chunk_manifests(chunk_root=CHUNK_ROOT):
+    """{chapter_id: manifest} for every published chapter."""
+    manifests = {}
+    manifest_dir = os.path.join(chunk_root, CHUNK_MANIFEST_DIR)
+    if not os.path.isdir(manifest_dir):
+        return manifests
+    for name in sorted(os.listdir(manifest_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(manifest_dir, name), encoding='utf-8') as fh:
+                manifests[name[:-len('.json')]] = json.load(fh)
+    return manifests
+
+
+def _stored_chunks(chunk_root):
+    """Yield (chunk_id, path) for every chunk file (gzip siblings excluded)."""
+    if not os.path.isdir(chunk_root):
+        return
+    for prefix in sorted(os.listdir(chunk_root)):
+        prefix_dir = os.path.join(chunk_root, prefix)
+        if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for name in sorted(os.listdir(prefix_dir)):
+            if len(name) == 64 and name.startswith(prefix):
+                yield name, os.path.join(prefix_dir, name)
+
+
+def collect_garbage(chunk_root=CHUNK_ROOT):
+    """Delete chunks no chapter manifest references. Returns (chunks removed, bytes freed)."""
+    referenced = {e['chunk'] for m in load_chunk_manifests(chunk_root).values() for e in m['files']}
+    removed = freed = 0
+    for chunk_id, path in list(_stored_chunks(chunk_root)):
+        if chunk_id in referenced:
+            continue
+        freed += os.path.getsize(path)
+        os.remove(path)
+        if os.path.exists(path + GZIP_SUFFIX):
+            os.remove(path + GZIP_SUFFIX)
+        removed += 1
+    return removed, freed
+
+
+def store_stats(chunk_root=CHUNK_ROOT):
+    """Logical bytes across all chapter manifests versus bytes actually stored."""
+    manifests = load_chunk_manifests(chunk_root)
+    stored = {chunk_id: os.path.getsize(path) for chunk_id, path in _stored_chunks(chunk_root)}
+    logical = sum(m['total_bytes'] for m in manifests.values())
+    stored_bytes = sum(stored.values())
+    return {
+        'chapters': len(manifests),
+        'chunks': len(stored),
+        'logical_bytes': logical,
+        'stored_bytes': stored_bytes,
+        'dedup_ratio': round(logical / stored_bytes, 3) if stored_bytes else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish DLC chapters into the content-addressed chunk store')
+    parser.add_argument('chapters', nargs='*', help='Chapter ids (directories under dlc/chapters)')
+    parser.add_argument('--all', action='store_true', help='Publish every chapter directory')
+    parser.add_argument('--gc', action='store_true', help='Remove chunks no chapter manifest references')
+    parser.add_argument('--stats', action='store_true', help='Print store size and deduplication ratio')
+    parser.add_argument('--chunk-root', default=CHUNK_ROOT, help='Store directory (default: dlc/chunks)')
+    args = parser.parse_args()
+
+    chapter_ids = list(args.chapters)
+    if args.all:
+        chapter_ids = sorted(d for d in os.listdir(CHAPTERS_DIR)
+                             if os.path.isdir(os.path.join(CHAPTERS_DIR, d)) and not d.startswith('.'))
+    if not (chapter_ids or args.gc or args.stats):
+        parser.error('name at least one chapter, or pass --all, --gc or --stats')
+
+    for chapter_id in chapter_ids:
+        try:
+            result = publish_chapter(chapter_id, chunk_root=args.chunk_root)
+        except (OSError, ValueError) as e:
+            print(f'{chapter_id}: cannot publish: {e}')
+            sys.exit(2)
+        print(f"{chapter_id}: {result['files']} file(s), {result['total_bytes']} bytes; "
+              f"{result['chunks_added']} new chunk(s), {result['bytes_added']} new bytes")
+    if args.gc:
+        removed, freed = collect_garbage(args.chunk_root)
+        print(f'Removed {removed} unreferenced chunk(s), {freed} bytes')
+    if args.stats:
+        print(json.dumps(store_stats(args.chunk_root), indent=2))
+
+
+if __name__ == '__main__':
+    main()
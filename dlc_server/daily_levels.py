@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Daily-challenge and event levels served from a pre-generated pool.
+
+`/dlc/daily?date=YYYY-MM-DD&event=<name>` returns a level in the usual level
+JSON format. It is built by tools/level_generator.build_level from a seed
+derived from the event and the date, so every client gets the same level for
+a given day. Both parameters are optional; the defaults are today (UTC) and
+the plain daily challenge. The campaign level number that picks the difficulty
+stays internal: every daily is served with level_number DAILY_LEVEL_NUMBER,
+and `challenge` ({event, date, seed}) identifies it.
+
+A background worker keeps the pool of rendered levels (plain and gzip) topped
+up and checks each layout against layout_grammar before it is accepted. A
+request is only ever a dictionary lookup. On a miss the level is queued ahead
+of everything else and the client gets 503 with Retry-After; generation never
+runs on the request path.
+
+The pool's target size follows demand. With more requests per minute, more
+days ahead and behind are kept ready for each active event, so a date rollover
+under load is still served from the pool. Events nobody has asked for in
+EVENT_TTL seconds drop out of the pool, and at most MAX_EVENTS events besides
+the plain daily are active at once. Levels for other dates that clients asked
+for are kept on a least-recently-used basis, up to the same target size. A
+level that fails to generate is retried after FAILURE_BACKOFF seconds.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools')
+if TOOLS_DIR not in sys.path:
+    sys.path.insert(0, TOOLS_DIR)
+
+import level_generator  # noqa: E402
+from layout_grammar import layout_problems  # noqa: E402
+
+DAILY_PATH = '/dlc/daily'
+DEFAULT_EVENT = 'daily'
+EVENT_RE = re.compile(r'^[a-z0-9_-]{1,32}$')
+# Furthest a requested date may be from today, in days
+MAX_DATE_DISTANCE = 366
+MIN_POOL_SIZE = 6
+MAX_POOL_SIZE = 192
+# One more pooled level per this many requests a minute
+REQUESTS_PER_SLOT = 60
+EVENT_TTL = 3600.0
+REFILL_INTERVAL = 1.0
+# Weight of the newest one-second sample in the request-rate average
+RATE_SMOOTHING = 0.2
+# Level numbers whose difficulty curve the daily levels borrow
+DIFFICULTY_RANGE = (20, 70)
+# Served as every daily level's level_number. Progress, stars and rewards are keyed on level_number,
+# so a daily must never carry a campaign or chapter number; clients tell dailies apart by `challenge`
+DAILY_LEVEL_NUMBER = 900000
+MAX_SEED_ATTEMPTS = 5
+# A (event, date) whose generation failed is not retried for this many seconds
+FAILURE_BACKOFF = 60.0
+# Events besides the plain daily that may be active at once; requests for another new event get 400
+MAX_EVENTS = 16
+# Queued on-demand requests; the oldest is dropped beyond this
+MAX_URGENT = MAX_POOL_SIZE
+DAILY_CACHE_CONTROL = 'public, max-age=3600'
+
+
+class DailyLevelError(ValueError):
+    """A bad query parameter; reported to the client as HTTP 400."""
+
+
+def level_seed(event, date):
+    digest = hashlib.sha256(f'{event}:{date.isoformat()}'.encode('utf-8')).hexdigest()
+    return int(digest[:12], 16)
+
+
+def generate_daily_level(event, date):
+    """Build and validate the level for (event, date). Raises RuntimeError if no seed gives a valid level."""
+    base = level_seed(event, date)
+    lo, hi = DIFFICULTY_RANGE
+    for attempt in range(MAX_SEED_ATTEMPTS):
+        seed = base + attempt
+        data, _summary = level_generator.build_level(lo + seed % (hi - lo + 1), seed=seed)
+        problems = layout_problems(data['layout'], data['grid_width'], data['grid_height'], data['num_tile_types'])
+        if data['target_score'] <= 0 or data['max_moves'] <= 0:
+            problems.append('non-positive target_score or max_moves')
+        if not problems:
+            break
+    else:
+        raise RuntimeError(f'no valid level for {event} {date} after {MAX_SEED_ATTEMPTS} seeds: {problems[0]}')
+    label = 'Daily Challenge' if event == DEFAULT_EVENT else event.replace('_', ' ').replace('-', ' ').title()
+    data['title'] = f'{label} {date.isoformat()}'
+    data['level_number'] = DAILY_LEVEL_NUMBER
+    data['challenge'] = {'event': event, 'date': date.isoformat(), 'seed': seed}
+    return data
+
+
+def render_level(data):
+    """(body, gzip body, etag) for a level dict."""
+    body = json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return body, gzip.compress(body, compresslevel=9, mtime=0), '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def utc_today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class DailyLevelPool:
+    def __init__(self, today=utc_today):
+        self._today = today
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pool = OrderedDict()
+        self._urgent = OrderedDict()
+        self._failed = {}
+        self._events = {DEFAULT_EVENT: time.monotonic()}
+        self._window_requests = 0
+        self.rate = 0.0
+        self.target_size = MIN_POOL_SIZE
+        self.counters = {'hits': 0, 'misses': 0, 'generated': 0, 'failures': 0}
+        self.generation_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name='daily-levels', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def parse_query(self, query):
+        """Return (event, date) from query parameters ({name: [values]}). Raises DailyLevelError."""
+        event = query.get('event', [DEFAULT_EVENT])[-1].strip().lower() or DEFAULT_EVENT
+        if not EVENT_RE.match(event):
+            raise DailyLevelError(f'invalid event {event!r}')
+        today = self._today()
+        date_text = query.get('date', [''])[-1].strip()
+        try:
+            date = datetime.date.fromisoformat(date_text) if date_text else today
+        except ValueError:
+            raise DailyLevelError(f'invalid date {date_text!r}')
+        if abs((date - today).days) > MAX_DATE_DISTANCE:
+            raise DailyLevelError(f'date must be within {MAX_DATE_DISTANCE} days of today')
+        now = time.monotonic()
+        with self._lock:
+            if event not in self._events:
+                active = sum(1 for e, seen in self._events.items() if e != DEFAULT_EVENT and now - seen < EVENT_TTL)
+                if active >= MAX_EVENTS:
+                    raise DailyLevelError(f'too many active events (at most {MAX_EVENTS})')
+        return event, date
+
+    def get(self, event, date):
+        """Rendered level for (event, date), or None if it is not pooled yet (it is then queued first)."""
+        key = (event, date)
+        with self._lock:
+            self._window_requests += 1
+            self._events[event] = time.monotonic()
+            rendered = self._pool.get(key)
+            if rendered is not None:
+                self._pool.move_to_end(key)
+                self.counters['hits'] += 1
+                return rendered
+            self.counters['misses'] += 1
+            self._urgent[key] = None
+            self._urgent.move_to_end(key)
+            while len(self._urgent) > MAX_URGENT:
+                self._urgent.popitem(last=False)
+        self._wake.set()
+        return None
+
+    def _desired(self):
+        """Keys the pool should hold, most important first."""
+        today = self._today()
+        now = time.monotonic()
+        with self._lock:
+            events = sorted(e for e, seen in self._events.items() if e == DEFAULT_EVENT or now - seen < EVENT_TTL)
+            self._events = {e: self._events[e] for e in events}
+            target = self.target_size
+        # today, tomorrow, yesterday, +2, -2, ... for each event in turn
+        offsets = [0]
+        for d in range(1, MAX_DATE_DISTANCE + 1):
+            offsets += [d, -d]
+        desired = []
+        for offset in offsets:
+            for event in events:
+                if len(desired) >= target:
+                    return desired
+                desired.append((event, today + datetime.timedelta(days=offset)))
+        return desired
+
+    def _tick(self):
+        with self._lock:
+            sample, self._window_requests = self._window_requests, 0
+            self.rate = RATE_SMOOTHING * (sample / REFILL_INTERVAL) + (1 - RATE_SMOOTHING) * self.rate
+            extra = int(self.rate * 60 / REQUESTS_PER_SLOT)
+            self.target_size = max(MIN_POOL_SIZE, min(MAX_POOL_SIZE, MIN_POOL_SIZE + extra))
+
+    def _next_key(self, desired):
+        """The next key to generate, skipping keys whose generation failed within FAILURE_BACKOFF."""
+        now = time.monotonic()
+        with self._lock:
+            self._failed = {key: retry_at for key, retry_at in self._failed.items() if retry_at > now}
+            while self._urgent:
+                key, _ = self._urgent.popitem(last=False)
+                if key not in self._pool and key not in self._failed:
+                    return key
+            for key in desired:
+                if key not in self._pool and key not in self._failed:
+                    return key
+        return None
+
+    def _trim(self, desired):
+        """Drop least recently used levels outside `desired`, keeping up to target_size of them for on-demand dates."""
+        keep = set(desired)
+        with self._lock:
+            extra = [key for key in self._pool if key not in keep]
+            for key in extra[:max(0, len(extra) - self.target_size)]:
+                del self._pool[key]
+
+    def _run(self):
+        level_generator.VERBOSE = False
+        next_tick = time.monotonic() + REFILL_INTERVAL
+        while not self._stop.is_set():
+            if time.monotonic() >= next_tick:
+                self._tick()
+                next_tick = time.monotonic() + REFILL_INTERVAL
+            desired = self._desired()
+            key = self._next_key(desired)
+            if key is None:
+                self._trim(desired)
+                self._wake.wait(max(0.0, next_tick - time.monotonic()))
+                self._wake.clear()
+                continue
+            started = time.perf_counter()
+            try:
+                rendered = render_level(generate_daily_level(*key))
+            except Exception as e:
+                print(f'[daily] Could not generate {key[0]} {key[1]}: {e}')
+                with self._lock:
+                    self.counters['failures'] += 1
+                    self._failed[key] = time.monotonic() + FAILURE_BACKOFF
+                continue
+            with self._lock:
+                self._pool[key] = rendered
+                self.counters['generated'] += 1
+                self.generation_seconds += time.perf_counter() - started
+
+    def render_metrics(self):
+        """Prometheus text for the pool."""
+        with self._lock:
+            counters = dict(self.counters)
+            size, target, rate, spent = len(self._pool), self.target_size, self.rate, self.generation_seconds
+        out = []
+        for name in ('hits', 'misses', 'generated', 'failures'):
+            out += [f'# TYPE dlc_daily_{name}_total counter', f'dlc_daily_{name}_total {counters[name]}']
+        out += ['# TYPE dlc_daily_pool_size gauge', f'dlc_daily_pool_size {size}',
+                '# TYPE dlc_daily_pool_target gauge', f'dlc_daily_pool_target {target}',
+                '# TYPE dlc_daily_request_rate gauge', f'dlc_daily_request_rate {rate:.3f}',
+                '# TYPE dlc_daily_generation_seconds_total counter', f'dlc_daily_generation_seconds_total {spent:.6f}']
+        return '\n'.join(out) + '\n'
+
+
+if __name__ == '__main__':
+    # Print the level for a date (default today): python3 dlc_server/daily_levels.py [YYYY-MM-DD] [event]
+    level_generator.VERBOSE = False
+    day = datetime.date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else utc_today()
+    print(json.dumps(generate_daily_level(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_EVENT, day), indent=2))
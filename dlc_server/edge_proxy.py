@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Caching reverse proxy for rehearsing CDN behaviour in front of the DLC origin.
+
+Run through `start_server.py --proxy ORIGIN`. Each response is cached on disk
+per URL and content coding:
+- freshness comes from the origin's Cache-Control (s-maxage, max-age,
+  no-cache, no-store, private)
+- stale objects are revalidated with If-None-Match and refreshed on a 304
+- concurrent misses for the same object wait for one origin fetch instead of
+  each going to the origin
+- the cache is bounded by size and evicts least recently used objects first
+- if the origin is unreachable, a stale copy is served rather than an error
+Ranges and conditional requests are answered from the cached full object.
+`/metrics` reports the usual request metrics plus hit, miss, coalescing and
+origin traffic counters, which load_generator.py --metrics turns into offload
+ratios.
+
+The cache directory is emptied at startup; the index lives in memory.
+"""
+import email.utils
+import hashlib
+import http.client
+import http.server
+import itertools
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter, OrderedDict
+
+from file_cache import OpenFileCache, send_range
+from http_cache import accepts_gzip, freshness_lifetime, is_not_modified, parse_range
+from metrics import METRICS_PATH, MetricsHandlerMixin, ServerMetrics
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'dlc_edge_cache')
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+ORIGIN_TIMEOUT = 30.0
+COPY_BLOCK = 256 * 1024
+CACHE_SUFFIX = '.body'
+# Origin response headers stored with an object and replayed to clients
+STORED_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary',
+                  'Access-Control-Allow-Origin', 'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers')
+EDGE_COUNTERS = (
+    ('hits', 'Requests answered from a fresh cached object.'),
+    ('misses', 'Requests that fetched a new object from the origin.'),
+    ('revalidations', 'Stale objects confirmed unchanged by the origin (304).'),
+    ('coalesced', 'Requests that waited for another request\'s origin fetch.'),
+    ('passes', 'Requests relayed without caching (errors, no-store).'),
+    ('stale', 'Stale objects served because the origin failed.'),
+    ('evictions', 'Objects evicted to stay under the size limit.'),
+    ('origin_requests', 'Requests sent to the origin.'),
+    ('origin_bytes', 'Body bytes received from the origin.'),
+    ('origin_errors', 'Origin requests that failed to connect or complete.'),
+)
+
+
+class CachedObject:
+    __slots__ = ('key', 'path', 'size', 'headers', 'stored_at', 'max_age', 'mtime')
+
+    def __init__(self, key, path, size, headers, max_age):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.headers = headers
+        self.stored_at = time.time()
+        self.max_age = max_age
+        last_modified = headers.get('Last-Modified')
+        self.mtime = _parse_http_date(last_modified) if last_modified else None
+
+    def age(self):
+        return max(0, int(time.time() - self.stored_at))
+
+    def is_fresh(self):
+        return time.time() - self.stored_at < self.max_age
+
+
+class Relayed:
+    """An uncacheable origin response, held in memory and relayed as is."""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+def _parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return None
+
+
+class EdgeCache:
+    """Size-bounded LRU of cached origin responses stored as files in `cache_dir`."""
+
+    def __init__(self, origin, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        parsed = urllib.parse.urlsplit(origin)
+        self.origin_host = parsed.hostname or '127.0.0.1'
+        self.origin_port = parsed.port or 80
+        self.origin_prefix = parsed.path.rstrip('/')
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.files = OpenFileCache()
+        self.counters = Counter()
+        self._objects = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generation = itertools.count()
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith(CACHE_SUFFIX) or name.endswith('.tmp'):
+                os.remove(os.path.join(cache_dir, name))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get(self, key, path, gzip_ok):
+        """Return (CachedObject or Relayed, X-Cache result) for `path`, going to the origin at most once per key."""
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is not None and obj.is_fresh():
+                self._objects.move_to_end(key)
+                self.counters['hits'] += 1
+                return obj, 'HIT'
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+        if waiter is not None:
+            waiter.wait(ORIGIN_TIMEOUT)
+            with self._lock:
+                obj = self._objects.get(key)
+                if obj is not None and obj.is_fresh():
+                    self._objects.move_to_end(key)
+                    self.counters['coalesced'] += 1
+                    return obj, 'COALESCED'
+            # The leader's response was not cacheable: fetch our own copy
+            return self._fetch(key, path, gzip_ok, None)
+        try:
+            return self._fetch(key, path, gzip_ok, obj)
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def _fetch(self, key, path, gzip_ok, stale):
+        headers = {'Accept-Encoding': 'gzip' if gzip_ok else 'identity', 'User-Agent': 'dlc-edge-proxy'}
+        if stale is not None and stale.headers.get('ETag'):
+            headers['If-None-Match'] = stale.headers['ETag']
+        conn = http.client.HTTPConnection(self.origin_host, self.origin_port, timeout=ORIGIN_TIMEOUT)
+        self.count('origin_requests')
+        try:
+            conn.request('GET', self.origin_prefix + path, headers=headers)
+            response = conn.getresponse()
+            if response.status == 304 and stale is not None:
+                response.read()
+                stale.stored_at = time.time()
+                stale.max_age = freshness_lifetime(response.getheader('Cache-Control', stale.headers.get('Cache-Control'))) or 0
+                self.count('revalidations')
+                return stale, 'REVALIDATED'
+            kept = {name: response.getheader(name) for name in STORED_HEADERS if response.getheader(name)}
+            max_age = freshness_lifetime(response.getheader('Cache-Control'))
+            if response.status != 200 or max_age is None:
+                body = response.read()
+                self.count('origin_bytes', len(body))
+                self.count('passes')
+                return Relayed(response.status, kept, body), 'PASS'
+            return self._store(key, response, kept, max_age), 'MISS'
+        except (OSError, http.client.HTTPException):
+            self.count('origin_errors')
+            if stale is not None:
+                self.count('stale')
+                return stale, 'STALE'
+            return Relayed(502, {'Content-Type': 'text/plain'}, b'Origin unavailable\n'), 'ERROR'
+        finally:
+            conn.close()
+
+    def _store(self, key, response, headers, max_age):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        path = os.path.join(self.cache_dir, f'{digest}-{next(self._generation)}{CACHE_SUFFIX}')
+        size = 0
+        try:
+            with open(path + '.tmp', 'wb') as fh:
+                while True:
+                    block = response.read(COPY_BLOCK)
+                    if not block:
+                        break
+                    fh.write(block)
+                    size += len(block)
+            os.replace(path + '.tmp', path)
+        except BaseException:
+            # A failed fill must not leave a partial file outside the max_bytes accounting
+            try:
+                os.remove(path + '.tmp')
+            except OSError:
+                pass
+            raise
+        self.count('origin_bytes', size)
+        self.count('misses')
+        obj = CachedObject(key, path, size, headers, max_age)
+        with self._lock:
+            old = self._objects.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+                self._remove(old)
+            self._objects[key] = obj
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._objects) > 1:
+                _, oldest = self._objects.popitem(last=False)
+                self._bytes -= oldest.size
+                self._remove(oldest)
+                self.counters['evictions'] += 1
+        return obj
+
+    def _remove(self, obj):
+        # Open descriptors keep serving an unlinked file until released
+        try:
+            os.remove(obj.path)
+        except OSError:
+            pass
+
+    def render(self):
+        """Prometheus text for the cache counters."""
+        with self._lock:
+            counters = dict(self.counters)
+            objects, stored = len(self._objects), self._bytes
+        out = []
+        for name, help_text in EDGE_COUNTERS:
+            metric = f'edge_{name}_total'
+            out += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter', f'{metric} {counters.get(name, 0)}']
+        out += ['# TYPE edge_cache_objects gauge', f'edge_cache_objects {objects}',
+                '# TYPE edge_cache_bytes gauge', f'edge_cache_bytes {stored}',
+                '# TYPE edge_cache_max_bytes gauge', f'edge_cache_max_bytes {self.max_bytes}']
+        return '\n'.join(out) + '\n'
+
+
+class EdgeRequestHandler(MetricsHandlerMixin, http.server.BaseHTTPRequestHandler):
+    server_version = 'DLCEdge/1.0'
+    metrics = None
+    cache = None
+
+    def do_GET(self):
+        self._serve(head_only=False)
+
+    def do_HEAD(self):
+        self._serve(head_only=True)
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def access_log_extra(self):
+        return {'cache': getattr(self, '_cache_result', None)}
+
+    def _serve(self, head_only):
+        self._cache_result = None
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path == METRICS_PATH:
+            self._send_metrics(head_only)
+            return
+        path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        # Ranges are served from the identity object, as the origin does
+        gzip_ok = accepts_gzip(self.headers) and 'Range' not in self.headers
+        key = f'{path}|{"gzip" if gzip_ok else "identity"}'
+        obj, result = self.cache.get(key, path, gzip_ok)
+        self._cache_result = result
+        if isinstance(obj, Relayed):
+            self._send_relayed(obj, result, head_only)
+            return
+        try:
+            entry = self.cache.files.acquire(obj.path)
+        except OSError:
+            # Evicted between lookup and open: fetch it again
+            obj, result = self.cache.get(key, path, gzip_ok)
+            self._cache_result = result
+            if isinstance(obj, Relayed):
+                self._send_relayed(obj, result, head_only)
+                return
+            try:
+                entry = self.cache.files.acquire(obj.path)
+            except OSError:
+                # Evicted again before it could be opened; give up on this request
+                self._cache_result = 'ERROR'
+                self._send_relayed(Relayed(502, {'Content-Type': 'text/plain'}, b'Cache object unavailable\n'),
+                                   'ERROR', head_only)
+                return
+        try:
+            self._send_object(obj, entry, result, head_only)
+        finally:
+            self.cache.files.release(entry)
+
+    def _send_object(self, obj, entry, result, head_only):
+        headers = obj.headers
+        if is_not_modified(self.headers, headers.get('ETag'), obj.mtime):
+            self.send_response(304)
+            for name in ('ETag', 'Cache-Control', 'Vary'):
+                if name in headers:
+                    self.send_header(name, headers[name])
+            self._send_cache_headers(obj, result)
+            self.end_headers()
+            return
+        offset, length = 0, entry.size
+        byte_range = parse_range(self.headers.get('Range'), entry.size)
+        if byte_range == 'invalid':
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % entry.size)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if byte_range is not None:
+            offset, length = byte_range
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (offset, offset + length - 1, entry.size))
+        else:
+            self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self._send_cache_headers(obj, result)
+        self.end_headers()
+        if not head_only:
+            send_range(self.connection, entry, offset, length)
+            self.wfile.count += length
+
+    def _send_cache_headers(self, obj, result):
+        self.send_header('Age', str(obj.age()))
+        self.send_header('X-Cache', result)
+
+    def _send_relayed(self, relayed, result, head_only):
+        self.send_response(relayed.status)
+        for name, value in relayed.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(relayed.body)))
+        self.send_header('X-Cache', result)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(relayed.body)
+
+    def _send_metrics(self, head_only):
+        body = (self.metrics.render() + self.cache.render()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+
+def make_handler(cache, access_log=None):
+    """A handler class bound to one cache and its own metrics."""
+    return type('BoundEdgeRequestHandler', (EdgeRequestHandler,),
+                {'cache': cache, 'metrics': ServerMetrics(), 'access_log': access_log})
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Bounded LRU of open file descriptors for hot DLC files.
+
+Chapter archives, particle JSON and textures are requested over and over, so
+the server keeps their descriptors open and hands them to `os.sendfile` with
+an explicit offset. Nothing ever seeks a shared descriptor, which keeps one
+descriptor safe to use from several request threads at once.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_OPEN = 64
+SENDFILE_BLOCK = 1024 * 1024
+
+
+class CachedFile:
+    """An open descriptor plus the stat fields it was opened against."""
+
+    def __init__(self, path, fd, st):
+        self.path = path
+        self.fd = fd
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.refs = 0
+        self.evicted = False
+
+
+class OpenFileCache:
+    """LRU of CachedFile entries; evicted entries close once their last user releases them."""
+
+    def __init__(self, max_open=DEFAULT_MAX_OPEN):
+        self.max_open = max_open
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        """Return a CachedFile for `path` with its refcount taken. Raises OSError."""
+        st = os.stat(path)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(path)
+                entry.refs += 1
+                return entry
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        fresh = CachedFile(path, fd, os.fstat(fd))
+        fresh.refs = 1
+        with self._lock:
+            stale = self._entries.pop(path, None)
+            if stale is not None:
+                self._retire(stale)
+            self._entries[path] = fresh
+            while len(self._entries) > self.max_open:
+                _, oldest = self._entries.popitem(last=False)
+                self._retire(oldest)
+        return fresh
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs == 0:
+                os.close(entry.fd)
+
+    def _retire(self, entry):
+        # Caller holds the lock
+        entry.evicted = True
+        if entry.refs == 0:
+            os.close(entry.fd)
+
+    def close_all(self):
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem()
+                self._retire(entry)
+
+
+def send_range(sock, entry, offset, count):
+    """Send `count` bytes of `entry` starting at `offset` to a blocking socket."""
+    if hasattr(os, 'sendfile'):
+        out_fd = sock.fileno()
+        while count > 0:
+            sent = os.sendfile(out_fd, entry.fd, offset, min(count, SENDFILE_BLOCK))
+            if sent == 0:
+                break
+            offset += sent
+            count -= sent
+        return
+    # No sendfile (Windows): fall back to a private handle so the shared fd is never seeked
+    with open(entry.path, 'rb') as fh:
+        fh.seek(offset)
+        while count > 0:
+            chunk = fh.read(min(count, SENDFILE_BLOCK))
+            if not chunk:
+                break
+            sock.sendall(chunk)
+            count -= len(chunk)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+HTTP caching helpers shared by the DLC origin and the edge proxy.
+
+Covers the header rules both sides must agree on: gzip negotiation, single
+byte ranges, entity tags, conditional requests and Cache-Control parsing.
+"""
+import email.utils
+import re
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Freshness the origin grants manifests, zips and other mutable files
+DEFAULT_MAX_AGE = 60
+
+
+def accepts_gzip(headers):
+    for token in headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = token.strip().partition(';')
+        if coding.strip().lower() == 'gzip':
+            q = params.strip()
+            try:
+                return not (q.startswith('q=') and float(q[2:]) == 0)
+            except ValueError:
+                return True
+    return False
+
+
+def parse_range(header, size):
+    """Return (offset, length) for a single `Range: bytes=` header, None for a full body, or 'invalid'."""
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        length = min(int(match.group(2)), size)
+        return (size - length, length) if length > 0 else 'invalid'
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return 'invalid'
+    end = min(end, size - 1)
+    return start, end - start + 1
+
+
+def make_etag(size, mtime_ns, encoding=None):
+    """Strong validator for one representation of a file."""
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{size:x}-{mtime_ns:x}{suffix}"'
+
+
+def is_not_modified(headers, etag, mtime):
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a representation."""
+    match = headers.get('If-None-Match')
+    if match is not None:
+        if etag is None:
+            return False
+        tags = [t.strip() for t in match.split(',')]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return '*' in tags or etag.removeprefix('W/') in (t.removeprefix('W/') for t in tags)
+    since_header = headers.get('If-Modified-Since')
+    if not since_header or mtime is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(since_header)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return False
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def parse_cache_control(value):
+    """{directive: value or True} for a Cache-Control header."""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+def freshness_lifetime(cache_control):
+    """Seconds a shared cache may serve a response without revalidating, or None if it must not store it."""
+    directives = parse_cache_control(cache_control)
+    if 'no-store' in directives or 'private' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        try:
+            return max(0, int(directives[name]))
+        except (KeyError, ValueError, TypeError):
+            continue
+    return 0
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Asyncio load generator for the DLC server.
+
+Replays a launch-day client mix against a running `start_server.py`:
+  - manifest  : poll dlc/manifest_list.json
+  - repoll    : conditional re-poll of the manifest (If-Modified-Since)
+  - download  : full chapter zip download
+  - resume    : ranged resume of the chapter zip from a random offset
+and prints throughput, p50/p95/p99 latency, error counts and bytes/s as JSON
+so runs before and after a server change can be compared. With --metrics the
+server's /metrics endpoint is scraped before and after the run to add server
+CPU seconds per request and per GB served; when the target is the edge proxy
+(start_server.py --proxy) the report also shows hit counts and how many
+requests and bytes it kept off the origin.
+
+Usage:
+    python3 dlc_server/load_generator.py --url http://127.0.0.1:8000 --concurrency 64 --duration 15
+    python3 dlc_server/load_generator.py --mix manifest=70,repoll=20,download=5,resume=5 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+
+DEFAULT_MIX = 'manifest=50,repoll=30,download=15,resume=5'
+# Statuses that count as success for each scenario
+EXPECTED_STATUS = {
+    'manifest': {200},
+    'repoll': {200, 304},
+    'download': {200},
+    'resume': {200, 206},
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in EXPECTED_STATUS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}' (choose from {', '.join(EXPECTED_STATUS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(samples):
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        'count': len(values),
+        'mean_ms': ms(sum(values) / len(values)),
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]),
+    }
+
+
+async def http_get(host, port, path, headers, timeout, keep_body=False):
+    """Minimal HTTP/1.1 GET over a fresh connection.
+
+    Returns (status, headers, body_length), or (status, headers, body) with keep_body.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close', 'User-Agent: dlc-load-generator']
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split(' ', 2)[1])
+        resp_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                k, v = line.split(':', 1)
+                resp_headers[k.strip().lower()] = v.strip()
+        received = 0
+        kept = []
+        while True:
+            chunk = await asyncio.wait_for(reader.read(256 * 1024), timeout)
+            if not chunk:
+                break
+            received += len(chunk)
+            if keep_body:
+                kept.append(chunk)
+        return status, resp_headers, (b''.join(kept) if keep_body else received)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+def parse_prometheus(text):
+    """Sum Prometheus samples by metric name (labels are folded together)."""
+    totals = defaultdict(float)
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_part, _, value = line.rpartition(' ')
+        name = name_part.split('{', 1)[0]
+        try:
+            totals[name] += float(value)
+        except ValueError:
+            continue
+    return totals
+
+
+class LoadRun:
+    def __init__(self, args):
+        parsed = urllib.parse.urlsplit(args.url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.manifest_path = f'{self.prefix}/dlc/manifest_list.json'
+        self.zip_path = f'{self.prefix}/dlc/chapters/{args.chapter}.zip'
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.bytes_received = 0
+        self.issued = 0
+        self.last_modified = None
+        self.zip_size = 0
+
+    async def prime(self):
+        """Learn the manifest's Last-Modified and the zip size so re-polls and resumes are realistic."""
+        status, headers, _ = await http_get(self.host, self.port, self.manifest_path, {}, self.args.timeout)
+        if status != 200:
+            raise RuntimeError(f'manifest returned HTTP {status}')
+        self.last_modified = headers.get('last-modified')
+        status, headers, size = await http_get(self.host, self.port, self.zip_path, {}, self.args.timeout)
+        if status != 200:
+            raise RuntimeError(f'chapter zip returned HTTP {status}')
+        self.zip_size = int(headers.get('content-length', size))
+
+    async def scrape_metrics(self):
+        status, _, body = await http_get(self.host, self.port, f'{self.prefix}/metrics', {}, self.args.timeout, keep_body=True)
+        if status != 200:
+            raise RuntimeError(f'/metrics returned HTTP {status}')
+        return parse_prometheus(body.decode('utf-8', 'replace'))
+
+    def request_for(self, scenario):
+        if scenario == 'manifest':
+            return self.manifest_path, {'Accept-Encoding': 'gzip'}
+        if scenario == 'repoll':
+            headers = {'Accept-Encoding': 'gzip'}
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+            return self.manifest_path, headers
+        if scenario == 'download':
+            return self.zip_path, {}
+        offset = self.rng.randrange(max(1, self.zip_size))
+        return self.zip_path, {'Range': f'bytes={offset}-'}
+
+    def next_scenario(self):
+        names = list(self.args.mix)
+        return self.rng.choices(names, weights=[self.args.mix[n] for n in names])[0]
+
+    async def worker(self, deadline):
+        while time.monotonic() < deadline:
+            if self.args.requests and self.issued >= self.args.requests:
+                return
+            self.issued += 1
+            scenario = self.next_scenario()
+            path, headers = self.request_for(scenario)
+            started = time.perf_counter()
+            try:
+                status, _, received = await http_get(self.host, self.port, path, headers, self.args.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                self.errors[f'{scenario}:{type(e).__name__}'] += 1
+                continue
+            self.latencies[scenario].append(time.perf_counter() - started)
+            self.statuses[scenario][status] += 1
+            self.bytes_received += received
+            if status not in EXPECTED_STATUS[scenario]:
+                self.errors[f'{scenario}:http_{status}'] += 1
+
+    async def run(self):
+        await self.prime()
+        before = await self.scrape_metrics() if self.args.metrics else None
+        started = time.perf_counter()
+        deadline = time.monotonic() + (self.args.duration if not self.args.requests else 10 ** 9)
+        await asyncio.gather(*(self.worker(deadline) for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+        report = self.report(elapsed)
+        if before is not None:
+            after = await self.scrape_metrics()
+            report['server'] = self.server_delta(before, after, report['requests_completed'])
+        return report
+
+    @staticmethod
+    def server_delta(before, after, completed):
+        cpu = after['process_cpu_seconds_total'] - before['process_cpu_seconds_total']
+        sent = after['dlc_bytes_sent_total'] - before['dlc_bytes_sent_total']
+        server = {
+            'cpu_seconds': round(cpu, 4),
+            'bytes_sent': int(sent),
+            'cpu_ms_per_request': round(cpu * 1000.0 / completed, 4) if completed else None,
+            'cpu_seconds_per_gb': round(cpu / (sent / 1e9), 4) if sent else None,
+        }
+        if 'edge_origin_requests_total' in after:
+            delta = {name: int(after[f'edge_{name}_total'] - before[f'edge_{name}_total'])
+                     for name in ('hits', 'misses', 'revalidations', 'coalesced', 'passes', 'origin_requests', 'origin_bytes')}
+            delta['request_offload'] = round(1 - delta['origin_requests'] / completed, 4) if completed else None
+            delta['byte_offload'] = round(1 - delta['origin_bytes'] / sent, 4) if sent else None
+            server['edge'] = delta
+        return server
+
+    def report(self, elapsed):
+        completed = sum(len(v) for v in self.latencies.values())
+        all_samples = [s for v in self.latencies.values() for s in v]
+        return {
+            'target': self.args.url,
+            'chapter': self.args.chapter,
+            'concurrency': self.args.concurrency,
+            'mix': self.args.mix,
+            'elapsed_s': round(elapsed, 3),
+            'requests_completed': completed,
+            'throughput_rps': round(completed / elapsed, 2) if elapsed else 0.0,
+            'bytes_received': self.bytes_received,
+            'bytes_per_sec': round(self.bytes_received / elapsed, 1) if elapsed else 0.0,
+            'error_count': sum(self.errors.values()),
+            'errors': dict(self.errors),
+            'latency': latency_summary(all_samples),
+            'scenarios': {
+                name: {
+                    'latency': latency_summary(samples),
+                    'status_counts': {str(k): v for k, v in sorted(self.statuses[name].items())},
+                }
+                for name, samples in sorted(self.latencies.items())
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a realistic DLC client mix against start_server.py')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+    parser.add_argument('--chapter', default='gospels', help='Chapter id used for zip download/resume')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent simulated clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Run length in seconds (ignored with --requests)')
+    parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests instead of a duration')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'Scenario weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=1, help='RNG seed for scenario selection and resume offsets')
+    parser.add_argument('--metrics', action='store_true', help='Scrape /metrics before and after to report server CPU cost')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(LoadRun(args).run())
+    except (OSError, RuntimeError) as e:
+        print(f'Load run failed: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f'Wrote {args.output}')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
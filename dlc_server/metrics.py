@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Request metrics and asynchronous access logging for the DLC server.
+
+ServerMetrics keeps request counts by route/path/status, in-flight
+connections, bytes sent and a latency histogram per route, and renders them
+in the Prometheus text format for `/metrics`. AccessLog hands JSON lines to
+a background writer thread so a slow terminal or disk never delays a
+response. MetricsHandlerMixin wires both into a request handler; the origin
+server and the edge proxy share it.
+"""
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+from zip_members import MEMBER_SEPARATOR
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Paths beyond this many distinct values are counted under path="other"
+MAX_TRACKED_PATHS = 512
+METRICS_PATH = '/metrics'
+
+
+def route_for(path):
+    """Classify a URL path into the coarse route used for histograms."""
+    if path == METRICS_PATH:
+        return 'metrics'
+    if path == '/dlc/catalog':
+        return 'catalog'
+    if path == '/dlc/daily':
+        return 'daily'
+    if MEMBER_SEPARATOR in path:
+        return 'zip_member'
+    if '/dlc/chunks/' in path:
+        return 'manifest' if path.endswith('.json') else 'chunk'
+    if path.endswith('manifest_list.json') or path.endswith('/manifest.json'):
+        return 'manifest'
+    if path.endswith('.zip'):
+        return 'chapter_zip'
+    return 'file'
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'total', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class ServerMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._bytes = Counter()
+        self._histograms = {}
+        self._paths = set()
+        self._in_flight = 0
+        self._started_at = time.time()
+
+    def connection_opened(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def request_finished(self, path, status, bytes_sent, seconds):
+        """Record one request and return the route it was filed under."""
+        route = route_for(path)
+        with self._lock:
+            if path not in self._paths:
+                if len(self._paths) >= MAX_TRACKED_PATHS:
+                    path = 'other'
+                else:
+                    self._paths.add(path)
+            self._requests[(route, path, status)] += 1
+            self._bytes[route] += bytes_sent
+            hist = self._histograms.get(route)
+            if hist is None:
+                hist = self._histograms[route] = _Histogram()
+            hist.observe(seconds)
+        return route
+
+    def render(self):
+        """Prometheus text exposition of the current counters."""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            sent = sorted(self._bytes.items())
+            hists = sorted((r, list(h.buckets), h.total, h.count) for r, h in self._histograms.items())
+            in_flight = self._in_flight
+        out = [
+            '# HELP dlc_requests_total Requests served by route, path and status.',
+            '# TYPE dlc_requests_total counter',
+        ]
+        for (route, path, status), n in requests:
+            out.append(f'dlc_requests_total{{route="{route}",path="{_escape(path)}",status="{status}"}} {n}')
+        out += ['# HELP dlc_in_flight_connections Connections currently being handled.',
+                '# TYPE dlc_in_flight_connections gauge',
+                f'dlc_in_flight_connections {in_flight}',
+                '# HELP dlc_bytes_sent_total Bytes written to clients, headers included.',
+                '# TYPE dlc_bytes_sent_total counter']
+        for route, n in sent:
+            out.append(f'dlc_bytes_sent_total{{route="{route}"}} {n}')
+        out += ['# HELP dlc_request_duration_seconds Request latency by route.',
+                '# TYPE dlc_request_duration_seconds histogram']
+        for route, buckets, total, count in hists:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                out.append(f'dlc_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+            out.append(f'dlc_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {count}')
+            out.append(f'dlc_request_duration_seconds_sum{{route="{route}"}} {total:.6f}')
+            out.append(f'dlc_request_duration_seconds_count{{route="{route}"}} {count}')
+        out += ['# HELP process_cpu_seconds_total User and system CPU time of the server process.',
+                '# TYPE process_cpu_seconds_total counter',
+                f'process_cpu_seconds_total {time.process_time():.6f}',
+                '# TYPE dlc_uptime_seconds gauge',
+                f'dlc_uptime_seconds {time.time() - self._started_at:.3f}']
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class AccessLog:
+    """JSON-lines access log written by a daemon thread.
+
+    Callers enqueue plain dicts; serialisation happens on the writer thread.
+    """
+
+    BATCH = 256
+
+    def __init__(self, stream=None):
+        self._stream = stream or sys.stderr
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.BATCH:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self._stream.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in batch))
+                self._stream.flush()
+            except (OSError, ValueError):
+                pass
+
+
+class CountingWriter:
+    """Wraps a handler's wfile and counts every byte written through it."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self._raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class MetricsHandlerMixin:
+    """Times, counts and logs each request of a BaseHTTPRequestHandler subclass.
+
+    Subclasses set `metrics` to a ServerMetrics; `access_log` is optional.
+    """
+
+    metrics = None
+    access_log = None
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def handle(self):
+        self.metrics.connection_opened()
+        try:
+            super().handle()
+        finally:
+            self.metrics.connection_closed()
+
+    def handle_one_request(self):
+        self._started = None
+        self._status = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._started is not None and self._status is not None:
+                self._record_request()
+
+    def parse_request(self):
+        self._started = time.perf_counter()
+        self._sent_before = self.wfile.count
+        return super().parse_request()
+
+    def send_response_only(self, code, message=None):
+        self._status = code
+        super().send_response_only(code, message)
+
+    def _record_request(self):
+        elapsed = time.perf_counter() - self._started
+        path = urllib.parse.urlsplit(getattr(self, 'path', '')).path
+        sent = self.wfile.count - self._sent_before
+        route = self.metrics.request_finished(path, self._status, sent, elapsed)
+        if self.access_log is not None:
+            record = {
+                'ts': round(time.time(), 3),
+                'client': self.client_address[0],
+                'method': self.command,
+                'path': path,
+                'route': route,
+                'status': self._status,
+                'bytes': sent,
+                'ms': round(elapsed * 1000.0, 3),
+                'ua': self.headers.get('User-Agent', '') if self.headers else '',
+            }
+            record.update(self.access_log_extra())
+            self.access_log.write(record)
+
+    def access_log_extra(self):
+        """Extra fields for this request's access log record."""
+        return {}
+
+    def log_request(self, code='-', size='-'):
+        # Requests are logged once, with timing, by _record_request
+        pass
+
+    def log_message(self, format, *args):
+        if self.access_log is not None:
+            self.access_log.write({'ts': round(time.time(), 3), 'client': self.client_address[0], 'message': format % args})
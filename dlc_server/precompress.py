@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Prebuilt gzip siblings for the DLC server's text files.
+
+Manifests, level JSON and particle JSON compress by an order of magnitude, so
+every compressible file gets a `<file>.gz` next to it. The sibling carries the
+source's mtime; when the source changes, the background refresher rebuilds it,
+and until then the server keeps sending the identity body. Nothing is ever
+compressed while a request is waiting.
+
+Usage: python3 dlc_server/precompress.py [directory]
+"""
+import gzip
+import os
+import sys
+import threading
+
+# Text formats worth compressing. Archives, audio and images (zip, mp3, ogg,
+# png, jpg, webp) are already compressed and are deliberately left out.
+COMPRESSIBLE_EXTENSIONS = {'.json', '.txt', '.md', '.csv', '.svg', '.po', '.tres', '.tscn'}
+GZIP_SUFFIX = '.gz'
+REFRESH_INTERVAL = 2.0
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def fresh_sibling(path, src_stat):
+    """Return the `.gz` sibling path if it was built from the current source, else None."""
+    gz_path = path + GZIP_SUFFIX
+    try:
+        gz_stat = os.stat(gz_path)
+    except OSError:
+        return None
+    return gz_path if gz_stat.st_mtime_ns == src_stat.st_mtime_ns else None
+
+
+def build_sibling(path):
+    """(Re)build the gzip sibling of `path`. Returns True if a sibling now exists."""
+    st = os.stat(path)
+    gz_path = path + GZIP_SUFFIX
+    with open(path, 'rb') as fh:
+        raw = fh.read()
+    packed = gzip.compress(raw, compresslevel=9, mtime=0)
+    if len(packed) >= len(raw):
+        # Not worth a Content-Encoding header; drop any old sibling
+        if os.path.exists(gz_path):
+            os.remove(gz_path)
+        return False
+    tmp_path = gz_path + '.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(packed)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_path, gz_path)
+    return True
+
+
+def refresh_tree(root):
+    """Bring every gzip sibling under `root` up to date. Returns (built, removed)."""
+    built = removed = 0
+    for dirpath, _dirs, files in os.walk(root):
+        names = set(files)
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if name.endswith(GZIP_SUFFIX):
+                source = name[:-len(GZIP_SUFFIX)]
+                if is_compressible(source) and source not in names:
+                    os.remove(path)
+                    removed += 1
+                continue
+            if not is_compressible(name):
+                continue
+            try:
+                if fresh_sibling(path, os.stat(path)) is None and build_sibling(path):
+                    built += 1
+            except OSError as e:
+                print(f"[precompress] Skipping {path}: {e}")
+    return built, removed
+
+
+class Precompressor:
+    """Background thread that keeps gzip siblings in step with their sources."""
+
+    def __init__(self, root, interval=REFRESH_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='precompress', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            refresh_tree(self.root)
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dlc')
+    built, removed = refresh_tree(target)
+    print(f"Precompressed {built} file(s), removed {removed} orphaned sibling(s) under {target}")
@@ -3,14 +3,257 @@
 Simple HTTP server for DLC testing
 Serves files from the current directory on port 8000
 """
+import argparse
 import http.server
-import socketserver
 import os
+import sys
+import urllib.parse
+import zipfile
+from catalog import CATALOG_PATH, CatalogError, CatalogIndex
+from chunk_store import IMMUTABLE_CACHE_CONTROL, is_chunk_path
+from daily_levels import DAILY_CACHE_CONTROL, DAILY_PATH, DailyLevelError, DailyLevelPool
+from edge_proxy import DEFAULT_CACHE_BYTES, DEFAULT_CACHE_DIR, EdgeCache, make_handler
+from file_cache import OpenFileCache, send_range
+from http_cache import DEFAULT_MAX_AGE, accepts_gzip, is_not_modified, make_etag, parse_range
+from metrics import METRICS_PATH, AccessLog, MetricsHandlerMixin, ServerMetrics
+from precompress import Precompressor, fresh_sibling, is_compressible, refresh_tree
+from zip_members import ZipIndex, split_member_path, iter_member, gzip_frame, member_etag
 PORT = 8000
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
-class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
+DLC_ROOT = os.path.join(DIRECTORY, 'dlc')
+ZIP_INDEX = ZipIndex()
+FILE_CACHE = OpenFileCache()
+METRICS = ServerMetrics()
+CATALOG = None  # built by main()
+DAILY_POOL = None  # started by main()
+CACHE_CONTROL = "public, max-age=%d" % DEFAULT_MAX_AGE  # main() applies --max-age
+class FileBody:
+    """Response body backed by a cached descriptor; copyfile() sends it with sendfile."""
+    def __init__(self, entry, offset, length):
+        self.entry = entry
+        self.offset = offset
+        self.length = length
+    def close(self):
+        if self.entry is not None:
+            FILE_CACHE.release(self.entry)
+            self.entry = None
+class DLCServer(http.server.ThreadingHTTPServer):
+    # socketserver's default backlog of 5 drops SYNs under load and shows up as 1s tail latency
+    request_queue_size = 128
+class CORSRequestHandler(MetricsHandlerMixin, http.server.SimpleHTTPRequestHandler):
+    metrics = METRICS
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
+    def do_GET(self):
+        url_path = urllib.parse.urlsplit(self.path).path
+        if url_path == METRICS_PATH:
+            self._send_metrics()
+        elif url_path == CATALOG_PATH:
+            self._send_catalog(head_only=False)
+        elif url_path == DAILY_PATH:
+            self._send_daily_level(head_only=False)
+        elif not self._serve_zip_member(head_only=False):
+            super().do_GET()
+    def _send_metrics(self):
+        text = METRICS.render() + (DAILY_POOL.render_metrics() if DAILY_POOL is not None else "")
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+    def do_HEAD(self):
+        url_path = urllib.parse.urlsplit(self.path).path
+        if url_path == CATALOG_PATH:
+            self._send_catalog(head_only=True)
+        elif url_path == DAILY_PATH:
+            self._send_daily_level(head_only=True)
+        elif not self._serve_zip_member(head_only=True):
+            super().do_HEAD()
+    def _send_catalog(self, head_only):
+        if CATALOG is None:
+            self.send_error(404, "Catalog not loaded")
+            return
+        try:
+            rendered = CATALOG.render(urllib.parse.urlsplit(self.path).query)
+        except CatalogError as e:
+            self.send_error(400, str(e))
+            return
+        self._send_rendered(rendered, CACHE_CONTROL, head_only)
+    def _send_daily_level(self, head_only):
+        if DAILY_POOL is None:
+            self.send_error(404, "Daily levels not enabled")
+            return
+        try:
+            key = DAILY_POOL.parse_query(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query))
+        except DailyLevelError as e:
+            self.send_error(400, str(e))
+            return
+        rendered = DAILY_POOL.get(*key)
+        if rendered is None:
+            # Queued for the background generator; never generated on the request path
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_rendered(rendered, DAILY_CACHE_CONTROL, head_only)
+    def _send_rendered(self, rendered, cache_control, head_only):
+        """Send a prebuilt (body, gzip body, etag) JSON response."""
+        body, gz_body, etag = rendered
+        if is_not_modified(self.headers, etag, None):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        gzipped = accepts_gzip(self.headers)
+        if gzipped:
+            body = gz_body
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+    def _serve_zip_member(self, head_only):
+        """Serve `<chapter>.zip!/<member>` straight out of the archive. Returns False for other paths."""
+        url_path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        parts = split_member_path(url_path)
+        if parts is None:
+            return False
+        zip_path = self.translate_path(parts[0])
+        info = ZIP_INDEX.lookup(zip_path, parts[1])
+        if info is None:
+            self.send_error(404, "Member not found")
+            return True
+        # A deflated member already is a gzip body minus header and trailer
+        passthrough = info.compress_type == zipfile.ZIP_DEFLATED and accepts_gzip(self.headers)
+        try:
+            st = os.stat(zip_path)
+        except OSError:
+            self.send_error(404, "Member not found")
+            return True
+        etag = member_etag(info, st.st_mtime_ns, "gzip" if passthrough else None)
+        if is_not_modified(self.headers, etag, st.st_mtime):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            if info.compress_type == zipfile.ZIP_DEFLATED:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.end_headers()
+            return True
+        self.send_response(200)
+        self.send_header("Content-type", self.guess_type(info.name))
+        self.send_header("ETag", etag)
+        # Deflated members are streamed through the decompressor, so byte ranges are not offered
+        self.send_header("Accept-Ranges", "none")
+        if passthrough:
+            header, trailer = gzip_frame(info)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(header) + info.compress_size + len(trailer)))
+        else:
+            self.send_header("Content-Length", str(info.file_size))
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Last-Modified", self.date_time_string(st.st_mtime))
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.end_headers()
+        if head_only:
+            return True
+        if passthrough:
+            body = FileBody(FILE_CACHE.acquire(zip_path), info.data_offset, info.compress_size)
+            try:
+                self.wfile.write(header)
+                self.copyfile(body, self.wfile)
+                self.wfile.write(trailer)
+            finally:
+                body.close()
+            return True
+        if info.compress_type == zipfile.ZIP_STORED:
+            # Stored members are the raw bytes on disk: hand them to the kernel
+            body = FileBody(FILE_CACHE.acquire(zip_path), info.data_offset, info.file_size)
+            try:
+                self.copyfile(body, self.wfile)
+            finally:
+                body.close()
+            return True
+        with open(zip_path, 'rb') as fh:
+            for chunk in iter_member(fh, info):
+                self.wfile.write(chunk)
+        return True
+    def send_head(self):
+        """Serve regular files from the descriptor cache; directories and errors use the stock handler."""
+        url_path = urllib.parse.urlsplit(self.path).path
+        path = self.translate_path(self.path)
+        if url_path.endswith('/') or not os.path.isfile(path):
+            return super().send_head()
+        # Prebuilt .gz siblings only; a stale or missing sibling means identity, never on-the-fly gzip
+        body_path, encoding = path, None
+        immutable = is_chunk_path(url_path)
+        negotiable = is_compressible(path) or immutable
+        if negotiable and "Range" not in self.headers and accepts_gzip(self.headers):
+            gz_path = fresh_sibling(path, os.stat(path))
+            if gz_path is not None:
+                body_path, encoding = gz_path, "gzip"
+        try:
+            entry = FILE_CACHE.acquire(body_path)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        try:
+            etag = make_etag(entry.size, entry.key[1], encoding)
+            if is_not_modified(self.headers, etag, entry.mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                if negotiable:
+                    self.send_header("Vary", "Accept-Encoding")
+                self.end_headers()
+                FILE_CACHE.release(entry)
+                return None
+            offset, length = 0, entry.size
+            byte_range = parse_range(self.headers.get("Range"), entry.size)
+            if byte_range == 'invalid':
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % entry.size)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                FILE_CACHE.release(entry)
+                return None
+            if byte_range is not None:
+                offset, length = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", "bytes %d-%d/%d" % (offset, offset + length - 1, entry.size))
+            else:
+                self.send_response(200)
+            self.send_header("Content-type", self.guess_type(path))
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            if negotiable:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Last-Modified", self.date_time_string(entry.mtime))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL if immutable else CACHE_CONTROL)
+            self.end_headers()
+        except Exception:
+            FILE_CACHE.release(entry)
+            raise
+        return FileBody(entry, offset, length)
+    def copyfile(self, source, outputfile):
+        if isinstance(source, FileBody):
+            send_range(self.connection, source.entry, source.offset, source.length)
+            self.wfile.count += source.length
+        else:
+            super().copyfile(source, outputfile)
     def end_headers(self):
         # Add CORS headers for cross-origin requests
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -20,19 +263,56 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.end_headers()
-if __name__ == "__main__":
-    with socketserver.TCPServer(("", PORT), CORSRequestHandler) as httpd:
+def main():
+    parser = argparse.ArgumentParser(description="DLC test server")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on (default: %d)" % PORT)
+    parser.add_argument("--bind", default="", help="Address to bind (default: all interfaces)")
+    parser.add_argument("--access-log", default=None, help="JSON-lines access log file ('-' for stdout, default: stderr)")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE, help="Cache-Control max-age for mutable files (default: %d)" % DEFAULT_MAX_AGE)
+    parser.add_argument("--proxy", metavar="ORIGIN", default=None, help="Run as a caching edge proxy in front of ORIGIN (e.g. http://127.0.0.1:8000)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Edge proxy cache directory (default: %s)" % DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024), help="Edge proxy cache size in MB")
+    args = parser.parse_args()
+    port = args.port
+    global CACHE_CONTROL
+    CACHE_CONTROL = "public, max-age=%d" % args.max_age
+    if args.access_log == "-":
+        access_log = AccessLog(sys.stdout)
+    elif args.access_log:
+        access_log = AccessLog(open(args.access_log, "a", buffering=1))
+    else:
+        access_log = AccessLog(sys.stderr)
+    if args.proxy:
+        run_proxy(args, access_log)
+        return
+    CORSRequestHandler.access_log = access_log
+    global CATALOG
+    CATALOG = CatalogIndex(os.path.join(DLC_ROOT, 'manifest_list.json'))
+    global DAILY_POOL
+    DAILY_POOL = DailyLevelPool()
+    DAILY_POOL.start()
+    built, _removed = refresh_tree(DLC_ROOT)
+    precompressor = Precompressor(DLC_ROOT)
+    precompressor.start()
+    with DLCServer((args.bind, port), CORSRequestHandler) as httpd:
         print(f"========================================")
         print(f"  DLC Test Server")
         print(f"========================================")
         print(f"")
-        print(f"  Serving at: http://192.168.0.110:{PORT}/")
+        print(f"  Serving at: http://192.168.0.110:{port}/")
         print(f"  Directory: {DIRECTORY}")
+        print(f"  Gzip siblings rebuilt at startup: {built}")
         print(f"")
         print(f"  Available endpoints:")
-        print(f"    - http://192.168.0.110:{PORT}/dlc/manifest_list.json")
-        print(f"    - http://192.168.0.110:{PORT}/dlc/chapters/chapter_demo.zip")
+        print(f"    - http://192.168.0.110:{port}/dlc/manifest_list.json")
+        print(f"    - http://192.168.0.110:{port}/dlc/catalog?engine=1.0.0&tag=<tag>&free=true&limit=20")
+        print(f"    - http://192.168.0.110:{port}/dlc/daily?date=YYYY-MM-DD&event=<event>")
+        print(f"    - http://192.168.0.110:{port}/dlc/chapters/chapter_demo.zip")
+        print(f"    - http://192.168.0.110:{port}/dlc/chapters/<chapter>.zip!/<member>")
+        print(f"    - http://192.168.0.110:{port}/dlc/chunks/chapters/<chapter>.json (after chunk_store.py)")
+        print(f"    - http://192.168.0.110:{port}/metrics")
         print(f"")
+        print(f"  Load test: python3 load_generator.py --url http://127.0.0.1:{port}")
         print(f"  Press Ctrl+C to stop")
         print(f"========================================")
         print(f"")
@@ -40,3 +320,29 @@ if __name__ == "__main__":
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n\nServer stopped.")
+        finally:
+            FILE_CACHE.close_all()
+def run_proxy(args, access_log):
+    cache = EdgeCache(args.proxy, args.cache_dir, args.cache_size * 1024 * 1024)
+    with DLCServer((args.bind, args.port), make_handler(cache, access_log)) as httpd:
+        print(f"========================================")
+        print(f"  DLC Edge Proxy")
+        print(f"========================================")
+        print(f"")
+        print(f"  Serving at: http://127.0.0.1:{args.port}/")
+        print(f"  Origin: {args.proxy}")
+        print(f"  Cache: {args.cache_dir} ({args.cache_size} MB)")
+        print(f"  Stats: http://127.0.0.1:{args.port}/metrics")
+        print(f"")
+        print(f"  Load test: python3 load_generator.py --url http://127.0.0.1:{args.port} --metrics")
+        print(f"  Press Ctrl+C to stop")
+        print(f"========================================")
+        print(f"")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n\nProxy stopped.")
+        finally:
+            cache.files.close_all()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Serve individual files out of chapter zips without extracting them.
+
+A request such as `/dlc/chapters/gospels.zip!/levels/level_61.json` is split
+into the archive path and the member name. The archive's central directory is
+read once and the member offsets are cached until the zip changes on disk;
+stored members are then sent straight from the archive bytes and deflated
+members are inflated in chunks while streaming.
+"""
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from collections import namedtuple
+
+MEMBER_SEPARATOR = '.zip!/'
+CHUNK_SIZE = 64 * 1024
+
+# signature, version, flags, method, time, date, crc, csize, usize, name len, extra len
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+
+MemberInfo = namedtuple('MemberInfo', 'name data_offset compress_type compress_size file_size crc date_time')
+
+
+def split_member_path(url_path):
+    """Split `/a/b.zip!/c/d.json` into ('/a/b.zip', 'c/d.json'), or return None."""
+    idx = url_path.find(MEMBER_SEPARATOR)
+    if idx < 0:
+        return None
+    archive = url_path[:idx + len('.zip')]
+    member = url_path[idx + len(MEMBER_SEPARATOR):]
+    if not member or member.endswith('/'):
+        return None
+    return archive, member
+
+
+def _read_members(zip_path):
+    """Read the central directory and resolve where each member's data starts."""
+    members = {}
+    with open(zip_path, 'rb') as fh:
+        with zipfile.ZipFile(fh) as zf:
+            infos = zf.infolist()
+        for info in infos:
+            if info.is_dir():
+                continue
+            if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                continue
+            fh.seek(info.header_offset)
+            header = fh.read(_LOCAL_HEADER.size)
+            fields = _LOCAL_HEADER.unpack(header)
+            if fields[0] != _LOCAL_SIGNATURE:
+                raise zipfile.BadZipFile(f'Bad local header for {info.filename} in {zip_path}')
+            name_len, extra_len = fields[9], fields[10]
+            data_offset = info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+            members[info.filename] = MemberInfo(
+                info.filename, data_offset, info.compress_type,
+                info.compress_size, info.file_size, info.CRC, info.date_time)
+    return members
+
+
+class ZipIndex:
+    """Per-archive cache of member offsets, invalidated when the zip changes."""
+
+    def __init__(self):
+        self._archives = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, zip_path, member):
+        """Return the MemberInfo for `member` inside `zip_path`, or None."""
+        try:
+            st = os.stat(zip_path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._archives.get(zip_path)
+        if cached is None or cached[0] != key:
+            try:
+                members = _read_members(zip_path)
+            except (OSError, zipfile.BadZipFile):
+                return None
+            cached = (key, members)
+            with self._lock:
+                self._archives[zip_path] = cached
+        return cached[1].get(member)
+
+
+def member_etag(info, zip_mtime_ns, encoding=None):
+    """Strong validator for one representation of a member: its CRC-32 and size, and the archive's mtime."""
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"z{info.crc:08x}-{info.file_size:x}-{zip_mtime_ns:x}{suffix}"'
+
+
+def gzip_frame(info):
+    """Header and trailer that turn a deflated member's raw stream into a gzip body."""
+    header = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+    trailer = struct.pack('<II', info.crc, info.file_size & 0xFFFFFFFF)
+    return header, trailer
+
+
+def iter_member(fh, info):
+    """Yield the uncompressed bytes of a member from an open archive file."""
+    fh.seek(info.data_offset)
+    remaining = info.compress_size
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS) if info.compress_type == zipfile.ZIP_DEFLATED else None
+    while remaining > 0:
+        chunk = fh.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        if inflater is None:
+            yield chunk
+        else:
+            data = inflater.decompress(chunk)
+            if data:
+                yield data
+    if inflater is not None:
+        tail = inflater.flush()
+        if tail:
+            yield tail
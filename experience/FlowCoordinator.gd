@@ -11,6 +11,8 @@ signal node_started(node: Dictionary)
 signal node_completed(node: Dictionary)
 
 const _ExperiencePipeline = preload("res://experience/pipeline/ExperiencePipeline.gd")
+# Artifact format written by tools/compile_flows.py (COMPILED_FORMAT)
+const COMPILED_FLOW_FORMAT = 2
 
 func _ctx_builder():
 	return load("res://experience/pipeline/ContextBuilder.gd")
@@ -57,11 +59,13 @@ func _create_components():
 
 func load_flow(flow_id: String) -> bool:
 	"""Load an experience flow by ID"""
-	var flow_path = "res://data/experience_flows/%s.json" % flow_id
-
-	print("[FlowCoordinator] Loading flow: %s" % flow_id)
+	var flow_path = "res://compiled/flows/%s.json" % flow_id
+	current_flow = _load_compiled_flow(flow_path)
+	if current_flow.is_empty():
+		flow_path = "res://data/experience_flows/%s.json" % flow_id
+		current_flow = parser.parse_flow_file(flow_path)
 
-	current_flow = parser.parse_flow_file(flow_path)
+	print("[FlowCoordinator] Loading flow: %s (%s)" % [flow_id, flow_path])
 
 	if current_flow.is_empty():
 		push_error("[FlowCoordinator] Failed to load flow: %s" % flow_id)
@@ -73,6 +77,24 @@ func load_flow(flow_id: String) -> bool:
 	print("[FlowCoordinator] Flow loaded: %s" % flow_id)
 	return true
 
+func _load_compiled_flow(compiled_path: String) -> Dictionary:
+	"""The pre-resolved artifact from tools/compile_flows.py, or {} to load the source flow.
+
+	Freshness is checked when the game is built: build-android.sh runs
+	compile_flows.py --check and stops if any artifact is stale. Here only the
+	artifact's format and stamp are checked, so this stays a single file load.
+	In the editor the source flows are loaded instead, since they change under it.
+	"""
+	if OS.has_feature("editor") or not FileAccess.file_exists(compiled_path):
+		return {}
+	var flow = parser.parse_flow_file(compiled_path)
+	var compiled = flow.get("compiled", {})
+	if typeof(compiled) != TYPE_DICTIONARY or int(compiled.get("format", 0)) != COMPILED_FLOW_FORMAT \
+			or str(compiled.get("inputs_sha256", "")).is_empty():
+		print("[FlowCoordinator] Compiled flow has an unknown format, ignoring: %s" % compiled_path)
+		return {}
+	return flow
+
 func start_flow() -> void:
 	"""Start executing the current flow"""
 	if current_flow.is_empty():
@@ -184,6 +206,14 @@ func _find_level_node_index(level_id: String) -> int:
 	"""Find the index of a level node in the flow"""
 	var flow_nodes = current_flow.get("flow", [])
 
+	# Compiled flows carry a node index table; trust it only while the node still matches
+	# (conditional branches inserted at runtime shift the indices)
+	var indexed = int(current_flow.get("node_index", {}).get("levels", {}).get(level_id, -1))
+	if indexed >= 0 and indexed < flow_nodes.size():
+		var candidate = flow_nodes[indexed]
+		if candidate.get("type") == "level" and candidate.get("id") == level_id:
+			return indexed
+
 	for i in range(flow_nodes.size()):
 		var node = flow_nodes[i]
 		if node.get("type") == "level" and node.get("id") == level_id:
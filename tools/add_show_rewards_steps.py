@@ -2,6 +2,7 @@
 """
 Add show_rewards steps to experience flow after each level node.
 This ensures the level transition/rewards screen appears after level completion.
+Superseded by tools/migrate.py (migration 'show_rewards_after_levels'), which applies it atomically with other migrations.
 """
 
 import json
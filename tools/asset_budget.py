@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Asset budget report for DLC chapters and the base game's asset trees.
+
+Breaks each target down by category (image, audio, data, font, other) and
+shows raw size, packaged size, compression ratio and, for images, the memory
+the decoded texture needs. Packaged size is what package_chapter.py would
+write: deflate level 9, or stored for formats that are already compressed.
+Decode memory is width x height x 4 bytes (RGBA8, no mipmaps), which is what
+Godot holds for an uncompressed 2D texture. SVGs are rasterised at their
+declared size.
+
+Targets:
+- every chapter under dlc_server/dlc/chapters (the unpacked directory, or the
+  zip when there is no directory)
+- the base textures/, audio/ and data/ trees
+
+Chapters are checked against budgets. DEFAULT_BUDGETS applies to every
+chapter and a --budgets JSON file can override it, either globally
+({"default": {...}}) or per chapter ({"chapters": {"gospels": {...}}}). Files
+over a per-file budget and the largest files of each target are listed as
+offenders.
+
+Files are analysed in parallel worker processes. Results are cached in
+.cache/asset_budget/ by content hash, and a file whose size and mtime are
+unchanged is not even re-read, so repeat runs only stat the trees.
+
+Usage:
+    python3 tools/asset_budget.py                  # every chapter and base tree
+    python3 tools/asset_budget.py gospels textures # just these targets
+    python3 tools/asset_budget.py --json report.json --top 20
+Exit status is 1 when a chapter is over budget.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from package_chapter import CHAPTERS_DIR, COMPRESS_LEVEL, STORED_EXTENSIONS, collect_members
+
+ROOT = Path(__file__).resolve().parents[1]
+BASE_TREES = ('textures', 'audio', 'data')
+CACHE_PATH = ROOT / '.cache' / 'asset_budget' / 'files.json'
+CACHE_FORMAT = 1
+MB = 1024 * 1024
+
+CATEGORIES = ('image', 'audio', 'data', 'font', 'other')
+CATEGORY_EXTENSIONS = {
+    'image': {'.png', '.jpg', '.jpeg', '.webp', '.svg', '.bmp', '.tga'},
+    'audio': {'.mp3', '.ogg', '.wav'},
+    'data': {'.json', '.po', '.pot', '.csv', '.translation', '.txt', '.md', '.tres', '.tscn'},
+    'font': {'.ttf', '.otf', '.woff', '.woff2'},
+}
+BYTES_PER_PIXEL = 4
+
+# Bytes. A chapter's packaged size is what players download.
+DEFAULT_BUDGETS = {
+    'packaged_total': 40 * MB,
+    'decode_total': 256 * MB,
+    'image_packaged': 32 * MB,
+    'audio_packaged': 16 * MB,
+    'data_packaged': 2 * MB,
+    'file_packaged': 4 * MB,
+    # 2048x2048 RGBA8
+    'file_decode': 16 * MB,
+}
+
+SVG_SIZE_RE = re.compile(rb'<svg\b[^>]*?\bwidth="([\d.]+)(?:px)?"[^>]*?\bheight="([\d.]+)(?:px)?"', re.S)
+SVG_VIEWBOX_RE = re.compile(rb'<svg\b[^>]*?\bviewBox="[-\d.]+[ ,]+[-\d.]+[ ,]+([\d.]+)[ ,]+([\d.]+)"', re.S)
+
+
+def category_of(name):
+    suffix = Path(name).suffix.lower()
+    for category, extensions in CATEGORY_EXTENSIONS.items():
+        if suffix in extensions:
+            return category
+    return 'other'
+
+
+def _jpeg_size(data):
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            pos += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def image_size(name, data):
+    """(width, height) from an image's header, or None if it cannot be read."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+        return struct.unpack('>II', data[16:24])
+    if data[:2] == b'\xff\xd8':
+        return _jpeg_size(data)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            w, h = struct.unpack('<HH', data[26:30])
+            return w & 0x3FFF, h & 0x3FFF
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+    if name.lower().endswith('.svg'):
+        match = SVG_SIZE_RE.search(data) or SVG_VIEWBOX_RE.search(data)
+        if match:
+            return round(float(match.group(1))), round(float(match.group(2)))
+    return None
+
+
+def analyse_bytes(name, data):
+    """Size, packaged size and image dimensions for one file's contents."""
+    packaged = len(data)
+    if Path(name).suffix.lower() not in STORED_EXTENSIONS:
+        co = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        packaged = min(packaged, len(co.compress(data) + co.flush()))
+    result = {'size': len(data), 'packaged': packaged, 'width': None, 'height': None, 'decode': 0}
+    if category_of(name) == 'image':
+        dims = image_size(name, data)
+        if dims:
+            result['width'], result['height'] = dims
+            result['decode'] = dims[0] * dims[1] * BYTES_PER_PIXEL
+    return result
+
+
+def analyse_file(task):
+    """Worker: (name, path) -> (sha256, analysis)."""
+    name, path = task
+    data = Path(path).read_bytes()
+    return hashlib.sha256(data).hexdigest(), analyse_bytes(name, data)
+
+
+def load_cache():
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get('format') != CACHE_FORMAT or cache.get('zlib') != zlib.ZLIB_RUNTIME_VERSION:
+        cache = {'format': CACHE_FORMAT, 'zlib': zlib.ZLIB_RUNTIME_VERSION, 'files': {}, 'results': {}}
+    return cache
+
+
+def save_cache(cache, used_paths, roots):
+    # Forget files that are gone from the scanned targets, and results nothing refers to any more
+    roots = tuple(os.path.join(str(r), '') for r in roots)
+    cache['files'] = {p: rec for p, rec in cache['files'].items() if p in used_paths or not p.startswith(roots)}
+    live = {rec['sha256'] for rec in cache['files'].values()}
+    cache['results'] = {h: r for h, r in cache['results'].items() if h in live}
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps(cache, separators=(',', ':'), sort_keys=True))
+    os.replace(tmp, CACHE_PATH)
+
+
+def tree_files(target, path):
+    """(name, path) pairs for a target directory. Chapters skip what package_chapter skips."""
+    if target.startswith('chapter:'):
+        return [(arc, str(p)) for arc, p in collect_members(path)]
+    files = []
+    for dirpath, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(names):
+            if name.startswith('.') or name.endswith('.import'):
+                continue
+            full = Path(dirpath) / name
+            # Dangling symlinks (e.g. music checked out without its LFS payload) are not shipped
+            if not full.is_file():
+                continue
+            files.append((full.relative_to(path).as_posix(), str(full)))
+    return files
+
+
+def discover_targets(names):
+    """[(target, path)] for the requested names (chapter ids or base trees), or all of them."""
+    chapters = {}
+    if CHAPTERS_DIR.is_dir():
+        for entry in sorted(CHAPTERS_DIR.iterdir()):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                chapters[entry.name] = entry
+            elif entry.suffix == '.zip':
+                chapters.setdefault(entry.stem, entry)
+    targets = [(f'chapter:{cid}', path) for cid, path in chapters.items()]
+    targets += [(tree, ROOT / tree) for tree in BASE_TREES if (ROOT / tree).is_dir()]
+    if not names:
+        return targets
+    selected = []
+    for name in names:
+        match = [t for t in targets if t[0] in (name, f'chapter:{name}')]
+        if not match:
+            raise SystemExit(f'Unknown target {name!r}: expected a chapter id or one of {", ".join(BASE_TREES)}')
+        selected += match
+    return selected
+
+
+def scan(targets, workers=None):
+    """Analyse every file of every target. Returns ({target: [file records]}, cache stats)."""
+    cache = load_cache()
+    files, results = cache['files'], cache['results']
+    listing, todo, used = {}, {}, set()
+    stats = {'files': 0, 'cached': 0, 'analysed': 0}
+    zip_members = {}
+    for target, path in targets:
+        if path.suffix == '.zip':
+            zip_members[target] = path
+            continue
+        entries = listing[target] = []
+        for name, full in tree_files(target, path):
+            st = os.stat(full)
+            rec = files.get(full)
+            used.add(full)
+            stats['files'] += 1
+            if rec and rec['size'] == st.st_size and rec['mtime_ns'] == st.st_mtime_ns and rec['sha256'] in results:
+                stats['cached'] += 1
+            else:
+                todo[full] = (name, st)
+            entries.append((name, full))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for full, (digest, result) in zip(todo, pool.map(analyse_file, [(n, f) for f, (n, _) in todo.items()],
+                                                             chunksize=8)):
+                st = todo[full][1]
+                files[full] = {'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                results[digest] = result
+                stats['analysed'] += 1
+
+    report = {}
+    for target, entries in listing.items():
+        report[target] = [dict(results[files[full]['sha256']], name=name, sha256=files[full]['sha256'])
+                          for name, full in entries]
+    for target, zip_path in zip_members.items():
+        report[target] = scan_zip(zip_path, results, stats)
+    save_cache(cache, used, [path for _target, path in targets if path.suffix != '.zip'])
+    return report, stats
+
+
+def scan_zip(zip_path, results, stats):
+    """Records for a packaged chapter that has no unpacked directory; packaged size comes from the zip."""
+    records = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            data = zf.read(info)
+            digest = hashlib.sha256(data).hexdigest()
+            stats['files'] += 1
+            if digest in results:
+                stats['cached'] += 1
+            else:
+                results[digest] = analyse_bytes(info.filename, data)
+                stats['analysed'] += 1
+            records.append(dict(results[digest], name=info.filename, sha256=digest, packaged=info.compress_size))
+    return records
+
+
+def load_budgets(path):
+    """Budget lookup: chapter id -> budget dict."""
+    overrides = json.loads(Path(path).read_text()) if path else {}
+    default = dict(DEFAULT_BUDGETS, **overrides.get('default', {}))
+    per_chapter = overrides.get('chapters', {})
+    unknown = {k for b in [default] + list(per_chapter.values()) for k in b} - set(DEFAULT_BUDGETS)
+    if unknown:
+        raise SystemExit(f'Unknown budget key(s): {", ".join(sorted(unknown))}')
+    return lambda chapter_id: dict(default, **per_chapter.get(chapter_id, {}))
+
+
+def summarise(records, budgets=None, top=10):
+    """Per-category totals, offenders and budget violations for one target."""
+    categories = {c: {'files': 0, 'size': 0, 'packaged': 0, 'decode': 0} for c in CATEGORIES}
+    seen, duplicate_bytes = set(), 0
+    for rec in records:
+        totals = categories[category_of(rec['name'])]
+        totals['files'] += 1
+        for key in ('size', 'packaged', 'decode'):
+            totals[key] += rec[key]
+        if rec['sha256'] in seen:
+            duplicate_bytes += rec['packaged']
+        seen.add(rec['sha256'])
+    total = {key: sum(c[key] for c in categories.values()) for key in ('files', 'size', 'packaged', 'decode')}
+    largest = sorted(records, key=lambda r: (-r['packaged'], r['name']))[:top]
+    heaviest = sorted((r for r in records if r['decode']), key=lambda r: (-r['decode'], r['name']))[:top]
+
+    violations = []
+    if budgets:
+        checks = [('packaged_total', total['packaged'], 'packaged size'),
+                  ('decode_total', total['decode'], 'image decode memory')]
+        checks += [(f'{c}_packaged', categories[c]['packaged'], f'{c} packaged size')
+                   for c in ('image', 'audio', 'data')]
+        violations += [f'{label} {fmt_bytes(value)} exceeds budget {fmt_bytes(budgets[key])}'
+                       for key, value, label in checks if value > budgets[key]]
+        for rec in sorted(records, key=lambda r: r['name']):
+            if rec['packaged'] > budgets['file_packaged']:
+                violations.append(f"{rec['name']}: packaged {fmt_bytes(rec['packaged'])} exceeds per-file budget "
+                                  f"{fmt_bytes(budgets['file_packaged'])}")
+            if rec['decode'] > budgets['file_decode']:
+                violations.append(f"{rec['name']}: {rec['width']}x{rec['height']} decodes to "
+                                  f"{fmt_bytes(rec['decode'])}, per-file budget {fmt_bytes(budgets['file_decode'])}")
+    return {'total': total, 'categories': categories, 'duplicate_packaged': duplicate_bytes,
+            'largest': largest, 'heaviest_decode': heaviest, 'violations': violations}
+
+
+def fmt_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} GB'
+
+
+def ratio(size, packaged):
+    return f'{packaged / size:.0%}' if size else '-'
+
+
+def print_summary(target, summary, top):
+    total = summary['total']
+    status = ''
+    if target.startswith('chapter:'):
+        status = ' OVER BUDGET' if summary['violations'] else ' within budget'
+    print(f"\n== {target} ({total['files']} files){status}")
+    print(f"  {'category':<9}{'files':>7}{'raw':>12}{'packaged':>12}{'ratio':>7}{'decode':>12}")
+    rows = [(c, summary['categories'][c]) for c in CATEGORIES if summary['categories'][c]['files']]
+    for name, c in rows + [('total', total)]:
+        decode = fmt_bytes(c['decode']) if c['decode'] else '-'
+        print(f"  {name:<9}{c['files']:>7}{fmt_bytes(c['size']):>12}{fmt_bytes(c['packaged']):>12}"
+              f"{ratio(c['size'], c['packaged']):>7}{decode:>12}")
+    if summary['duplicate_packaged']:
+        print(f"  duplicate content: {fmt_bytes(summary['duplicate_packaged'])} packaged")
+    if top:
+        print('  largest packaged:')
+        for rec in summary['largest']:
+            print(f"    {fmt_bytes(rec['packaged']):>10}  {rec['name']}")
+        if summary['heaviest_decode']:
+            print('  largest decoded:')
+            for rec in summary['heaviest_decode']:
+                print(f"    {fmt_bytes(rec['decode']):>10}  {rec['name']} ({rec['width']}x{rec['height']})")
+    for violation in summary['violations']:
+        print(f'  - OVER {violation}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report asset sizes and decode memory against chapter budgets')
+    parser.add_argument('targets', nargs='*', help=f'Chapter ids and/or base trees ({", ".join(BASE_TREES)}); '
+                                                   'default: all')
+    parser.add_argument('--budgets', help='JSON file overriding DEFAULT_BUDGETS ({"default": {...}, "chapters": '
+                                          '{"<id>": {...}}})')
+    parser.add_argument('--top', type=int, default=5, help='Offenders to list per target (default: 5)')
+    parser.add_argument('--json', metavar='PATH', help='Also write the full report as JSON')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    targets = discover_targets(args.targets)
+    budget_for = load_budgets(args.budgets)
+    records, stats = scan(targets, args.workers)
+    print(f"Scanned {stats['files']} files ({stats['cached']} cached, {stats['analysed']} analysed)")
+
+    report, over = {}, []
+    for target, _path in targets:
+        budgets = budget_for(target.split(':', 1)[1]) if target.startswith('chapter:') else None
+        summary = report[target] = summarise(records[target], budgets, args.top)
+        print_summary(target, summary, args.top)
+        if summary['violations']:
+            over.append(target)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+        print(f'\nWrote {args.json}')
+    if over:
+        print(f'\n{len(over)} chapter(s) over budget: {", ".join(over)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
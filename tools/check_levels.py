@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Check level files in bulk: layout grammar, grid size, objectives and hard textures.
+
+docs/schemas/level.json (tools/validate_all.py) checks field types. This tool
+checks what the schema cannot, using the game's own rules (layout_grammar.py):
+- the layout tokenises (0, 1-N, X, U, C, S, H{hits}:{type}) and no tile type
+  exceeds num_tile_types
+- it has grid_height rows of grid_width cells (the game pads or truncates
+  silently)
+- level_number matches the file name
+- unmovable_target is at most the U + H cells in the layout, collectible_target
+  at most the C cells plus hard cells that reveal a collectible, and a
+  spreader_target has S cells to start from. A target below what the layout
+  holds is a warning, since every existing level clears all of them
+- every hard_textures entry names a real file. Tile.gd resolves a bare name
+  as textures/<theme>/<name> (also trying .svg and .png), and a res:// path
+  as is. Unknown themes fall back to modern, like ThemeManager.set_theme. A
+  hard_textures type with no H cells in the layout is a warning
+
+Levels are checked across a process pool, in chunks, and each distinct layout
+token is classified once per worker (layout_grammar.scan_layout). Exit status
+is 1 if any level has an error.
+
+Usage:
+    python3 tools/check_levels.py                       # base levels and every DLC chapter
+    python3 tools/check_levels.py --source base --source gospels
+    python3 tools/check_levels.py build/generated       # any level_*.json files or directories
+    python3 tools/check_levels.py --json - --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from layout_grammar import scan_layout
+from pack_levels import ROOT, all_sources, level_files
+
+TEXTURES_DIR = ROOT / 'textures'
+THEMES = ('legacy', 'modern')
+DEFAULT_THEME = 'modern'
+LEVEL_FILE_RE = re.compile(r'^level_(\d+)\.json$')
+# Batches this small are checked in-process; starting a pool costs more than it saves
+INLINE_LIMIT = 64
+
+_textures = set()
+
+
+def _init_worker():
+    """Index every file under textures/ once, as repo-relative paths."""
+    _textures.clear()
+    for dirpath, _, files in os.walk(TEXTURES_DIR):
+        base = os.path.relpath(dirpath, ROOT).replace(os.sep, '/')
+        _textures.update(f'{base}/{name}' for name in files)
+
+
+def _int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def texture_exists(name, theme):
+    if name.startswith('res://'):
+        return name[len('res://'):] in _textures or (ROOT / name[len('res://'):]).is_file()
+    base = f'textures/{theme}/{name}'
+    return any(candidate in _textures for candidate in (base, base + '.svg', base + '.png'))
+
+
+def check_level(doc, number=None):
+    """(errors, warnings) for one parsed level; number is the one in its file name, if any."""
+    if not isinstance(doc, dict):
+        return ['level must be a JSON object'], []
+    errors, warnings = [], []
+    if number is not None and doc.get('level_number') != number:
+        errors.append(f"level_number {doc.get('level_number')!r} does not match the file name")
+    width = doc.get('grid_width', doc.get('width'))
+    height = doc.get('grid_height', doc.get('height'))
+    if not (_int(width) and _int(height) and width > 0 and height > 0):
+        return errors + [f'invalid grid size {width!r}x{height!r}'], warnings
+    num_tile_types = doc.get('num_tile_types')
+    if num_tile_types is not None and not (_int(num_tile_types) and num_tile_types > 0):
+        errors.append(f'num_tile_types must be a positive integer, not {num_tile_types!r}')
+        num_tile_types = None
+    if 'layout' not in doc:
+        return errors + ['missing layout'], warnings
+    counts, hard, problems = scan_layout(doc['layout'], width, height, num_tile_types)
+    errors += problems
+
+    reveals = doc.get('hard_reveals') if isinstance(doc.get('hard_reveals'), dict) else {}
+    revealed = sum(n for kind, n in hard.items()
+                   if isinstance(reveals.get(kind), dict) and reveals[kind].get('type') == 'collectible')
+    objectives = (
+        ('unmovable_target', counts.get('unmovable', 0) + counts.get('hard', 0), 'U/H cells'),
+        ('collectible_target', counts.get('collectible', 0) + revealed, 'collectibles (C cells and reveals)'),
+    )
+    for key, available, what in objectives:
+        target = doc.get(key, 0)
+        if not _int(target) or target < 0:
+            errors.append(f'{key} must be a non-negative integer, not {target!r}')
+        elif target > available:
+            errors.append(f'{key} is {target} but the layout has {available} {what}')
+        elif 0 < target < available:
+            warnings.append(f'{key} is {target} of the {available} {what} in the layout')
+    # spreader_target is a flag (clear every spreader) or a count; either way it needs S cells
+    spreader_target = doc.get('spreader_target', 0)
+    if not isinstance(spreader_target, (bool, int)) or spreader_target < 0:
+        errors.append(f'spreader_target must be a boolean or a non-negative integer, not {spreader_target!r}')
+    elif spreader_target and not counts.get('spreader'):
+        errors.append('spreader_target is set but the layout has no S cells')
+
+    textures = doc.get('hard_textures')
+    if textures is not None:
+        theme = str(doc.get('theme') or DEFAULT_THEME).lower()
+        theme = theme if theme in THEMES else DEFAULT_THEME
+        if not isinstance(textures, dict):
+            errors.append('hard_textures must map a hard type to a list of textures')
+            textures = {}
+        for kind, names in textures.items():
+            if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+                errors.append(f'hard_textures[{kind!r}] must be a list of texture names')
+                continue
+            missing = [n for n in names if not texture_exists(n, theme)]
+            if missing:
+                errors.append(f"hard_textures[{kind!r}]: no file for {', '.join(missing)} under textures/{theme}/")
+            if kind not in hard:
+                warnings.append(f'hard_textures[{kind!r}] is unused: the layout has no H cells of that type')
+    return errors, warnings
+
+
+def check_file(task):
+    """Worker: (source, path) -> result dict."""
+    source, path = task
+    match = LEVEL_FILE_RE.match(Path(path).name)
+    result = {'file': os.path.relpath(path, ROOT).replace(os.sep, '/'), 'source': source}
+    try:
+        doc = json.loads(Path(path).read_bytes().decode('utf-8'))
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        return dict(result, errors=[f'cannot parse: {e}'], warnings=[])
+    errors, warnings = check_level(doc, int(match.group(1)) if match else None)
+    return dict(result, errors=errors, warnings=warnings)
+
+
+def check_all(tasks, workers=None):
+    """check_file over (source, path) tasks, in task order."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= INLINE_LIMIT:
+        _init_worker()
+        return [check_file(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(check_file, tasks, chunksize=chunksize))
+
+
+def collect_tasks(paths, sources):
+    """(source, path) for the given files/directories, or for the named level sources."""
+    tasks = []
+    for arg in paths:
+        path = Path(arg)
+        if path.is_dir():
+            tasks += [(str(path), str(p)) for p in sorted(path.rglob('level_*.json'))]
+        else:
+            tasks.append((str(path.parent), str(path)))
+    for source in sources:
+        tasks += [(source, str(p)) for _, p in level_files(source)]
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check level layouts, objectives and hard textures in bulk')
+    parser.add_argument('paths', nargs='*', help='Level files or directories (default: base levels and every chapter)')
+    parser.add_argument('--source', action='append', help="Level source: 'base' or a chapter id (repeatable)")
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--json', metavar='PATH', help='Write results as JSON (- for stdout)')
+    parser.add_argument('--quiet', action='store_true', help='Do not list warnings')
+    args = parser.parse_args()
+
+    sources = args.source or ([] if args.paths else all_sources())
+    unknown = set(sources) - set(all_sources())
+    if unknown:
+        parser.error(f"unknown source(s): {', '.join(sorted(unknown))}")
+    started = time.perf_counter()
+    tasks = collect_tasks(args.paths, sources)
+    results = check_all(tasks, args.workers)
+    elapsed = time.perf_counter() - started
+
+    errors = sum(len(r['errors']) for r in results)
+    warnings = sum(len(r['warnings']) for r in results)
+    summary = {'levels': len(results), 'errors': errors, 'warnings': warnings,
+               'failed': sum(bool(r['errors']) for r in results), 'seconds': round(elapsed, 3)}
+    if args.json:
+        data = json.dumps({'summary': summary, 'results': [r for r in results if r['errors'] or r['warnings']]},
+                          indent=2)
+        if args.json == '-':
+            print(data)
+        else:
+            Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.json).write_text(data + '\n')
+    if args.json != '-':
+        for r in results:
+            for message in r['errors']:
+                print(f"  - ERROR {r['file']}: {message}")
+            for message in [] if args.quiet else r['warnings']:
+                print(f"  - WARNING {r['file']}: {message}")
+        by_source = {}
+        for r in results:
+            by_source[r['source']] = by_source.get(r['source'], 0) + 1
+        print(f"Checked {len(results)} level(s) from {len(by_source)} source(s) in {elapsed:.2f}s: "
+              f"{errors} error(s) in {summary['failed']} level(s), {warnings} warning(s)")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
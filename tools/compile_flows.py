@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Compile experience flows into pre-resolved artifacts under compiled/flows/.
+
+At runtime NodeTypeStepFactory merges every node that has a definition_id with
+data/flow_step_definitions/<id>.json, reading each definition file the first
+time it is used. This tool does that merge ahead of time (definition fields
+first, overridden by the node's own; the same result verify_definitions.py
+prints). It also merges nodes inside conditional branches, and drops the
+definition_id so the factory has nothing left to load. Each artifact
+(compiled/flows/<flow id>.json, compact JSON) keeps the flow's top-level
+fields and adds:
+
+    "compiled":   {"format": 2, "source": "data/experience_flows/<id>.json",
+                   "definitions": {"flow/3": "reward_coins", ...},
+                   "inputs": {"data/experience_flows/<id>.json": sha256, ...},
+                   "inputs_sha256": sha256 of the sorted inputs map}
+    "node_index": {"ids": {node id: index}, "levels": {level id: index},
+                   "types": {type: [index, ...]}}
+
+A flow is not compiled if a definition_id has no file in
+data/flow_step_definitions/, or if a narrative_stage node names a stage with
+no data/narrative_stages/<id>.json. In those cases any old artifact is
+removed, so the game falls back to the source flow. Test-only flows (test_*,
+*_test) with such errors are reported as warnings and skipped, so they do not
+fail the build.
+
+Freshness is checked at build time, not at load: build-android.sh compiles
+and then runs --check, and stops before exporting if any artifact is stale.
+At runtime FlowCoordinator only checks the artifact's format and stamp, so
+starting a flow stays a single file load. In the editor it loads the source
+flows, which change under it.
+
+Builds are incremental. .cache/compile_flows.json records the hash of every
+input (the flow, each referenced definition and stage file, and this script).
+A flow is only recompiled when one of those changes or its artifact was
+touched.
+
+Usage:
+    python3 tools/compile_flows.py            # compile changed flows
+    python3 tools/compile_flows.py --force    # recompile everything
+    python3 tools/compile_flows.py --check    # exit 1 if any artifact is stale
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from content_index import DEFS_DIR, ROOT, STAGES_DIR, load_index
+
+# Outside build/, which export_presets.cfg keeps out of the .pck; these ship with the game
+OUTPUT_DIR = ROOT / 'compiled' / 'flows'
+CACHE_PATH = ROOT / '.cache' / 'compile_flows.json'
+COMPILED_FORMAT = 2
+BRANCH_KEYS = ('then', 'else', 'true_branch', 'false_branch')
+# Test-only flows (test_*, *_test) may reference stages that do not exist; their errors do not fail the build
+TEST_FLOW_RE = re.compile(r'^test_|_test$')
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, '/')
+
+
+def file_sha(path):
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+class FlowCompiler:
+    """Resolves one flow's nodes against the index, collecting its inputs and problems."""
+
+    def __init__(self, index, flow_id):
+        self.index = index
+        self.flow_id = flow_id
+        self.inputs = {rel(index.path_of('flows', flow_id)): index.hashes[index.path_of('flows', flow_id)]}
+        self.definitions = {}
+        self.errors = []
+
+    def _input(self, section, key, fallback):
+        """Record a referenced file's hash (None while it does not exist); True if it parsed."""
+        path = self.index.path_of(section, key)
+        if path is None:
+            self.inputs[rel(fallback)] = None
+            return False
+        self.inputs[rel(path)] = self.index.hashes[path]
+        return key in getattr(self.index, section)
+
+    def resolve(self, node, path):
+        if not isinstance(node, dict):
+            return node
+        def_id = node.get('definition_id')
+        if def_id:
+            if self._input('definitions', def_id, DEFS_DIR / f'{def_id}.json'):
+                self.definitions[path] = def_id
+                merged = dict(self.index.definitions[def_id])
+                merged.update(node)
+                node = merged
+                del node['definition_id']
+            else:
+                self.errors.append(f'{path}: definition {def_id!r} has no file in data/flow_step_definitions/')
+        if node.get('type') == 'narrative_stage' and node.get('id'):
+            if not self._input('stages', node['id'], STAGES_DIR / f"{node['id']}.json"):
+                self.errors.append(f"{path}: narrative stage {node['id']!r} has no file in data/narrative_stages/")
+        for key in BRANCH_KEYS:
+            branch = node.get(key)
+            if isinstance(branch, dict):
+                node = dict(node, **{key: self.resolve(branch, f'{path}/{key}')})
+            elif isinstance(branch, list):
+                node = dict(node, **{key: [self.resolve(n, f'{path}/{key}/{i}') for i, n in enumerate(branch)]})
+        return node
+
+    def compile(self):
+        """The artifact dict, or None if the flow has errors."""
+        flow = self.index.flows[self.flow_id]
+        nodes = flow.get('flow') if isinstance(flow, dict) else None
+        if not isinstance(nodes, list):
+            self.errors.append("missing 'flow' array")
+            return None
+        resolved = [self.resolve(node, f'flow/{i}') for i, node in enumerate(nodes)]
+        if self.errors:
+            return None
+        ids, levels, types = {}, {}, {}
+        for i, node in enumerate(resolved):
+            if not isinstance(node, dict):
+                continue
+            kind = node.get('type', '')
+            types.setdefault(kind, []).append(i)
+            if node.get('id'):
+                # First occurrence wins, like FlowCoordinator._find_level_node_index's scan
+                ids.setdefault(node['id'], i)
+                if kind == 'level':
+                    levels.setdefault(node['id'], i)
+        artifact = {k: v for k, v in flow.items() if k != 'flow'}
+        artifact['compiled'] = {'format': COMPILED_FORMAT, 'source': next(iter(self.inputs)),
+                                'definitions': self.definitions, 'inputs': self.inputs,
+                                'inputs_sha256': inputs_sha(self.inputs)}
+        artifact['node_index'] = {'ids': ids, 'levels': levels, 'types': types}
+        artifact['flow'] = resolved
+        return artifact
+
+
+def inputs_sha(inputs):
+    """One stamp for a set of inputs: the sha256 of their sorted {path: sha256} map."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def load_cache():
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    return cache.get('flows', {}) if cache.get('format') == COMPILED_FORMAT else {}
+
+
+def save_cache(flows):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps({'format': COMPILED_FORMAT, 'flows': flows}, sort_keys=True))
+    os.replace(tmp, CACHE_PATH)
+
+
+def output_stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def render(artifact):
+    return json.dumps(artifact, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile data/experience_flows into pre-resolved compiled/flows artifacts')
+    parser.add_argument('--force', action='store_true', help='Recompile every flow')
+    parser.add_argument('--check', action='store_true', help='Do not write; exit 1 if any artifact is stale')
+    args = parser.parse_args()
+
+    index = load_index()
+    for path, error in sorted(index.errors.items()):
+        print(f'  - ERROR {rel(path)}: {error}')
+    tool_sha = file_sha(__file__)
+    # Every input is an indexed file, so its current hash is already known; None means it is missing
+    hashes = {rel(path): digest for path, digest in index.hashes.items()}
+    previous = {} if args.force else load_cache()
+    records, stale, written = {}, [], 0
+
+    for flow_id in sorted(index.flows):
+        out_path = OUTPUT_DIR / f'{flow_id}.json'
+        rec = previous.get(flow_id)
+        if rec and rec['tool'] == tool_sha and rec['output'] == output_stamp(out_path) \
+                and all(hashes.get(path) == digest for path, digest in rec['inputs'].items()):
+            records[flow_id] = rec
+            continue
+        compiler = FlowCompiler(index, flow_id)
+        artifact = compiler.compile()
+        rec = {'inputs': compiler.inputs, 'tool': tool_sha, 'ok': artifact is not None, 'errors': compiler.errors}
+        if artifact is None:
+            if out_path.exists():
+                stale.append(flow_id)
+                if not args.check:
+                    out_path.unlink()
+        else:
+            data = render(artifact)
+            current = out_path.read_bytes() if out_path.exists() else None
+            if current != data:
+                stale.append(flow_id)
+                if not args.check:
+                    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+                    tmp = out_path.with_name(out_path.name + '.tmp')
+                    tmp.write_bytes(data)
+                    os.replace(tmp, out_path)
+                    written += 1
+        rec['output'] = output_stamp(out_path)
+        records[flow_id] = rec
+
+    # Artifacts whose source flow is gone
+    for path in sorted(OUTPUT_DIR.glob('*.json')) if OUTPUT_DIR.is_dir() else []:
+        if path.stem not in index.flows:
+            stale.append(path.stem)
+            if not args.check:
+                path.unlink()
+
+    failed = [flow_id for flow_id, rec in records.items() if not rec['ok'] and not TEST_FLOW_RE.search(flow_id)]
+    skipped = [flow_id for flow_id, rec in records.items() if not rec['ok'] and TEST_FLOW_RE.search(flow_id)]
+    for flow_id, rec in records.items():
+        for error in rec['errors']:
+            level = 'WARNING' if flow_id in skipped else 'ERROR'
+            print(f'  - {level} {flow_id}: {error}')
+    if args.check:
+        print(f'{rel(OUTPUT_DIR)}: {"STALE: " + ", ".join(stale) if stale else "up to date"}')
+        sys.exit(1 if stale or failed else 0)
+    save_cache(records)
+    compiled = len(records) - len(failed) - len(skipped)
+    print(f'{rel(OUTPUT_DIR)}: {compiled} of {len(records)} flow(s) compiled, {written} written, '
+          f'{compiled - written} unchanged, {len(failed)} with errors, {len(skipped)} test flow(s) skipped')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Shared in-memory index of the game's flow and narrative content.
+
+One pass loads:
+- data/experience_flows/*.json            flows, by experience file stem
+- data/flow_step_definitions/*.json       definitions, by definition id (archived/ kept apart)
+- data/narrative_stages/*.json            narrative stages, by stage id
+- data/narrative_stages/levels/*.json     per-level stages, by level number
+- data/effects/effects_registry.json      effects, by effect id
+- data/levels/level_XX.json               levels, by level number
+
+and cross-references them: definition_usages maps a definition id to every
+flow node that names it, in file order.
+
+Parsed files are cached in .cache/content_index.json keyed by content hash.
+A file whose size and mtime are unchanged is not read at all, so a warm index
+costs a stat per file plus one JSON load.
+
+    from content_index import load_index
+    index = load_index()
+    index.definitions['reward_coins'], index.definition_usages['reward_coins']
+
+Run directly to print a summary (--no-cache for a cold build).
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / 'data'
+FLOWS_DIR = DATA_DIR / 'experience_flows'
+DEFS_DIR = DATA_DIR / 'flow_step_definitions'
+ARCHIVED_DEFS_DIR = DEFS_DIR / 'archived'
+STAGES_DIR = DATA_DIR / 'narrative_stages'
+LEVEL_STAGES_DIR = STAGES_DIR / 'levels'
+REGISTRY = DATA_DIR / 'effects' / 'effects_registry.json'
+LEVELS_DIR = DATA_DIR / 'levels'
+CACHE_PATH = ROOT / '.cache' / 'content_index.json'
+CACHE_FORMAT = 1
+LEVEL_FILE_RE = re.compile(r'^level_(\d+)\.json$')
+
+# (index section, directory, glob); the registry is a single file
+SECTIONS = (
+    ('flows', FLOWS_DIR, '*.json'),
+    ('definitions', DEFS_DIR, '*.json'),
+    ('archived_definitions', ARCHIVED_DEFS_DIR, '*.json'),
+    ('stages', STAGES_DIR, '*.json'),
+    ('level_stages', LEVEL_STAGES_DIR, '*.json'),
+    ('levels', LEVELS_DIR, 'level_*.json'),
+)
+
+
+class ContentIndex:
+    """Parsed content plus cross-reference maps. Paths are absolute Path objects.
+
+    hashes maps every indexed path to the sha256 of its bytes, for tools that
+    key their own caches on these inputs.
+    """
+
+    def __init__(self):
+        self.flows = {}
+        self.definitions = {}
+        self.archived_definitions = {}
+        self.stages = {}
+        self.level_stages = {}
+        self.levels = {}
+        self.registry = {}
+        self.effects = {}
+        self.paths = {}
+        self.hashes = {}
+        self.definition_usages = defaultdict(list)
+        self.errors = {}
+        self.stats = {'files': 0, 'cached': 0, 'parsed': 0, 'seconds': 0.0}
+
+    def path_of(self, section, key):
+        """Source file of an entry, e.g. path_of('stages', 'creation_day_1')."""
+        return self.paths.get((section, key))
+
+    def flow_nodes(self):
+        """(flow file name, index, node) for every top-level node of every flow."""
+        for flow_id, flow in self.flows.items():
+            name = self.paths[('flows', flow_id)].name
+            for idx, node in enumerate(flow.get('flow', []) if isinstance(flow, dict) else []):
+                yield name, idx, node
+
+    def _add(self, section, path, doc):
+        if section == 'registry':
+            self.registry = doc or {}
+            self.paths[('registry', path.stem)] = path
+            return
+        key = path.stem
+        match = LEVEL_FILE_RE.match(path.name)
+        # Levels and level stages are keyed by number; narrative_stages/levels/default.json keeps its stem
+        if section in ('levels', 'level_stages') and match:
+            key = int(match.group(1))
+        # Files that failed to parse keep their path (so they still count as present) but get no entry
+        if doc is not None:
+            getattr(self, section)[key] = doc
+        self.paths[(section, key)] = path
+
+    def _cross_reference(self):
+        for effect in self.registry.get('effects', []) if isinstance(self.registry, dict) else []:
+            if isinstance(effect, dict) and 'id' in effect:
+                self.effects[effect['id']] = effect
+        for name, idx, node in self.flow_nodes():
+            def_id = node.get('definition_id') if isinstance(node, dict) else None
+            if def_id:
+                self.definition_usages[def_id].append((name, idx, node))
+
+
+def source_files():
+    """(section, path, stat) for every indexed file, in a stable order."""
+    files = []
+    for section, directory, pattern in SECTIONS:
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            continue
+        files += [(section, Path(e.path), e.stat()) for e in entries
+                  if e.is_file() and fnmatch.fnmatchcase(e.name, pattern)]
+    if REGISTRY.is_file():
+        files.append(('registry', REGISTRY, REGISTRY.stat()))
+    return files
+
+
+def _load_cache():
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    return cache.get('files', {}) if cache.get('format') == CACHE_FORMAT else {}
+
+
+def _save_cache(files):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps({'format': CACHE_FORMAT, 'files': files}, separators=(',', ':')))
+    os.replace(tmp, CACHE_PATH)
+
+
+def load_index(use_cache=True):
+    """Build the content index, reusing cached parses for unchanged files."""
+    started = time.perf_counter()
+    index = ContentIndex()
+    previous = _load_cache() if use_cache else {}
+    records, dirty = {}, not use_cache
+    for section, path, st in source_files():
+        rel = os.path.relpath(path, ROOT).replace(os.sep, '/')
+        rec = previous.get(rel)
+        index.stats['files'] += 1
+        if rec and rec['size'] == st.st_size and rec['mtime_ns'] == st.st_mtime_ns:
+            index.stats['cached'] += 1
+        else:
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if not rec or rec['sha256'] != digest:
+                try:
+                    rec = {'doc': json.loads(data.decode('utf-8')), 'error': None}
+                except (UnicodeDecodeError, ValueError) as e:
+                    rec = {'doc': None, 'error': str(e)}
+                index.stats['parsed'] += 1
+            else:
+                index.stats['cached'] += 1
+            rec = dict(rec, sha256=digest, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            dirty = True
+        records[rel] = rec
+        index.hashes[path] = rec['sha256']
+        if rec['error'] is not None:
+            index.errors[path] = rec['error']
+        index._add(section, path, rec['doc'])
+    index._cross_reference()
+    if use_cache and (dirty or set(records) != set(previous)):
+        _save_cache(records)
+    index.stats['seconds'] = time.perf_counter() - started
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the shared content index and print a summary')
+    parser.add_argument('--no-cache', action='store_true', help='Parse every file and do not touch the cache')
+    args = parser.parse_args()
+
+    index = load_index(use_cache=not args.no_cache)
+    s = index.stats
+    print(f"Indexed {s['files']} files in {s['seconds'] * 1000:.1f} ms ({s['cached']} cached, {s['parsed']} parsed)")
+    print(f'  flows: {len(index.flows)}, definitions: {len(index.definitions)} '
+          f'(+{len(index.archived_definitions)} archived), stages: {len(index.stages)}, '
+          f'level stages: {len(index.level_stages)}, levels: {len(index.levels)}, effects: {len(index.effects)}')
+    print(f'  definition ids referenced by flows: {len(index.definition_usages)}')
+    for path, error in sorted(index.errors.items()):
+        print(f'  - ERROR {path.relative_to(ROOT)}: {error}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Per-effect validators compiled from data/effects/effects_registry.json.
+
+Each registry entry becomes one generated Python function that checks an
+effect's params against the entry's param specs. The supported spec keys are:
+
+    type       number | integer | string | boolean | array | object | timeline
+    minimum    inclusive lower bound (number and integer)
+    maximum    inclusive upper bound (number and integer)
+    enum       list of allowed values
+    required   true if the effect cannot run without the param (its executor
+               bails out when it is missing, rather than using a default)
+
+Other keys (description, example, default) only document the param.
+
+Bools are not numbers here, even though Python treats them as ints. A
+`timeline` param is a list of steps, as timeline_sequence runs them. Each step
+may have a delay (a number >= 0) and an effect, a binding ({effect, params})
+or a callable ({node, method}). A step's effect is checked by its own
+validator, so timelines nested inside timelines are checked too. Params the
+registry does not list are allowed, because executors read extra keys
+(params.get with a default). Adding an effect type, or tightening one, only
+needs a registry edit.
+
+The generated source is cached in .cache/effect_validators.py. Its first line
+records the hashes of the registry and of this script, and the source is only
+regenerated when either changes.
+
+Effects are found in two places:
+- flows: node.effect and node.metadata.effects[], as {type, params}; nodes
+  inside conditional branches are included
+- narrative stages: stage.effects[], as {on, effect, params}
+
+    from effect_validators import load_validators, flow_effect_errors
+    errors = flow_effect_errors(flow, load_validators())   # [{'path', 'message'}]
+
+Usage:
+    python3 tools/effect_validators.py                            # check every flow and narrative stage
+    python3 tools/effect_validators.py --show                     # print the generated source
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import types
+from pathlib import Path
+
+from content_index import REGISTRY, ROOT, load_index
+
+CACHE_PATH = ROOT / '.cache' / 'effect_validators.py'
+BRANCH_KEYS = ('then', 'else', 'true_branch', 'false_branch')
+
+# Spec type -> (expression that is true for a valid `value`, name used in messages)
+TYPE_CHECKS = {
+    'number': ('type(value) in (int, float)', 'number'),
+    'integer': ('type(value) is int', 'integer'),
+    'string': ('type(value) is str', 'string'),
+    'boolean': ('type(value) is bool', 'boolean'),
+    'array': ('type(value) is list', 'array'),
+    'object': ('type(value) is dict', 'object'),
+    'timeline': ('type(value) is list', 'array of timeline steps'),
+}
+
+# Shared by every generated module: dispatch and the timeline step walker
+PRELUDE = '''
+_MISSING = object()
+
+
+def check_effect(name, params, path, errors):
+    """Check one effect by registry id; unknown ids are errors."""
+    check = VALIDATORS.get(name) if type(name) is str else None
+    if check is None:
+        errors.append({'path': path, 'message': f'unknown effect type {name!r}'})
+        return
+    if params is _MISSING:
+        params = {}
+    elif type(params) is not dict:
+        errors.append({'path': path + '/params', 'message': 'params expected object'})
+        return
+    check(params, path + '/params', errors)
+
+
+def _check_timeline(steps, path, errors):
+    for i, step in enumerate(steps):
+        where = f'{path}/{i}'
+        if type(step) is not dict:
+            errors.append({'path': where, 'message': 'timeline step expected object'})
+            continue
+        delay = step.get('delay', 0)
+        if type(delay) not in (int, float) or delay < 0:
+            errors.append({'path': where + '/delay', 'message': 'delay expected a number >= 0'})
+        if 'effect' in step and 'binding' not in step:
+            check_effect(step['effect'], step.get('params', _MISSING), where, errors)
+        elif 'binding' in step:
+            binding = step['binding']
+            if type(binding) is not dict or 'effect' not in binding:
+                errors.append({'path': where + '/binding', 'message': 'binding expected an object with an effect'})
+            else:
+                check_effect(binding['effect'], binding.get('params', _MISSING), where + '/binding', errors)
+        elif 'callable' in step:
+            call = step['callable']
+            if type(call) is not dict or type(call.get('node')) is not str or type(call.get('method')) is not str:
+                errors.append({'path': where + '/callable', 'message': 'callable expected node and method strings'})
+'''
+
+
+def file_sha(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _function_name(n, effect_id):
+    return f"_check_{n}_{re.sub(r'[^0-9A-Za-z_]', '_', effect_id)}"
+
+
+def _param_lines(key, spec):
+    """Source lines checking params[key] against one spec (indented for a function body)."""
+    lines = [f'    value = params.get({key!r}, _MISSING)', '    if value is _MISSING:']
+    where = f'path + {"/" + key!r}'
+    if spec.get('required'):
+        lines.append(f"        errors.append({{'path': path, 'message': {f'missing required param {key!r}'!r}}})")
+    else:
+        lines.append('        pass')
+    # One error per param: the type check comes first, so a range is only tested on a number
+    checks = []
+    kind = spec.get('type')
+    if kind in TYPE_CHECKS:
+        test, label = TYPE_CHECKS[kind]
+        checks.append((f'not ({test})', f'{key} expected {label}'))
+    if kind in (None, 'number', 'integer'):
+        numeric = '' if kind else 'type(value) in (int, float) and '
+        if isinstance(spec.get('minimum'), (int, float)):
+            checks.append((f"{numeric}value < {spec['minimum']!r}", f"{key} must be >= {spec['minimum']}"))
+        if isinstance(spec.get('maximum'), (int, float)):
+            checks.append((f"{numeric}value > {spec['maximum']!r}", f"{key} must be <= {spec['maximum']}"))
+    if isinstance(spec.get('enum'), list):
+        allowed = tuple(spec['enum'])
+        checks.append((f'value not in {allowed!r}', f'{key} must be one of {", ".join(map(str, allowed))}'))
+    if not checks and kind != 'timeline' and not spec.get('required'):
+        return []
+    for test, message in checks:
+        lines += [f'    elif {test}:', f"        errors.append({{'path': {where}, 'message': {message!r}}})"]
+    if kind == 'timeline':
+        lines += ['    else:', f'        _check_timeline(value, {where}, errors)']
+    return lines
+
+
+def generate_source(registry, registry_sha):
+    """Python source for one validator function per registry effect, plus the VALIDATORS table."""
+    effects = [e for e in registry.get('effects', []) if isinstance(e, dict) and isinstance(e.get('id'), str)] \
+        if isinstance(registry, dict) else []
+    out = [f'# registry {registry_sha} generator {file_sha(__file__)}',
+           '# Generated by tools/effect_validators.py from data/effects/effects_registry.json; do not edit.',
+           PRELUDE]
+    table = []
+    for n, effect in enumerate(effects):
+        name = _function_name(n, effect['id'])
+        params = effect.get('params') if isinstance(effect.get('params'), dict) else {}
+        body = []
+        for key, spec in params.items():
+            body += _param_lines(key, spec if isinstance(spec, dict) else {})
+        out += ['', f'def {name}(params, path, errors):', f'    {"Params of the " + effect["id"] + " effect."!r}'] + body + ['']
+        table.append(f'    {effect["id"]!r}: {name},')
+    out += ['', 'VALIDATORS = {'] + table + ['}', '']
+    return '\n'.join(out)
+
+
+_loaded = {}
+
+
+def load_validators(registry_path=REGISTRY, use_cache=True):
+    """The compiled validator module for the registry's current content.
+
+    The module has check_effect(name, params, path, errors) and VALIDATORS
+    ({effect id: function}). It is memoised per registry hash in-process and
+    on disk in .cache/effect_validators.py.
+    """
+    data = Path(registry_path).read_bytes()
+    registry_sha = hashlib.sha256(data).hexdigest()
+    if registry_sha in _loaded:
+        return _loaded[registry_sha]
+    header = f'# registry {registry_sha} generator {file_sha(__file__)}'
+    source = None
+    if use_cache:
+        try:
+            cached = CACHE_PATH.read_text()
+        except OSError:
+            cached = ''
+        if cached.split('\n', 1)[0] == header:
+            source = cached
+    if source is None:
+        try:
+            registry = json.loads(data.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            registry = {}
+        source = generate_source(registry, registry_sha)
+        if use_cache:
+            CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+            tmp.write_text(source)
+            os.replace(tmp, CACHE_PATH)
+    module = types.ModuleType('effect_validators_compiled')
+    module.__file__ = str(CACHE_PATH)
+    exec(compile(source, str(CACHE_PATH), 'exec'), module.__dict__)
+    module.REGISTRY_SHA = registry_sha
+    module.SOURCE = source
+    _loaded[registry_sha] = module
+    return module
+
+
+def flow_nodes(flow):
+    """(path, node) for every node of a flow, including nodes inside conditional branches."""
+    nodes = flow.get('flow') if isinstance(flow, dict) else None
+    stack = [(f'flow/{i}', n) for i, n in enumerate(nodes)][::-1] if isinstance(nodes, list) else []
+    while stack:
+        path, node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        yield path, node
+        for key in BRANCH_KEYS:
+            branch = node.get(key)
+            if isinstance(branch, dict):
+                stack.append((f'{path}/{key}', branch))
+            elif isinstance(branch, list):
+                stack += [(f'{path}/{key}/{i}', n) for i, n in enumerate(branch)][::-1]
+
+
+def flow_effect_errors(flow, validators):
+    """[{'path', 'message'}] for every node effect in a flow."""
+    errors = []
+    for path, node in flow_nodes(flow):
+        effects = []
+        metadata = node.get('metadata')
+        if isinstance(metadata, dict) and isinstance(metadata.get('effects'), list):
+            effects += [(f'{path}/metadata/effects/{j}', e) for j, e in enumerate(metadata['effects'])]
+        if 'effect' in node:
+            effects.append((f'{path}/effect', node['effect']))
+        for where, effect in effects:
+            if not isinstance(effect, dict) or 'type' not in effect:
+                errors.append({'path': where, 'message': 'malformed effect (expected an object with a type)'})
+                continue
+            validators.check_effect(effect['type'], effect.get('params', validators._MISSING), where, errors)
+    return errors
+
+
+def stage_effect_errors(stage, validators):
+    """[{'path', 'message'}] for every effect binding in a narrative stage."""
+    errors = []
+    effects = stage.get('effects') if isinstance(stage, dict) else None
+    for i, binding in enumerate(effects if isinstance(effects, list) else []):
+        where = f'effects/{i}'
+        if not isinstance(binding, dict) or 'effect' not in binding:
+            errors.append({'path': where, 'message': 'malformed effect binding (expected an object with an effect)'})
+            continue
+        validators.check_effect(binding['effect'], binding.get('params', validators._MISSING), where, errors)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check every flow and narrative stage effect against the effects registry')
+    parser.add_argument('--show', action='store_true', help='Print the generated validator source and exit')
+    parser.add_argument('--no-cache', action='store_true', help='Regenerate the validators and do not touch the cache')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    validators = load_validators(use_cache=not args.no_cache)
+    compiled = time.perf_counter()
+    if args.show:
+        print(validators.SOURCE)
+        return 0
+    index = load_index()
+    indexed = time.perf_counter()
+    failures, checked = [], 0
+    for flow_id in sorted(index.flows):
+        checked += 1
+        failures += [(index.path_of('flows', flow_id), e) for e in flow_effect_errors(index.flows[flow_id], validators)]
+    for section in ('stages', 'level_stages'):
+        stages = getattr(index, section)
+        for key in sorted(stages, key=str):
+            checked += 1
+            failures += [(index.path_of(section, key), e) for e in stage_effect_errors(stages[key], validators)]
+    done = time.perf_counter()
+    for path, error in failures:
+        print(f"  - {os.path.relpath(path, ROOT)}: {error['path']}: {error['message']}")
+    print(f'Checked effects in {checked} file(s) against {len(validators.VALIDATORS)} effect type(s): '
+          f'{len(failures)} error(s) (validators {(compiled - started) * 1000:.1f} ms, '
+          f'index {(indexed - compiled) * 1000:.1f} ms, checks {(done - indexed) * 1000:.1f} ms)')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Write minified, key-sorted copies of the shipped data into build/export/.
+
+Authors keep editing the readable sources. Those are indented with tabs in
+world_map.json, 4 spaces in main_story.json and 2 spaces elsewhere. The export
+tree mirrors the source paths:
+
+    data/**                              -> build/export/data/**
+    dlc_server/dlc/chapters/<id>/**      -> build/export/dlc_server/dlc/chapters/<id>/**
+
+Every .json file is written as compact JSON (no whitespace, keys sorted,
+UTF-8 instead of \\u escapes), so the same content always produces the same
+bytes. Each copy is parsed back and compared with its source before it is
+written. Other files (images, .po catalogues) are copied byte for byte.
+Precompressed .gz siblings and chapter .zip archives are build products of
+their own and are left out.
+
+build/ is excluded from the game's .pck by every preset in export_presets.cfg,
+so this tree is an input for packaging steps, never shipped by accident.
+
+Builds are incremental. .cache/export_data.json records each source's
+size, mtime and sha256, and the stamp of the copy written for it. A file is
+only reprocessed when its source hash changes, its copy was touched, or this
+script changed. Changed files are processed across a process pool. Copies
+whose source is gone are removed.
+
+The report lists, per directory, the source and exported bytes of the JSON
+and the time Python's json.loads takes on each (best of 3). That time is a
+stand-in for the game's JSON.parse, which scans the same bytes.
+
+Usage:
+    python3 tools/export_data.py                  # export changed files
+    python3 tools/export_data.py --force          # re-export everything
+    python3 tools/export_data.py --check          # exit 1 if the export tree is stale
+    python3 tools/export_data.py --keep-key-order # minify without sorting keys
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from content_index import ROOT
+
+EXPORT_DIR = ROOT / 'build' / 'export'
+CACHE_PATH = ROOT / '.cache' / 'export_data.json'
+CACHE_FORMAT = 1
+SOURCE_ROOTS = ('data', 'dlc_server/dlc/chapters')
+SKIP_SUFFIXES = ('.gz', '.zip', '.tmp')
+PARSE_REPEATS = 3
+# Batches this small are exported in-process; starting a pool costs more than it saves
+INLINE_LIMIT = 16
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, '/')
+
+
+def source_files():
+    """{relative path: stat} for every exported source file, skipping hidden directories."""
+    files = {}
+    for root in SOURCE_ROOTS:
+        for dirpath, dirs, names in os.walk(ROOT / root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            if root.startswith('dlc_server') and os.path.normpath(dirpath) == os.path.normpath(ROOT / root):
+                # Only the unpacked chapter directories; the chapter zips sit next to them
+                names = []
+            for name in sorted(names):
+                if name.startswith('.') or name.endswith(SKIP_SUFFIXES):
+                    continue
+                path = os.path.join(dirpath, name)
+                files[rel(path)] = os.stat(path)
+    return files
+
+
+def _parse_seconds(text):
+    best = None
+    for _ in range(PARSE_REPEATS):
+        started = time.perf_counter()
+        json.loads(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def minify(doc, sort_keys=True):
+    return json.dumps(doc, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False)
+
+
+def export_file(task):
+    """Worker: write one export copy if its bytes differ. Returns the file's cache record."""
+    path, sha, sort_keys = task
+    src, out = ROOT / path, EXPORT_DIR / path
+    data = src.read_bytes()
+    rec = {'sha': sha, 'size': len(data), 'json': path.endswith('.json'), 'error': None}
+    if rec['json']:
+        try:
+            text = data.decode('utf-8-sig')
+            doc = json.loads(text)
+        except (UnicodeDecodeError, ValueError) as e:
+            # Ship an unparseable file unchanged; validate_all reports it
+            rec['error'] = f'cannot parse: {e}'
+            output = data
+        else:
+            minified = minify(doc, sort_keys)
+            if json.loads(minified) != doc:
+                raise ValueError(f'{path}: minified copy does not round-trip')
+            output = minified.encode('utf-8')
+            rec['parse'] = [_parse_seconds(text), _parse_seconds(minified)]
+    else:
+        output = data
+    rec['out_size'] = len(output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if not out.exists() or out.read_bytes() != output:
+        tmp = out.with_name(out.name + '.tmp')
+        if rec['json']:
+            tmp.write_bytes(output)
+        else:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, out)
+        rec['written'] = True
+    st = out.stat()
+    rec['output'] = [st.st_size, st.st_mtime_ns]
+    return rec
+
+
+def run_exports(tasks, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= INLINE_LIMIT:
+        return [export_file(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(export_file, tasks, chunksize=chunksize))
+
+
+def file_sha(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def load_cache(tool):
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    if cache.get('format') != CACHE_FORMAT or cache.get('tool') != tool:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(tool, files):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps({'format': CACHE_FORMAT, 'tool': tool, 'files': files}, separators=(',', ':')))
+    os.replace(tmp, CACHE_PATH)
+
+
+def output_stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def report(records):
+    """Per-directory JSON size and parse time, source vs export."""
+    rows = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+    for path, rec in records.items():
+        if not rec['json'] or rec['error']:
+            continue
+        row = rows[os.path.dirname(path)]
+        row[0] += 1
+        row[1] += rec['size']
+        row[2] += rec['out_size']
+        row[3] += rec['parse'][0]
+        row[4] += rec['parse'][1]
+    total = [0, 0, 0, 0.0, 0.0]
+    print(f"  {'directory':44} {'files':>5} {'source':>10} {'export':>10} {'saved':>6} "
+          f"{'parse ms':>9} {'export ms':>9}")
+    for directory, row in sorted(rows.items()):
+        total = [a + b for a, b in zip(total, row)]
+        _report_row(directory, row)
+    _report_row('total', total)
+
+
+def _report_row(name, row):
+    files, size, out_size, parse, out_parse = row
+    saved = 1 - out_size / size if size else 0.0
+    print(f'  {name:44} {files:5} {size:10,} {out_size:10,} {saved:6.1%} {parse * 1000:9.2f} {out_parse * 1000:9.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write minified, key-sorted copies of shipped data to build/export')
+    parser.add_argument('--force', action='store_true', help='Re-export every file')
+    parser.add_argument('--check', action='store_true', help='Do not write; exit 1 if the export tree is stale')
+    parser.add_argument('--keep-key-order', action='store_true', help='Minify without sorting object keys')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    sort_keys = not args.keep_key_order
+    tool = f'{file_sha(__file__)}:{int(sort_keys)}'
+    previous = {} if args.force else load_cache(tool)
+    sources = source_files()
+    records, tasks, stale = {}, [], []
+    for path, st in sources.items():
+        rec = previous.get(path)
+        if rec and rec['stamp'] == [st.st_size, st.st_mtime_ns]:
+            sha = rec['sha']
+        else:
+            sha = file_sha(ROOT / path)
+        if rec and rec['sha'] == sha and rec['output'] == output_stamp(EXPORT_DIR / path):
+            records[path] = dict(rec, stamp=[st.st_size, st.st_mtime_ns])
+            continue
+        tasks.append((path, sha, sort_keys))
+        stale.append(path)
+
+    # Copies whose source is gone
+    orphans = []
+    for root in SOURCE_ROOTS:
+        for dirpath, _, names in os.walk(EXPORT_DIR / root):
+            for name in names:
+                path = rel(os.path.join(dirpath, name))[len(rel(EXPORT_DIR)) + 1:]
+                if path not in sources:
+                    orphans.append(path)
+
+    if args.check:
+        for path in stale + orphans:
+            print(f'  - STALE {path}')
+        status = f'STALE: {len(stale) + len(orphans)} file(s)' if stale or orphans else 'up to date'
+        print(f'{rel(EXPORT_DIR)}: {status}')
+        return 1 if stale or orphans else 0
+
+    written = 0
+    for (path, _, _), rec in zip(tasks, run_exports(tasks, args.workers)):
+        st = sources[path]
+        written += rec.pop('written', False)
+        records[path] = dict(rec, stamp=[st.st_size, st.st_mtime_ns])
+    for path in orphans:
+        (EXPORT_DIR / path).unlink()
+        parent = (EXPORT_DIR / path).parent
+        while parent != EXPORT_DIR and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+    save_cache(tool, records)
+
+    for path, rec in sorted(records.items()):
+        if rec['error']:
+            print(f"  - ERROR {path}: {rec['error']} (copied unchanged)")
+    report(records)
+    print(f'{rel(EXPORT_DIR)}: {len(records)} file(s) in {time.perf_counter() - started:.2f}s, '
+          f'{len(tasks)} processed, {written} written, {len(records) - len(tasks)} unchanged, '
+          f'{len(orphans)} removed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate flow nodes and propose parameterised step definitions.
+
+migrate_flow_definitions_extended.py only groups nodes whose properties are
+exactly equal. This tool also clusters nodes of the same type that differ in
+at most k top-level fields (default 1). The shared fields become a definition
+in data/flow_step_definitions/. The differing fields (the parameters) stay on
+each node as inline overrides, next to its id and type.
+
+Parameters are whole top-level keys, because NodeTypeStepFactory's merge is
+shallow (a node's key replaces the definition's key). Nodes that differ in one
+reward amount therefore differ in `rewards`, and `rewards` becomes the
+parameter.
+
+Each node is compared by its effective content: its definition, if it has
+one, merged with its own fields. Nodes without an id are left alone, because a
+definition always has one and the merge would give it to the node. Every field value is hashed once. For each
+set of at most k fields, a node is bucketed under the hashes of all its other
+fields, so nodes that agree outside that set share a bucket. That is
+O(nodes * C(fields, k)) bucket insertions. Buckets are then taken greedily by
+bytes saved per node, counting the definition file and the definition_id every
+member gains. Each node joins at most one definition (nodes inside a member's
+branches included, since they move with it), so an exact group is
+preferred and a looser cluster takes the nodes left over (or the nodes whose
+exact groups are too small). A cluster whose
+shared fields match an existing definition reuses it.
+
+Runs as a dry run by default, printing the proposals and the size change.
+--apply writes the definitions and rewrites the flows (review with git diff).
+Fields ExperienceFlowParser requires on the raw node (id, or condition and
+then on a conditional) are never moved into a definition, since the parser
+checks nodes before their definition is merged. Before anything is written,
+every rewritten node is checked: merged with its new definition, it must
+equal the node it replaces, and as written it must pass the parser's
+required-field rules.
+
+Usage:
+    python3 tools/extract_definitions.py                  # dry run, k=1, clusters of 3+
+    python3 tools/extract_definitions.py --k 2 --min-nodes 5
+    python3 tools/extract_definitions.py --apply
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from itertools import combinations
+
+from content_index import DEFS_DIR, ROOT, load_index
+
+# Kept on every node: identity
+NODE_KEYS = ('id', 'type')
+# ExperienceFlowParser.validate_node checks the raw node, before NodeTypeStepFactory merges its
+# definition, so these fields must stay inline per node type
+PARSER_REQUIRED = {
+    'level': ('id',),
+    'narrative_stage': ('id',),
+    'reward': ('id',),
+    'dlc_flow': ('id',),
+    'conditional': ('condition', 'then'),
+}
+BRANCH_KEYS = ('then', 'else', 'true_branch', 'false_branch')
+
+
+def compact(value):
+    return json.dumps(value, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+
+def inline_keys(kind):
+    """Fields a node of this type keeps inline whatever its definition holds."""
+    return NODE_KEYS + tuple(k for k in PARSER_REQUIRED.get(kind, ()) if k not in NODE_KEYS)
+
+
+def parser_errors(node):
+    """What ExperienceFlowParser.validate_node would reject in this node as written."""
+    kind = node.get('type')
+    return [f'{kind!r} node missing {key!r}' for key in PARSER_REQUIRED.get(kind, ()) if key not in node]
+
+
+def value_hash(value):
+    return hashlib.blake2b(compact(value).encode('utf-8'), digest_size=8).digest()
+
+
+def flow_nodes(flow):
+    """(key path from the flow document root, node) for every node, branch nodes included."""
+    out = []
+    stack = [(('flow', i), node) for i, node in enumerate(flow.get('flow', []))][::-1] \
+        if isinstance(flow, dict) and isinstance(flow.get('flow'), list) else []
+    while stack:
+        path, node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        out.append((path, node))
+        for key in BRANCH_KEYS:
+            branch = node.get(key)
+            if isinstance(branch, dict):
+                stack.append((path + (key,), branch))
+            elif isinstance(branch, list):
+                stack += [(path + (key, i), n) for i, n in enumerate(branch)][::-1]
+    return out
+
+
+def effective(node, definitions):
+    def_id = node.get('definition_id')
+    if def_id and def_id in definitions:
+        merged = dict(definitions[def_id])
+        merged.update(node)
+        node = merged
+    return {k: v for k, v in node.items() if k != 'definition_id'}
+
+
+class Candidate:
+    """Nodes that agree on every field outside `params`."""
+
+    def __init__(self, kind, shared, params, members):
+        self.kind = kind
+        self.shared = shared      # {field: value} moved into the definition (type included)
+        self.params = params      # fields left inline
+        self.members = members    # node numbers
+
+    def savings(self, nodes, assigned, def_cost, def_id='x' * 24):
+        """(unassigned members, compact bytes saved by moving them onto the definition)."""
+        live = [m for m in self.members if m not in assigned]
+        saved = sum(len(compact(nodes[m][3])) - len(compact(rewritten(nodes[m][2], def_id, self.shared)))
+                    for m in live)
+        return live, saved - def_cost
+
+
+def cluster(nodes, k, min_nodes):
+    """Bucket nodes that differ in at most k fields. Returns candidates, largest buckets first."""
+    buckets = defaultdict(list)
+    for n, (_, _, node, _) in enumerate(nodes):
+        kind = node.get('type')
+        fields = sorted(f for f in node if f not in inline_keys(kind))
+        hashes = {f: value_hash(node[f]) for f in fields}
+        for size in range(0, min(k, len(fields)) + 1):
+            for params in combinations(fields, size):
+                rest = tuple((f, hashes[f]) for f in fields if f not in params)
+                if rest:
+                    buckets[(kind, params, rest)].append(n)
+    candidates = []
+    for (kind, params, rest), members in buckets.items():
+        if len(members) < min_nodes:
+            continue
+        # A parameter every member agrees on is really a shared field; the smaller mask covers it
+        if any(len({value_hash(nodes[m][2][p]) for m in members}) == 1 for p in params):
+            continue
+        first = nodes[members[0]][2]
+        shared = {'type': kind}
+        shared.update((f, first[f]) for f, _ in rest)
+        candidates.append(Candidate(kind, shared, list(params), members))
+    return candidates
+
+
+def definition_id(candidate, taken):
+    """Short readable id from the type and a few shared scalar values, e.g. ad_reward_rewarded_false.
+
+    Every node that uses the definition repeats this id, so it is kept short.
+    """
+    values = [str(v).lower() for f, v in sorted(candidate.shared.items())
+              if f != 'type' and isinstance(v, (str, int, float, bool)) and len(str(v)) <= 12]
+    base = re.sub(r'[^a-z0-9_]+', '_', '_'.join([candidate.kind] + values[:2])).strip('_')[:32]
+    def_id, i = base, 2
+    while def_id in taken:
+        def_id, i = f'{base}_{i}', i + 1
+    taken.add(def_id)
+    return def_id
+
+
+def plan(index, k=1, min_nodes=3):
+    """(proposals, nodes): proposals are dicts with the definition and its member node numbers.
+
+    nodes is a list of (flow id, key path, effective node, node as written).
+    """
+    nodes = []
+    for flow_id in sorted(index.flows):
+        for path, node in flow_nodes(index.flows[flow_id]):
+            if node.get('type') and node.get('id'):
+                nodes.append((flow_id, path, effective(node, index.definitions), node))
+    nested = defaultdict(list)
+    by_flow = defaultdict(list)
+    for n, (flow_id, path, _, _) in enumerate(nodes):
+        by_flow[flow_id].append((n, path))
+    for members in by_flow.values():
+        for n, path in members:
+            for m, other in members:
+                if m != n and (other[:len(path)] == path or path[:len(other)] == other):
+                    nested[n].append(m)
+    existing = {}
+    for def_id, definition in index.definitions.items():
+        if isinstance(definition, dict) and 'definition_id' not in definition:
+            existing[compact({f: v for f, v in definition.items() if f != 'id'})] = def_id
+    taken = set(index.definitions) | set(index.archived_definitions)
+
+    assigned, proposals, heap = set(), [], []
+    for order, candidate in enumerate(cluster(nodes, k, min_nodes)):
+        reuse = existing.get(compact(candidate.shared))
+        def_id = reuse or definition_id(candidate, set(taken))
+        # A new definition costs its own file on top of the flow bytes
+        cost = 0 if reuse else len(json.dumps(dict(candidate.shared, id=def_id), indent=2))
+        live, saved = candidate.savings(nodes, assigned, cost, def_id)
+        if saved > 0:
+            heap.append((-saved / len(live), order, candidate, reuse, def_id, cost))
+    heapq.heapify(heap)
+    # Best bytes saved per node first, so an exact group beats the looser cluster that contains
+    # it and the looser one keeps only the rest. Losing members only lowers a candidate's
+    # score, so a re-scored candidate that still beats the next stored score is the true best.
+    while heap:
+        _, order, candidate, reuse, def_id, cost = heapq.heappop(heap)
+        live, saved = candidate.savings(nodes, assigned, cost, def_id)
+        if len(live) < min_nodes or saved <= 0:
+            continue
+        if heap and -heap[0][0] > saved / len(live):
+            heapq.heappush(heap, (-saved / len(live), order, candidate, reuse, def_id, cost))
+            continue
+        assigned.update(live)
+        # A node nested in a member's branch is rewritten with it, so it cannot join another definition
+        assigned.update(m for n in live for m in nested[n])
+        if not reuse:
+            def_id = definition_id(candidate, taken)
+        definition = dict(candidate.shared, id=def_id)
+        proposals.append({'definition_id': def_id, 'new': reuse is None, 'definition': definition,
+                          'params': candidate.params, 'members': live, 'saved': saved})
+    return proposals, nodes
+
+
+def rewritten(node, def_id, definition):
+    """The compact node: definition_id, the inline keys, then whatever the definition does not supply."""
+    out = {'definition_id': def_id}
+    for key in inline_keys(node.get('type')):
+        if key in node:
+            out[key] = node[key]
+    for key, value in node.items():
+        if key not in out and (key not in definition or definition[key] != value):
+            out[key] = value
+    return out
+
+
+def _indent(text):
+    match = re.search(r'\n( +)"', text)
+    return len(match.group(1)) if match else 2
+
+
+def apply(index, proposals, nodes):
+    """Write new definitions and rewrite every affected flow; all checks run before any write."""
+    changes = defaultdict(list)
+    for proposal in proposals:
+        for n in proposal['members']:
+            flow_id, path, node, _ = nodes[n]
+            new = rewritten(node, proposal['definition_id'], proposal['definition'])
+            check = dict(proposal['definition'])
+            check.update(new)
+            check.pop('definition_id')
+            where = f'{flow_id}:{"/".join(map(str, path))}'
+            if check != node:
+                raise SystemExit(f'refusing to apply: {where} would change meaning')
+            problems = parser_errors(new)
+            if problems:
+                raise SystemExit(f"refusing to apply: {where} would fail to load ({'; '.join(problems)})")
+            changes[flow_id].append((path, new))
+    writes = []
+    for proposal in proposals:
+        if proposal['new']:
+            writes.append((DEFS_DIR / f"{proposal['definition_id']}.json",
+                           json.dumps(proposal['definition'], indent=2) + '\n'))
+    for flow_id, edits in sorted(changes.items()):
+        path = index.path_of('flows', flow_id)
+        text = path.read_text()
+        doc = json.loads(text)
+        for key_path, new in edits:
+            target = doc
+            for key in key_path[:-1]:
+                target = target[key]
+            target[key_path[-1]] = new
+        out = json.dumps(doc, indent=_indent(text), ensure_ascii=False) + ('\n' if text.endswith('\n') else '')
+        writes.append((path, out))
+    for path, text in writes:
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(text)
+        os.replace(tmp, path)
+    return writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Propose (and optionally extract) parameterised flow step definitions')
+    parser.add_argument('--k', type=int, default=1, help='Most top-level fields a cluster may differ in (default: 1)')
+    parser.add_argument('--min-nodes', type=int, default=3, help='Smallest cluster worth a definition (default: 3)')
+    parser.add_argument('--apply', action='store_true', help='Write definitions and rewrite flows (default: dry run)')
+    args = parser.parse_args()
+    if args.k < 0 or args.min_nodes < 2:
+        parser.error('--k must be >= 0 and --min-nodes >= 2')
+
+    started = time.perf_counter()
+    index = load_index()
+    proposals, nodes = plan(index, args.k, args.min_nodes)
+    elapsed = time.perf_counter() - started
+
+    before = sum(len(compact(index.flows[f])) for f in index.flows)
+    print(f'Scanned {len(nodes)} node(s) in {len(index.flows)} flow(s) in {elapsed * 1000:.0f} ms '
+          f'(k={args.k}, clusters of {args.min_nodes}+)')
+    if not proposals:
+        print('  no definitions worth extracting')
+        return
+    total = 0
+    for p in proposals:
+        shared = {f: v for f, v in p['definition'].items() if f not in inline_keys(p['definition']['type'])}
+        flows = sorted({nodes[n][0] for n in p['members']})
+        print(f"  {'NEW ' if p['new'] else 'REUSE'} {p['definition_id']}: {len(p['members'])} node(s) in "
+              f"{', '.join(flows)}; saves ~{p['saved']} bytes")
+        print(f"      shared: {compact(shared)[:160]}")
+        if p['params']:
+            print(f"      parameters (inline): {', '.join(p['params'])}")
+        total += p['saved']
+    print(f'Compact flow JSON: {before} bytes -> ~{before - total} bytes ({total / before:.1%} smaller)')
+    if not args.apply:
+        print('Dry run; re-run with --apply to write the definitions and flows')
+        return
+    writes = apply(index, proposals, nodes)
+    for path, _ in writes:
+        print(f'  wrote {os.path.relpath(path, ROOT)}')
+    print('Run tools/validate_all.py and tools/compile_flows.py to check the result')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
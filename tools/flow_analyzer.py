@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Static analysis of experience flows, following how ExperienceDirector runs them.
+
+Every flow in data/experience_flows/ becomes part of one control graph, with
+one vertex per node occurrence and definitions merged in (node fields win).
+The graph follows the director's rules:
+- nodes run in order; a node's successor is the next node in its list
+- `conditional` inserts its `then` (or `else`) branch, a node or a list of
+  nodes, before the next node; a missing branch falls through. Conditions
+  _evaluate_condition can never satisfy (unknown keys, `custom`, unknown
+  state flags, empty ids) make the `then` branch dead. The pipeline spelling
+  (`true_branch`/`false_branch`, string conditions) is read too, with only
+  "always_true" treated as constant. The pipeline's ConditionalStep does not
+  insert branches yet, so this is the director's behaviour.
+- `dlc_flow` runs data/experience_flows/<id>.json and then returns to the
+  next node. A missing flow is skipped, and reported as an error if the node
+  is `required`.
+- `premium_gate` with on_fail "block" can end the path there.
+
+From the graph it reports:
+- nodes unreachable from the root flows. By default the roots are the flows
+  no dlc_flow calls.
+- dlc_flow cycles, which the game would follow forever
+- level coverage: data/levels files no reachable level node plays, level
+  nodes with no file (or only a DLC chapter file), levels a flow plays
+  twice, and gaps in the level numbering
+- reward bounds from each flow's start to its end, per currency. This
+  includes rewards from called flows. Rewarded ads only count towards the
+  maximum.
+- nodes ExperienceFlowParser.validate_node would reject (which fails the
+  whole flow)
+
+Each vertex and edge is visited a constant number of times, with no
+recursion. Flows with tens of thousands of nodes, or long dlc_flow chains,
+take time linear in their size.
+
+Usage:
+    python3 tools/flow_analyzer.py                      # every flow, uncalled flows as roots
+    python3 tools/flow_analyzer.py main_story           # analyze from specific roots
+    python3 tools/flow_analyzer.py --json build/flow_analysis.json
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from content_index import load_index
+from pack_levels import CHAPTERS_DIR, level_files
+
+# ExperienceFlowParser.VALID_NODE_TYPES and the fields validate_node requires for each
+VALID_NODE_TYPES = ('level', 'narrative_stage', 'reward', 'show_rewards', 'cutscene', 'unlock',
+                    'ad_reward', 'premium_gate', 'dlc_flow', 'conditional')
+REQUIRED_FIELDS = {'level': ('id',), 'narrative_stage': ('id',), 'reward': ('id',), 'dlc_flow': ('id',),
+                   'conditional': ('condition', 'then')}
+# Flags ExperienceDirector._evaluate_condition can read; any other state_flag is always false
+STATE_FLAGS = ('auto_advance', 'waiting_for_level_complete')
+END = -1  # successor meaning "the path stops here"
+# Path counts double at every open conditional; they saturate here rather than grow without bound
+PATH_CAP = 10 ** 15
+
+
+def level_number(level_id):
+    """ExperienceDirector._extract_level_number, or None if the id has no number."""
+    text = str(level_id).replace('level_', '').replace('level', '')
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def condition_value(condition):
+    """True/False if _evaluate_condition (or ConditionalStep, for strings) is constant, else None."""
+    if isinstance(condition, str):
+        return True if condition == 'always_true' else None
+    if not isinstance(condition, dict):
+        return False
+    for key in ('has_seen_narrative', 'reward_unlocked'):
+        if key in condition:
+            return None if condition[key] else False
+    if 'state_flag' in condition:
+        return None if condition['state_flag'] in STATE_FLAGS else False
+    return False
+
+
+def reward_gain(node):
+    """(guaranteed, possible) {currency: amount} granted by a node."""
+    def add(into, reward):
+        if not isinstance(reward, dict):
+            return
+        kind = reward.get('type', '')
+        if kind == 'booster':
+            kind = f"booster:{reward.get('booster_type', '')}"
+        amount = 1 if kind == 'card' else reward.get('amount', 0)
+        if isinstance(amount, (int, float)) and not isinstance(amount, bool) and amount:
+            into[kind] = into.get(kind, 0) + amount
+
+    guaranteed, possible = {}, {}
+    if node.get('type') == 'reward' and isinstance(node.get('rewards'), list):
+        for reward in node['rewards']:
+            add(guaranteed, reward)
+        possible = dict(guaranteed)
+    elif node.get('type') == 'ad_reward':
+        # The reward is only granted if the player watches the ad to the end
+        add(possible, node.get('reward'))
+    return guaranteed, possible
+
+
+class FlowGraph:
+    """Control graph over a set of flows. Vertices are ints; each flow also gets an exit vertex."""
+
+    def __init__(self, flows, definitions):
+        self.nodes = []      # merged node dict per vertex (None for exits)
+        self.where = []      # (flow id, JSON path) per vertex
+        self.succ = []       # successor vertices (END = path stops)
+        self.calls = {}      # dlc_flow vertex -> callee flow id
+        self.entry, self.exit = {}, {}
+        self.dead_branches = []   # (flow id, path, branch key) of branches whose condition is constant
+        self.problems = []        # (severity, flow id, path, message)
+        self.definitions = definitions
+        for flow_id in sorted(flows):
+            self._build(flow_id, flows[flow_id])
+
+    def _add(self, flow_id, path, node):
+        self.nodes.append(node)
+        self.where.append((flow_id, path))
+        self.succ.append([])
+        return len(self.nodes) - 1
+
+    def _merge(self, raw, flow_id, path):
+        """NodeTypeStepFactory's merge: the definition's fields, overridden by the node's own."""
+        if not isinstance(raw, dict):
+            self.problems.append(('error', flow_id, path, 'node is not an object'))
+            return {}
+        def_id = raw.get('definition_id')
+        if not def_id:
+            return raw
+        definition = self.definitions.get(def_id)
+        if definition is None:
+            self.problems.append(('error', flow_id, path, f'definition {def_id!r} not found'))
+            return raw
+        return dict(definition, **raw)
+
+    def _check_parser(self, flow_id, path, node):
+        kind = node.get('type')
+        if kind is None:
+            self.problems.append(('error', flow_id, path, "missing 'type' (ExperienceFlowParser rejects the flow)"))
+        elif kind not in VALID_NODE_TYPES:
+            self.problems.append(('error', flow_id, path, f"invalid node type {kind!r} (ExperienceFlowParser rejects the flow)"))
+        else:
+            for field in REQUIRED_FIELDS.get(kind, ()):
+                if field not in node:
+                    self.problems.append(('error', flow_id, path,
+                                          f"{kind} node missing {field!r} (ExperienceFlowParser rejects the flow)"))
+
+    def _build(self, flow_id, doc):
+        exit_vertex = self._add(flow_id, 'exit', None)
+        self.exit[flow_id] = exit_vertex
+        top = doc.get('flow') if isinstance(doc, dict) else None
+        if not isinstance(top, list):
+            self.problems.append(('error', flow_id, 'flow', "missing 'flow' array"))
+            top = []
+        # Work items: (nodes, JSON path prefix, continuation vertex, conditional vertex to link or None)
+        stack = [(top, 'flow', exit_vertex, None)]
+        while stack:
+            seq, prefix, cont, parent = stack.pop()
+            nxt = cont
+            # Built back to front so each node's successor already exists
+            for i in range(len(seq) - 1, -1, -1):
+                path = f'{prefix}/{i}'
+                node = self._merge(seq[i], flow_id, path)
+                # The parser checks top-level nodes as written, before definitions are merged
+                if prefix == 'flow' and isinstance(seq[i], dict):
+                    self._check_parser(flow_id, path, seq[i])
+                v = self._add(flow_id, path, node)
+                kind = node.get('type')
+                if kind == 'conditional':
+                    self._branches(flow_id, path, node, v, nxt, stack)
+                elif kind == 'dlc_flow':
+                    self.calls[v] = node.get('id')
+                    self.succ[v].append(nxt)
+                elif kind == 'premium_gate' and node.get('on_fail') == 'block':
+                    self.succ[v] += [nxt, END]
+                else:
+                    self.succ[v].append(nxt)
+                nxt = v
+            if parent is not None:
+                self.succ[parent].append(nxt)
+            elif prefix == 'flow':
+                self.entry[flow_id] = nxt
+
+    def _branches(self, flow_id, path, node, v, nxt, stack):
+        value = condition_value(node.get('condition'))
+        then_key = 'then' if 'then' in node else 'true_branch'
+        else_key = 'else' if 'else' in node else 'false_branch'
+        for key, live in ((then_key, value is not False), (else_key, value is not True)):
+            branch = node.get(key)
+            if branch is None:
+                if live:
+                    self.succ[v].append(nxt)
+                continue
+            if isinstance(branch, dict):
+                branch = [branch]
+            elif not isinstance(branch, list):
+                self.problems.append(('warning', flow_id, f'{path}/{key}', 'branch is neither a node nor a list; skipped'))
+                if live:
+                    self.succ[v].append(nxt)
+                continue
+            if not live:
+                self.dead_branches.append((flow_id, path, key))
+            # Dead branches are still built (so their nodes show up as unreachable) but never linked
+            stack.append((branch, f'{path}/{key}', nxt, v if live else None))
+
+    def callee_entry(self, v):
+        callee = self.calls.get(v)
+        return self.entry.get(callee) if callee is not None else None
+
+    def reachable(self, roots):
+        """Set of vertices reachable from the entries of `roots`; a dlc_flow call is assumed to return."""
+        seen = set()
+        stack = [self.entry[r] for r in roots if r in self.entry]
+        while stack:
+            v = stack.pop()
+            if v == END or v in seen:
+                continue
+            seen.add(v)
+            stack += self.succ[v]
+            callee = self.callee_entry(v)
+            if callee is not None:
+                stack.append(callee)
+        return seen
+
+    def summarize(self):
+        """Reward bounds and path counts to the end of each vertex's flow, plus dlc_flow cycles.
+
+        One iterative post-order pass: a vertex's value combines its successors (any one of them
+        is taken) with its callee's (which runs first). A call back into a flow that is still
+        being evaluated is a cycle; it contributes nothing.
+        """
+        count = len(self.nodes)
+        lo, hi, paths = [None] * count, [None] * count, [0] * count
+        state = [0] * count   # 0 new, 1 on the stack, 2 done
+        cycles = []
+        for flow_id in sorted(self.entry):
+            start = self.entry[flow_id]
+            if state[start]:
+                continue
+            state[start] = 1
+            stack = [(start, iter(self._deps(start)))]
+            while stack:
+                v, pending = stack[-1]
+                for dep in pending:
+                    if state[dep] == 0:
+                        state[dep] = 1
+                        stack.append((dep, iter(self._deps(dep))))
+                        break
+                    if state[dep] == 1:
+                        cycles.append(self._cycle(stack, dep))
+                else:
+                    stack.pop()
+                    lo[v], hi[v], paths[v] = self._value(v, lo, hi, paths)
+                    state[v] = 2
+        return lo, hi, paths, cycles
+
+    def _deps(self, v):
+        deps = [s for s in self.succ[v] if s != END]
+        callee = self.callee_entry(v)
+        if callee is not None:
+            deps.append(callee)
+        return deps
+
+    def _cycle(self, stack, dep):
+        """Flow ids along the dlc_flow calls from `dep` back to itself."""
+        flows = []
+        for v, _ in stack[[s for s, _ in stack].index(dep):]:
+            if v in self.calls:
+                flows.append(self.where[v][0])
+        return flows + [self.where[dep][0]]
+
+    def _value(self, v, lo, hi, paths):
+        if self.nodes[v] is None:
+            return {}, {}, 1
+        choices = [({}, {}, 1) if s == END else (lo[s], hi[s], paths[s]) for s in self.succ[v]]
+        if len(choices) == 1:
+            low, high, total = choices[0]
+        else:
+            low, high, total = {}, {}, min(sum(c[2] for c in choices), PATH_CAP)
+            for key in {k for c in choices for k in list(c[0]) + list(c[1])}:
+                low[key] = min(c[0].get(key, 0) for c in choices)
+                high[key] = max(c[1].get(key, 0) for c in choices)
+        callee = self.callee_entry(v)
+        # A callee still on the stack (a cycle) has no value yet
+        if callee is not None and lo[callee] is not None:
+            low, high, total = _add(low, lo[callee]), _add(high, hi[callee]), min(total * paths[callee], PATH_CAP)
+        guaranteed, possible = reward_gain(self.nodes[v])
+        return _add(low, guaranteed), _add(high, possible), total
+
+
+def _add(a, b):
+    if not b:
+        return a
+    out = dict(a)
+    for key, amount in b.items():
+        out[key] = out.get(key, 0) + amount
+    return out
+
+
+def analyze(index, roots=None):
+    """Analysis report (a JSON-ready dict) for every indexed flow."""
+    graph = FlowGraph(index.flows, index.definitions)
+    called = {callee for callee in graph.calls.values() if callee in index.flows}
+    roots = sorted(roots) if roots else sorted(set(index.flows) - called)
+    reach = graph.reachable(roots)
+    lo, hi, paths, cycles = graph.summarize()
+    problems = list(graph.problems)
+
+    for v, callee in sorted(graph.calls.items()):
+        if callee not in index.flows:
+            severity = 'error' if graph.nodes[v].get('required') else 'warning'
+            problems.append((severity, *graph.where[v], f'dlc_flow {callee!r} has no flow file (skipped at runtime)'))
+    for cycle in cycles:
+        problems.append(('error', cycle[0], 'flow', f"dlc_flow cycle: {' -> '.join(cycle)}"))
+
+    # Keyed per flow: different root flows are separate playthroughs
+    played = defaultdict(list)
+    rewards = defaultdict(list)
+    for v in sorted(reach):
+        node = graph.nodes[v]
+        if node is None:
+            continue
+        if node.get('type') == 'level':
+            number = level_number(node.get('id', ''))
+            if number is None or number <= 0:
+                problems.append(('error', *graph.where[v], f"level id {node.get('id')!r} has no level number"))
+            else:
+                played[(graph.where[v][0], number)].append(graph.where[v])
+        elif node.get('type') == 'reward' and node.get('id'):
+            rewards[(graph.where[v][0], node['id'])].append(graph.where[v])
+    files = set(n for n in index.levels if isinstance(n, int))
+    # Levels shipped by a DLC chapter load once the chapter is installed
+    chapter_levels = {}
+    for chapter_dir in sorted(CHAPTERS_DIR.iterdir()) if CHAPTERS_DIR.is_dir() else []:
+        for number, _ in level_files(chapter_dir.name):
+            chapter_levels.setdefault(number, chapter_dir.name)
+    numbers = sorted({number for _, number in played})
+    for (_, number), places in sorted(played.items()):
+        if number in files:
+            continue
+        for flow_id, path in places:
+            if number in chapter_levels:
+                problems.append(('warning', flow_id, path,
+                                 f'level {number} is only in DLC chapter {chapter_levels[number]!r}'))
+            else:
+                problems.append(('error', flow_id, path, f'level {number} has no level file'))
+    for (_, reward_id), places in sorted(rewards.items()):
+        if len(places) > 1:
+            problems.append(('warning', *places[1], f'reward {reward_id!r} is also granted at '
+                             f'{places[0][1]}; a reward id is only granted once'))
+
+    unreachable = [graph.where[v] for v in range(len(graph.nodes))
+                   if graph.nodes[v] is not None and v not in reach]
+    node_counts, unreachable_counts = defaultdict(int), defaultdict(int)
+    for (flow_id, _), node in zip(graph.where, graph.nodes):
+        node_counts[flow_id] += node is not None
+    for flow_id, _ in unreachable:
+        unreachable_counts[flow_id] += 1
+    flows = {}
+    for flow_id in sorted(index.flows):
+        entry = graph.entry[flow_id]
+        flows[flow_id] = {
+            'root': flow_id in roots,
+            'nodes': node_counts[flow_id],
+            'unreachable': unreachable_counts[flow_id],
+            'paths': paths[entry],
+            'rewards_min': dict(sorted((lo[entry] or {}).items())),
+            'rewards_max': dict(sorted((hi[entry] or {}).items())),
+            'calls': sorted({graph.calls[v] for v in graph.calls if graph.where[v][0] == flow_id}),
+        }
+    return {
+        'roots': roots,
+        'vertices': len(graph.nodes),
+        'flows': flows,
+        'levels': {
+            'played': numbers,
+            'not_played': sorted(files - set(numbers)),
+            'played_twice': {f'{f}:{n}': [p for _, p in places] for (f, n), places in sorted(played.items())
+                             if len(places) > 1},
+            'numbering_gaps': sorted(set(range(1, numbers[-1] + 1)) - set(numbers)) if numbers else [],
+        },
+        'unreachable': [f'{f}:{p}' for f, p in unreachable],
+        'dead_branches': [f'{f}:{p}/{k}' for f, p, k in graph.dead_branches],
+        'cycles': cycles,
+        'problems': [{'severity': s, 'flow': f, 'path': p, 'message': m} for s, f, p, m in problems],
+    }
+
+
+def _ranges(numbers):
+    """'1-5, 8, 10-12' for a sorted list of ints."""
+    out, start = [], None
+    for i, n in enumerate(numbers):
+        if start is None:
+            start = n
+        if i + 1 == len(numbers) or numbers[i + 1] != n + 1:
+            out.append(str(start) if start == n else f'{start}-{n}')
+            start = None
+    return ', '.join(out)
+
+
+def _paths(count):
+    return f'at least {PATH_CAP:.0e}' if count >= PATH_CAP else str(count)
+
+
+def _amounts(amounts):
+    return ', '.join(f'{k} {v:g}' for k, v in amounts.items()) or 'nothing'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Control-flow analysis of data/experience_flows')
+    parser.add_argument('roots', nargs='*', help='Root flow ids (default: flows no dlc_flow node calls)')
+    parser.add_argument('--json', metavar='PATH', help="Write the full report to PATH ('-' for stdout)")
+    parser.add_argument('--show', type=int, default=10, help='Items listed per section (default: 10)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = load_index()
+    for root in args.roots:
+        if root not in index.flows:
+            parser.error(f'unknown flow {root!r} (have: {", ".join(sorted(index.flows))})')
+    report = analyze(index, args.roots)
+    elapsed = time.perf_counter() - started
+    out = sys.stderr if args.json == '-' else sys.stdout
+
+    print(f"Analyzed {len(report['flows'])} flow(s), {report['vertices']} graph vertices, in {elapsed * 1000:.0f} ms "
+          f"(roots: {', '.join(report['roots']) or 'none'})", file=out)
+    for flow_id, info in report['flows'].items():
+        calls = f", calls {', '.join(info['calls'])}" if info['calls'] else ''
+        print(f"  {flow_id}{' [root]' if info['root'] else ''}: {info['nodes']} nodes, "
+              f"{info['unreachable']} unreachable, {_paths(info['paths'])} path(s){calls}", file=out)
+        print(f"    rewards min: {_amounts(info['rewards_min'])}", file=out)
+        print(f"    rewards max: {_amounts(info['rewards_max'])}", file=out)
+    levels = report['levels']
+    print(f"Levels played: {_ranges(levels['played']) or 'none'}", file=out)
+    if levels['not_played']:
+        print(f"  level files no reachable node plays: {_ranges(levels['not_played'])}", file=out)
+    if levels['numbering_gaps']:
+        print(f"  gaps in the played numbering: {_ranges(levels['numbering_gaps'])}", file=out)
+    for key, places in levels['played_twice'].items():
+        flow_id, number = key.rsplit(':', 1)
+        print(f"  {flow_id}: level {number} is played at {', '.join(places)}", file=out)
+    for title, items in (('Unreachable nodes', report['unreachable']), ('Dead branches', report['dead_branches'])):
+        if items:
+            print(f'{title}: {len(items)}', file=out)
+            for item in items[:args.show]:
+                print(f'  - {item}', file=out)
+            if len(items) > args.show:
+                print(f'  ... {len(items) - args.show} more', file=out)
+    errors = [p for p in report['problems'] if p['severity'] == 'error']
+    if report['problems']:
+        print(f"Problems: {len(errors)} error(s), {len(report['problems']) - len(errors)} warning(s)", file=out)
+        for p in report['problems'][:args.show * 2]:
+            print(f"  - {p['severity'].upper()} {p['flow']}:{p['path']}: {p['message']}", file=out)
+        if len(report['problems']) > args.show * 2:
+            print(f"  ... {len(report['problems']) - args.show * 2} more", file=out)
+
+    if args.json:
+        text = json.dumps(report, indent=2) + '\n'
+        if args.json == '-':
+            sys.stdout.write(text)
+        else:
+            Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.json).write_text(text)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
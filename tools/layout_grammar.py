@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Python mirror of the game's level layout grammar.
+
+parse_layout / parse_string_layout follow LevelManager.parse_layout and
+LevelManager.parse_string_layout. Cells come back column-major
+(grid[x][y]), with -1 for blocked, 0 for empty, other ints as they are,
+and any other token kept as a string. classify_cell follows the token rules
+in GameState.fill_from_layout. layout_problems reports the cases the game
+silently pads or truncates, plus any token fill_from_layout cannot handle.
+
+Tools that read level layouts should import this module rather than
+re-implement the rules.
+
+scan_layout is the bulk form of layout_problems plus count_cells. It works on
+the raw tokens and classifies each distinct token string once, so checking
+thousands of levels does not build a grid per level.
+"""
+import re
+
+BLOCKED = -1
+EMPTY = 0
+# GameState.fill_from_layout: "H<hits>:<type>" is a hard unmovable
+HARD_TOKEN_RE = re.compile(r'^H(\d*):(.*)$')
+SPECIAL_TOKENS = {'C': 'collectible', 'S': 'spreader', 'U': 'unmovable', 'u': 'unmovable'}
+
+
+def _is_valid_int(token):
+    return re.fullmatch(r'[+-]?\d+', token) is not None
+
+
+def _cell(token):
+    if token in ('X', 'x'):
+        return BLOCKED
+    if token in ('.', '_'):
+        return EMPTY
+    if _is_valid_int(token):
+        return int(token)
+    return token
+
+
+def layout_rows(layout_str, width, height):
+    """Split a string layout into rows of raw tokens, the way parse_string_layout does (before truncation)."""
+    lines = layout_str.strip().split('\n')
+    if len(lines) == 1 and len(lines[0]) == width * height:
+        compact = lines[0]
+        lines = [compact[r * width:(r + 1) * width] for r in range(height)]
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if ',' in line:
+            values = line.split(',')
+        elif ' ' in line:
+            values = line.split(' ')
+        else:
+            values = list(line)
+        rows.append([v.strip() for v in values])
+    return rows
+
+
+def parse_string_layout(layout_str, width, height):
+    grid = [[EMPTY] * height for _ in range(width)]
+    rows = layout_rows(layout_str, width, height)
+    for y in range(min(len(rows), height)):
+        for x, token in enumerate(rows[y][:width]):
+            grid[x][y] = _cell(token)
+    return grid
+
+
+def parse_2d_array_layout(layout, width, height):
+    return [[layout[x][y] if x < len(layout) and y < len(layout[x]) else EMPTY for y in range(height)]
+            for x in range(width)]
+
+
+def parse_flat_array_layout(layout, width, height):
+    return [[layout[y * width + x] if y * width + x < len(layout) else EMPTY for y in range(height)]
+            for x in range(width)]
+
+
+def parse_layout(layout, width, height):
+    """Column-major grid for any layout form the game accepts (string, 2D array, flat array)."""
+    if isinstance(layout, str):
+        return parse_string_layout(layout, width, height)
+    if isinstance(layout, list):
+        if layout and isinstance(layout[0], list):
+            return parse_2d_array_layout(layout, width, height)
+        return parse_flat_array_layout(layout, width, height)
+    return [[EMPTY] * height for _ in range(width)]
+
+
+def classify_cell(cell):
+    """Return (kind, detail) for a parsed cell, or (None, None) if the game cannot handle it.
+
+    kind is one of blocked, empty, tile, collectible, spreader, unmovable, hard.
+    For hard cells detail is (hits, type); for tiles it is the tile type.
+    """
+    if isinstance(cell, bool):
+        return None, None
+    if isinstance(cell, int):
+        if cell == BLOCKED:
+            return 'blocked', None
+        if cell == EMPTY:
+            return 'empty', None
+        return ('tile', cell) if cell > 0 else (None, None)
+    if isinstance(cell, str):
+        if cell in SPECIAL_TOKENS:
+            return SPECIAL_TOKENS[cell], None
+        match = HARD_TOKEN_RE.match(cell)
+        if match:
+            hits = int(match.group(1)) if match.group(1) else 1
+            return 'hard', (hits, match.group(2))
+    return None, None
+
+
+def layout_problems(layout, width, height, num_tile_types=None):
+    """List human-readable problems with a layout; an empty list means it is well formed."""
+    problems = []
+    if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+        return [f'invalid grid size {width}x{height}']
+    if isinstance(layout, str):
+        rows = layout_rows(layout, width, height)
+        if len(rows) != height:
+            problems.append(f'layout has {len(rows)} rows, expected {height}')
+        for y, row in enumerate(rows[:height]):
+            if len(row) != width:
+                problems.append(f'row {y} has {len(row)} cells, expected {width}')
+    elif isinstance(layout, list):
+        if layout and isinstance(layout[0], list):
+            if len(layout) != width or any(len(col) != height for col in layout):
+                problems.append(f'2D layout is not {width} columns of {height} cells')
+        elif len(layout) != width * height:
+            problems.append(f'flat layout has {len(layout)} cells, expected {width * height}')
+    else:
+        return [f'layout must be a string or an array, not {type(layout).__name__}']
+
+    grid = parse_layout(layout, width, height)
+    for x in range(width):
+        for y in range(height):
+            kind, detail = classify_cell(grid[x][y])
+            if kind is None:
+                problems.append(f'unknown token {grid[x][y]!r} at ({x},{y})')
+            elif kind == 'tile' and num_tile_types and detail > num_tile_types:
+                problems.append(f'tile type {detail} at ({x},{y}) exceeds num_tile_types={num_tile_types}')
+            elif kind == 'hard' and (detail[0] < 1 or not detail[1]):
+                problems.append(f'malformed hard tile {grid[x][y]!r} at ({x},{y})')
+    return problems
+
+
+def count_cells(grid):
+    """Count cells per kind in a parsed grid."""
+    counts = {}
+    for column in grid:
+        for cell in column:
+            kind, _ = classify_cell(cell)
+            counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+# token string -> (kind, detail), filled on first sight; layouts reuse a handful of tokens
+_TOKEN_KINDS = {}
+
+
+def _token_kind(token):
+    kind = _TOKEN_KINDS.get(token)
+    if kind is None:
+        kind = _TOKEN_KINDS[token] = classify_cell(_cell(token))
+    return kind
+
+
+def scan_layout(layout, width, height, num_tile_types=None):
+    """(cell counts per kind, hard cell counts per hard type, problems) in one pass.
+
+    Same results as count_cells(parse_layout(...)), the hard types of those
+    cells, and layout_problems(...). Padding cells count as empty.
+    """
+    if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+        return {}, {}, [f'invalid grid size {width}x{height}']
+    if not isinstance(layout, str):
+        problems = layout_problems(layout, width, height, num_tile_types)
+        if isinstance(layout, list):
+            grid = parse_layout(layout, width, height)
+            hard = {}
+            for column in grid:
+                for cell in column:
+                    kind, detail = classify_cell(cell)
+                    if kind == 'hard':
+                        hard[detail[1]] = hard.get(detail[1], 0) + 1
+            return count_cells(grid), hard, problems
+        return {}, {}, problems
+    problems, counts, hard = [], {}, {}
+    rows = layout_rows(layout, width, height)
+    if len(rows) != height:
+        problems.append(f'layout has {len(rows)} rows, expected {height}')
+    seen = 0
+    unknown = []
+    for y, row in enumerate(rows[:height]):
+        if len(row) != width:
+            problems.append(f'row {y} has {len(row)} cells, expected {width}')
+        for x, token in enumerate(row[:width]):
+            kind, detail = _token_kind(token)
+            counts[kind] = counts.get(kind, 0) + 1
+            if kind is None:
+                unknown.append((x, y, f'unknown token {_cell(token)!r} at ({x},{y})'))
+            elif kind == 'tile' and num_tile_types and detail > num_tile_types:
+                unknown.append((x, y, f'tile type {detail} at ({x},{y}) exceeds num_tile_types={num_tile_types}'))
+            elif kind == 'hard':
+                hard[detail[1]] = hard.get(detail[1], 0) + 1
+                if detail[0] < 1 or not detail[1]:
+                    unknown.append((x, y, f'malformed hard tile {token!r} at ({x},{y})'))
+        seen += min(len(row), width)
+    if seen < width * height:
+        counts['empty'] = counts.get('empty', 0) + width * height - seen
+    # layout_problems walks the grid column by column
+    problems += [message for _, _, message in sorted(unknown)]
+    return counts, hard, problems
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Build the level catalog: everything the world map needs, without layouts.
+
+Joins three sources into build/level_catalog.json:
+- data/levels/world_map.json: chapters, level names, map positions, unlocks
+- every data/levels/level_XX.json header (all keys except the layout)
+- installed DLC chapters: manifest.json world_map_entry and levels[], plus
+  the headers of the chapter's level files
+
+Each level entry carries its chapter, map position and an objective summary
+(score target, collectible / unmovable / spreader goals, and counts of special
+cells taken from the layout with layout_grammar), so the world map and
+LevelManager can start from this one file and parse a layout only when the
+level is entered.
+
+The build is incremental. .cache/level_catalog.json keeps each source file's
+size, mtime, hash and extracted header; when nothing changed the catalog is
+left alone (unless the catalog file itself was touched), and otherwise only
+changed files are re-read. The output is
+key-sorted and has no timestamps, so it only changes when the content does.
+
+Usage:
+    python3 tools/level_catalog.py            # build or refresh
+    python3 tools/level_catalog.py --check    # exit 1 if the catalog is stale
+    python3 tools/level_catalog.py --force    # ignore the cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from layout_grammar import count_cells, parse_layout
+from pack_levels import BASE_LEVELS_DIR, CHAPTERS_DIR, level_files
+
+ROOT = Path(__file__).resolve().parents[1]
+WORLD_MAP = BASE_LEVELS_DIR / 'world_map.json'
+OUTPUT = ROOT / 'build' / 'level_catalog.json'
+CACHE_PATH = ROOT / '.cache' / 'level_catalog.json'
+CATALOG_FORMAT = 1
+
+# Defaults LevelManager.load_level_from_json applies when a key is missing
+GOAL_DEFAULTS = {'collectible_type': 'coin', 'unmovable_type': 'snow', 'spreader_type': 'virus'}
+SPECIAL_KINDS = ('blocked', 'collectible', 'spreader', 'unmovable', 'hard')
+
+
+def level_header(level):
+    """Catalog entry for a parsed level file: header fields, objectives and special-cell counts."""
+    width = level.get('grid_width', level.get('width', 8))
+    height = level.get('grid_height', level.get('height', 8))
+    header = {k: v for k, v in level.items() if k not in ('layout', 'width', 'height', 'moves', 'level')}
+    header['grid_width'], header['grid_height'] = width, height
+    header['max_moves'] = level.get('max_moves', level.get('moves', 20))
+    objectives = {'score': level.get('target_score', level.get('target', 1000))}
+    for goal in ('collectible', 'unmovable', 'spreader'):
+        target = level.get(f'{goal}_target', 0)
+        if target:
+            objectives[goal] = {'target': target, 'type': level.get(f'{goal}_type', GOAL_DEFAULTS[f'{goal}_type'])}
+    header['objectives'] = objectives
+    counts = {}
+    if isinstance(width, int) and isinstance(height, int) and width > 0 and height > 0:
+        counts = count_cells(parse_layout(level.get('layout', ''), width, height))
+    header['cells'] = {kind: counts[kind] for kind in SPECIAL_KINDS if counts.get(kind)}
+    return header
+
+
+def source_files():
+    """Every input file: (key, path, kind) where kind is world_map, level or manifest."""
+    files = [('world_map', WORLD_MAP, 'world_map')] if WORLD_MAP.exists() else []
+    files += [(f'base/{path.name}', path, 'level') for _, path in level_files('base')]
+    if CHAPTERS_DIR.is_dir():
+        for chapter_dir in sorted(p for p in CHAPTERS_DIR.iterdir() if (p / 'manifest.json').is_file()):
+            files.append((f'{chapter_dir.name}/manifest.json', chapter_dir / 'manifest.json', 'manifest'))
+            files += [(f'{chapter_dir.name}/levels/{path.name}', path, 'level')
+                      for _, path in level_files(chapter_dir.name)]
+    return files
+
+
+def load_cache():
+    """(source records, [size, mtime_ns] of the catalog written with them)."""
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}, None
+    if cache.get('format') != CATALOG_FORMAT:
+        return {}, None
+    return cache.get('files', {}), cache.get('output')
+
+
+def output_stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def save_cache(files, output):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps({'format': CATALOG_FORMAT, 'files': files, 'output': output_stamp(output)},
+                              sort_keys=True))
+    os.replace(tmp, CACHE_PATH)
+
+
+def read_sources(previous):
+    """Extract every source, reusing cached extracts for files whose size/mtime (or hash) are unchanged.
+
+    Returns ({key: record}, number of files re-read).
+    """
+    records, reread = {}, 0
+    for key, path, kind in source_files():
+        st = path.stat()
+        rec = previous.get(key)
+        if rec and rec['size'] == st.st_size and rec['mtime_ns'] == st.st_mtime_ns:
+            records[key] = rec
+            continue
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        reread += 1
+        if rec and rec['sha256'] == digest:
+            records[key] = dict(rec, mtime_ns=st.st_mtime_ns)
+            continue
+        doc = json.loads(data.decode('utf-8'))
+        extract = level_header(doc) if kind == 'level' else doc
+        records[key] = {'kind': kind, 'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                        'extract': extract}
+    return records, reread
+
+
+def build_catalog(records):
+    """Join the extracted sources into the catalog dict. Returns (catalog, warnings)."""
+    warnings = []
+    headers = {}
+    for key, rec in records.items():
+        if rec['kind'] == 'level':
+            source = 'base' if key.startswith('base/') else key.split('/', 1)[0]
+            headers[(source, rec['extract']['level_number'])] = dict(rec['extract'], file=key)
+
+    chapters, levels = [], {}
+
+    def add_level(source, chapter_ref, number, entry, file_hint):
+        header = headers.pop((source, number), None)
+        if header is None:
+            warnings.append(f'{chapter_ref}: level {number} has no level file ({file_hint})')
+            return
+        if str(number) in levels:
+            warnings.append(f'{chapter_ref}: level {number} is already listed by {levels[str(number)]["chapter"]}')
+            return
+        header.update(chapter=chapter_ref, source=source, name=entry.get('name', header.get('title', '')),
+                      pos=entry.get('pos'), unlocked=bool(entry.get('unlocked', False)))
+        levels[str(number)] = header
+
+    world_map = records.get('world_map', {}).get('extract', {}).get('world_map', {})
+    for chapter in world_map.get('chapters', []):
+        ref = f"base:{chapter.get('id')}"
+        numbers = [entry.get('level') for entry in chapter.get('levels', [])]
+        chapters.append(dict({k: v for k, v in chapter.items() if k != 'levels'}, ref=ref, source='base',
+                             levels=numbers))
+        for entry in chapter.get('levels', []):
+            add_level('base', ref, entry.get('level'), entry, f"level_{entry.get('level')}.json")
+
+    for key, rec in sorted(records.items()):
+        if rec['kind'] != 'manifest':
+            continue
+        manifest = rec['extract']
+        source = key.split('/', 1)[0]
+        ref = f'dlc:{source}'
+        map_entry = manifest.get('world_map_entry') or {}
+        numbers = [entry.get('number') for entry in manifest.get('levels', [])]
+        chapters.append(dict(map_entry, ref=ref, source=source, chapter_id=manifest.get('chapter_id', source),
+                             version=manifest.get('version'), name=manifest.get('name'), levels=numbers))
+        for entry in manifest.get('levels', []):
+            add_level(source, ref, entry.get('number'), entry, entry.get('file'))
+
+    for (source, number), header in sorted(headers.items()):
+        warnings.append(f'{header["file"]}: level {number} is not on any chapter map')
+
+    catalog = {
+        'format': CATALOG_FORMAT,
+        'title': world_map.get('title', ''),
+        'chapters': chapters,
+        'levels': levels,
+    }
+    return catalog, warnings
+
+
+def display_path(path):
+    path = Path(path).resolve()
+    return path.relative_to(ROOT) if path.is_relative_to(ROOT) else path
+
+
+def render(catalog):
+    return json.dumps(catalog, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build build/level_catalog.json from the world map, level headers and DLC manifests')
+    parser.add_argument('--check', action='store_true', help='Do not write; exit 1 if the catalog is stale')
+    parser.add_argument('--force', action='store_true', help='Ignore the cache and re-read every source')
+    parser.add_argument('--output', type=Path, default=OUTPUT, help='Output path (default: build/level_catalog.json)')
+    args = parser.parse_args()
+
+    previous, stamp = ({}, None) if args.force else load_cache()
+    records, reread = read_sources(previous)
+    unchanged = not args.force and records == previous and stamp is not None and stamp == output_stamp(args.output)
+    if unchanged and not args.check:
+        print(f'{display_path(args.output)}: up to date ({len(records)} sources, 0 re-read)')
+        return
+
+    catalog, warnings = build_catalog(records)
+    data = render(catalog)
+    current = args.output.read_bytes() if args.output.exists() else None
+    for warning in warnings:
+        print(f'  - warning {warning}')
+    if args.check:
+        print(f'{display_path(args.output)}: {"up to date" if current == data else "STALE"}')
+        if current != data:
+            sys.exit(1)
+        return
+    if current != data:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        tmp = args.output.with_name(args.output.name + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, args.output)
+    save_cache(records, args.output)
+    print(f'{display_path(args.output)}: {"wrote" if current != data else "unchanged"} '
+          f'({len(catalog["chapters"])} chapters, {len(catalog["levels"])} levels, {len(data)} bytes; '
+          f'{reread} of {len(records)} sources re-read)')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,9 @@ This script creates playable levels with proper unmovable tile placement:
 - Always placed adjacent to playable areas (can be broken)
 - Never isolated or in unreachable areas
 - Collectibles never spawn in bottom row
+
+build_level() returns a level dict without writing it; the DLC server's daily
+challenge pool (dlc_server/daily_levels.py) generates its levels with it.
 """
 import json
 import os
@@ -40,6 +43,9 @@ LEVEL_TEMPLATE = {
     "spreader_spread_limit": 0  # Max new spreaders per move (0 = unlimited)
 }
 
+# Set to False to silence progress output (e.g. when generating inside a server)
+VERBOSE = True
+
 SPECIAL_CHARS = {
     'blocked': 'X',
     'playable': '0',
@@ -64,6 +70,11 @@ SHAPES = [
 ]
 
 
+def _log(message):
+    if VERBOSE:
+        print(message)
+
+
 def get_suitable_shapes(w, h):
     """Get shapes suitable for the given grid size"""
     # For small grids (6x6 or smaller), only use full rectangle and diamond
@@ -439,7 +450,7 @@ def generate_layout(w, h, shape_func, add_collectibles=True, add_unmovables=True
         # Validate base shape is playable
         is_playable, reason = is_level_playable(grid, w, h)
         if not is_playable:
-            print(f"  Attempt {attempt + 1}: Base shape not playable - {reason}, retrying...")
+            _log(f"  Attempt {attempt + 1}: Base shape not playable - {reason}, retrying...")
             # Try full rectangle as fallback
             if attempt >= 2:
                 grid = SHAPES[0](w, h)  # Full rectangle
@@ -483,10 +494,10 @@ def generate_layout(w, h, shape_func, add_collectibles=True, add_unmovables=True
             # Validate after adding unmovables
             is_playable, reason = is_level_playable(grid, w, h)
             if not is_playable:
-                print(f"  Attempt {attempt + 1}: Unmovables made level unplayable - {reason}, retrying...")
+                _log(f"  Attempt {attempt + 1}: Unmovables made level unplayable - {reason}, retrying...")
                 continue
 
-            print(f"  Placed {placed_count} unmovable tiles")
+            _log(f"  Placed {placed_count} unmovable tiles")
 
         # Add collectibles (but not in bottom row, and not where unmovables are)
         num_collectibles = 0
@@ -513,10 +524,10 @@ def generate_layout(w, h, shape_func, add_collectibles=True, add_unmovables=True
             layout = serialize_grid_to_layout(grid, w, h)
             return layout, num_collectibles, hard_placed
         else:
-            print(f"  Attempt {attempt + 1}: Final validation failed - {reason}, retrying...")
+            _log(f"  Attempt {attempt + 1}: Final validation failed - {reason}, retrying...")
 
     # If all retries failed, generate a simple full rectangle (guaranteed playable)
-    print(f"  All attempts failed, using safe full rectangle layout")
+    _log(f"  All attempts failed, using safe full rectangle layout")
     grid = SHAPES[0](w, h)  # Full rectangle
     layout = serialize_grid_to_layout(grid, w, h)
     return layout, 0, []
@@ -562,11 +573,14 @@ def estimate_target_and_moves(level_index, w, h, has_collectibles, has_unmovable
     return target, moves
 
 
-def write_level(out_dir, level_num, w=8, h=8, level_type='random'):
-    print(f"\nGenerating level {level_num}...")
+def build_level(level_num, w=8, h=8, level_type='random', seed=None):
+    """Generate one level and return (data, summary) without writing anything.
 
-    # Seed RNG for deterministic results per level number
-    random.seed(level_num)
+    The RNG is seeded with `seed` (default: the level number), so the same
+    arguments always produce the same level.
+    """
+    base_seed = level_num if seed is None else seed
+    random.seed(base_seed)
 
     # Get suitable shapes for this grid size
     suitable_shapes = get_suitable_shapes(w, h)
@@ -665,7 +679,7 @@ def write_level(out_dir, level_num, w=8, h=8, level_type='random'):
             if 'H' in layout and hard_placed and len(hard_placed) > 0:
                 break
             # otherwise retry with a new random variation
-            random.seed(level_num + attempt + 1)
+            random.seed(base_seed + attempt + 1)
         # if still no hard tile, log and proceed (generator may have fallen back to safe layout)
     else:
         layout, num_collectibles, hard_placed = generate_layout(w, h, shape, add_collectibles, add_unmovables, unmovable_mode=unmovable_mode)
@@ -730,7 +744,7 @@ def write_level(out_dir, level_num, w=8, h=8, level_type='random'):
     if hard_placed and len(hard_placed) > 0:
         # hard_placed may be list of tuples (x,y,hits,htype)
         types_in_level = set([p[3] for p in hard_placed])
-        for t in types_in_level:
+        for t in sorted(types_in_level):
             # assume max 3 stages (0..2) for generator; filenames are theme-relative
             hard_textures_map[t] = [f"unmovable_hard_{t}_{i}.svg" for i in range(3)]
         data['hard_textures'] = hard_textures_map
@@ -792,14 +806,29 @@ def write_level(out_dir, level_num, w=8, h=8, level_type='random'):
         data['collectible_target'] = 0
         data['description'] = f"Reach {target} points in {moves} moves!"
 
+    summary = {
+        'num_collectibles': num_collectibles,
+        'has_unmovables': has_unmovables,
+        'num_spreaders': num_spreaders,
+        'has_spreaders': has_spreaders,
+    }
+    return data, summary
+
+
+def write_level(out_dir, level_num, w=8, h=8, level_type='random'):
+    print(f"\nGenerating level {level_num}...")
+    data, summary = build_level(level_num, w, h, level_type)
+    has_unmovables = summary['has_unmovables']
+    has_spreaders = summary['has_spreaders']
+
     os.makedirs(out_dir, exist_ok=True)
     filename = os.path.join(out_dir, f"level_{level_num:02d}.json")
     with open(filename, 'w') as f:
         json.dump(data, f, indent=2)
 
     print(f"✓ Wrote {filename}")
-    print(f"  Size: {w}x{h}, Moves: {moves}, Target: {target}")
-    print(f"  Collectibles: {num_collectibles}, Unmovables: {'Yes' if has_unmovables else 'No'}, Spreaders: {num_spreaders if has_spreaders else 'No'}")
+    print(f"  Size: {w}x{h}, Moves: {data['max_moves']}, Target: {data['target_score']}")
+    print(f"  Collectibles: {summary['num_collectibles']}, Unmovables: {'Yes' if has_unmovables else 'No'}, Spreaders: {summary['num_spreaders'] if has_spreaders else 'No'}")
     if has_unmovables:
         print(f"  Unmovable type: {data['unmovable_type']}")
     if has_spreaders:
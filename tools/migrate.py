@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Run content migrations as one all-or-nothing batch.
+
+A migration is a function registered with @migration. It receives one parsed
+document at a time, for every file in the content_index sections it names,
+and mutates the document in place. It returns True if it changed anything.
+The runner:
+
+1. loads the shared content index once, so every file is parsed once
+2. gives each file to every pending migration in registration order
+   (one pass, each migration sees the previous one's output)
+3. prints the plan: files to change, add, move or delete, with unified diffs
+   under --diff
+4. with --apply, writes every new file to a temporary sibling in parallel,
+   then swaps them all in with os.replace. If any step fails, files already
+   swapped are restored and the temporaries are removed, so either every
+   change lands or none does
+
+Only files a migration changed are written. JSON keeps its indent and
+trailing newline. Applied migration ids are recorded in
+tools/migrations_applied.json (the ledger), which is written inside the same
+batch, so a migration is pending until its batch commits. Migrations are
+written to be idempotent, so --rerun is safe.
+
+Migrations can also append to a non-JSON file (ctx.append, e.g. a .po
+catalogue) and move the file they are given (ctx.move_to). Both are part of
+the same batch.
+
+This replaces the one-off scripts (migrate_anchors.py,
+migrate_level_narrative_stages.py, migrate_narrative_to_translation_keys.py,
+add_show_rewards_steps.py), which wrote files one at a time next to .bak
+copies. Definition extraction (migrate_flow_definitions*.py) is covered by
+extract_definitions.py.
+
+Usage:
+    python3 tools/migrate.py                          # plan pending migrations (dry run)
+    python3 tools/migrate.py --diff                   # ... with unified diffs
+    python3 tools/migrate.py --apply                  # apply them as one batch
+    python3 tools/migrate.py --only anchors_to_anchor --rerun anchors_to_anchor --apply
+    python3 tools/migrate.py --list                   # registered migrations and their status
+"""
+import argparse
+import copy
+import difflib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from content_index import DATA_DIR, LEVEL_STAGES_DIR, ROOT, load_index
+
+LEDGER_PATH = ROOT / 'tools' / 'migrations_applied.json'
+PO_PATH = DATA_DIR / 'content_packs' / 'genesis' / 'translations' / 'narrative_en.po'
+TMP_SUFFIX = '.migrate.tmp'
+# Flows whose levels end on the rewards screen (add_show_rewards_steps.py only ever targeted main_story)
+REWARD_SCREEN_FLOWS = ('main_story',)
+
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, migration_id, sections, description, transform):
+        self.id = migration_id
+        self.sections = sections
+        self.description = description
+        self.transform = transform
+
+
+def migration(migration_id, sections):
+    """Register transform(doc, ctx) -> changed for every file of the given content_index sections."""
+    def register(transform):
+        description = (transform.__doc__ or '').strip().split('\n')[0]
+        MIGRATIONS.append(Migration(migration_id, tuple(sections), description, transform))
+        return transform
+    return register
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, '/')
+
+
+def _indent(text):
+    match = re.search(r'\n([ \t]+)"', text)
+    if not match:
+        return 2
+    return '\t' if match.group(1).startswith('\t') else len(match.group(1))
+
+
+class Context:
+    """What a transform sees besides the document: the file, the index and the batch."""
+
+    def __init__(self, batch, section, key, path):
+        self.batch = batch
+        self.index = batch.index
+        self.section = section
+        self.key = key
+        self.path = path
+        self.migration = None
+
+    @property
+    def state(self):
+        """Scratch dict shared by every call of the current migration in this batch."""
+        return self.batch.state.setdefault(self.migration.id, {})
+
+    def warn(self, message):
+        self.batch.warnings.append(f'{self.migration.id}: {rel(self.path)}: {message}')
+
+    def move_to(self, dest):
+        """Write this file to dest instead (the original is deleted when the batch commits)."""
+        self.batch.moves[self.path] = Path(dest)
+
+    def append(self, path, text, header=''):
+        """Append text to a (non-JSON) file; header is written once, before this batch's first append."""
+        chunks = self.batch.appends.setdefault(Path(path), [])
+        if not chunks and header:
+            chunks.append(header)
+        chunks.append(text)
+
+
+class Batch:
+    """Pending migrations applied in memory, then planned or committed as one transaction."""
+
+    def __init__(self, index, migrations):
+        self.index = index
+        self.migrations = migrations
+        self.originals = {}        # path -> original text
+        self.documents = {}        # path -> migrated document
+        self.moves = {}            # path -> destination
+        self.appends = {}          # path -> [text]
+        self.changed_by = {m.id: [] for m in migrations}
+        self.state = {}
+        self.warnings = []
+
+    def run(self):
+        sections = {s for m in self.migrations for s in m.sections}
+        for (section, key), path in sorted(self.index.paths.items(), key=lambda item: str(item[1])):
+            if section not in sections or key not in getattr(self.index, section, {}):
+                continue
+            doc, ctx, changed = None, Context(self, section, key, path), False
+            for m in self.migrations:
+                if section not in m.sections:
+                    continue
+                if doc is None:
+                    # The index's parse is shared; only files a migration looks at are copied
+                    doc = copy.deepcopy(getattr(self.index, section)[key])
+                ctx.migration = m
+                moved = self.moves.get(path)
+                if m.transform(doc, ctx) or self.moves.get(path) != moved:
+                    self.changed_by[m.id].append(rel(path))
+                    changed = True
+            if changed:
+                self.originals[path] = path.read_text(encoding='utf-8')
+                self.documents[path] = doc
+        return self
+
+    def operations(self):
+        """[(path, old text or None, new text or None)]; None means absent before / deleted after."""
+        ops = []
+        for path, doc in self.documents.items():
+            old = self.originals[path]
+            new = json.dumps(doc, indent=_indent(old), ensure_ascii=False) + ('\n' if old.endswith('\n') else '')
+            dest = self.moves.get(path, path)
+            if dest != path:
+                existing = dest.read_text(encoding='utf-8') if dest.exists() else None
+                if existing is not None and existing != new:
+                    raise SystemExit(f'refusing to migrate: {rel(path)} would overwrite {rel(dest)}')
+                ops.append((path, old, None))
+                if existing is None:
+                    ops.append((dest, None, new))
+            elif new != old:
+                ops.append((path, old, new))
+        for path, chunks in self.appends.items():
+            old = path.read_text(encoding='utf-8') if path.exists() else None
+            ops.append((path, old, (old or '') + ''.join(chunks)))
+        return ops
+
+    def commit(self, ops, ledger, workers=None):
+        """Write every operation or none. Temporaries are staged in parallel, then swapped in."""
+        ops = ops + [(LEDGER_PATH, LEDGER_PATH.read_text() if LEDGER_PATH.exists() else None,
+                      json.dumps(ledger, indent=2) + '\n')]
+        writes = [(path, new) for path, _, new in ops if new is not None]
+
+        def stage(item):
+            path, text = item
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + TMP_SUFFIX)
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            return tmp
+
+        staged = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4)) as pool:
+                futures = [pool.submit(stage, item) for item in writes]
+                errors = []
+                for future in futures:
+                    try:
+                        staged.append(future.result())
+                    except OSError as e:
+                        errors.append(e)
+                if errors:
+                    raise errors[0]
+        except OSError as e:
+            for tmp in staged:
+                tmp.unlink(missing_ok=True)
+            raise SystemExit(f'nothing written: staging failed: {e}')
+
+        done = []
+        try:
+            for path, old, new in ops:
+                if new is not None:
+                    os.replace(path.with_name(path.name + TMP_SUFFIX), path)
+                else:
+                    path.unlink()
+                done.append((path, old))
+        except OSError as e:
+            failed = path
+            for path, old in reversed(done):
+                if old is None:
+                    path.unlink(missing_ok=True)
+                else:
+                    tmp = path.with_name(path.name + TMP_SUFFIX)
+                    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                        f.write(old)
+                    os.replace(tmp, path)
+            for path, _, new in ops:
+                if new is not None:
+                    path.with_name(path.name + TMP_SUFFIX).unlink(missing_ok=True)
+            raise SystemExit(f'nothing written: commit failed at {rel(failed)} ({e}); rolled back {len(done)} file(s)')
+
+
+def load_ledger():
+    try:
+        ledger = json.loads(LEDGER_PATH.read_text())
+    except (OSError, ValueError):
+        ledger = {}
+    ledger.setdefault('applied', [])
+    return ledger
+
+
+# --- Migrations (applied in this order) ---------------------------------------------------------
+
+
+@migration('anchors_to_anchor', sections=('stages', 'level_stages'))
+def anchors_to_anchor(doc, ctx):
+    """Narrative stages: plural 'anchors' array -> singular 'anchor' string (first entry)."""
+    if not isinstance(doc, dict) or 'anchors' not in doc:
+        return False
+    anchors = doc.pop('anchors')
+    if isinstance(anchors, list) and anchors:
+        if len(anchors) > 1:
+            ctx.warn(f'multiple anchors {anchors}; using the first')
+        doc['anchor'] = anchors[0]
+    else:
+        ctx.warn("non-list or empty 'anchors'; setting anchor to an empty string")
+        doc['anchor'] = ''
+    return True
+
+
+@migration('level_stages_to_levels_dir', sections=('stages',))
+def level_stages_to_levels_dir(doc, ctx):
+    """Narrative stages: move data/narrative_stages/level_*.json into data/narrative_stages/levels/."""
+    if not ctx.path.name.startswith('level_'):
+        return False
+    ctx.move_to(LEVEL_STAGES_DIR / ctx.path.name)
+    return False
+
+
+def _translation_key(stage_id, state_name):
+    return f"NARRATIVE_{stage_id.upper().replace('-', '_')}_{state_name.upper()}"
+
+
+def _po_msgids(path):
+    try:
+        text = path.read_text(encoding='utf-8')
+    except OSError:
+        return set()
+    return set(re.findall(r'^msgid "(.+)"$', text, re.MULTILINE))
+
+
+@migration('narrative_text_keys', sections=('stages',))
+def narrative_text_keys(doc, ctx):
+    """Narrative stages: hardcoded state 'text' -> 'text_key', appending the text to narrative_en.po."""
+    states = doc.get('states') if isinstance(doc, dict) else None
+    if not isinstance(states, list):
+        return False
+    if 'msgids' not in ctx.state:
+        ctx.state['msgids'] = _po_msgids(PO_PATH)
+    known = ctx.state['msgids']
+    stage_id = doc.get('id', ctx.path.stem)
+    changed = False
+    for i, state in enumerate(states):
+        if not isinstance(state, dict) or 'text' not in state or 'text_key' in state:
+            continue
+        key = _translation_key(stage_id, state.get('name', f'state_{i}'))
+        text = state.pop('text')
+        state['text_key'] = key
+        changed = True
+        if key in known:
+            continue
+        known.add(key)
+        escaped = str(text).replace('"', '\\"').replace('\n', '\\n')
+        ctx.append(PO_PATH, f'msgid "{key}"\nmsgstr "{escaped}"\n\n',
+                   header='\n# ' + '=' * 77 + '\n# AUTO-MIGRATED NARRATIVE STAGE TEXTS\n'
+                          '# Generated by tools/migrate.py (narrative_text_keys)\n# ' + '=' * 77 + '\n\n')
+    return changed
+
+
+@migration('show_rewards_after_levels', sections=('flows',))
+def show_rewards_after_levels(doc, ctx):
+    """Flows: make sure every top-level level node in main_story is followed by a show_rewards step."""
+    nodes = doc.get('flow') if isinstance(doc, dict) else None
+    if ctx.key not in REWARD_SCREEN_FLOWS or not isinstance(nodes, list):
+        return False
+    out, changed = [], False
+    for i, node in enumerate(nodes):
+        out.append(node)
+        if not isinstance(node, dict) or node.get('type') != 'level':
+            continue
+        digits = re.sub(r'\D', '', str(node.get('id', '')))
+        if not digits:
+            ctx.warn(f"flow/{i}: level id {node.get('id')!r} has no number; no show_rewards added")
+            continue
+        following = nodes[i + 1] if i + 1 < len(nodes) else None
+        if isinstance(following, dict) and following.get('type') == 'show_rewards':
+            continue
+        out.append({'type': 'show_rewards', 'level_number': int(digits), 'completed': True})
+        changed = True
+    if changed:
+        doc['flow'] = out
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan or apply pending content migrations as one batch')
+    parser.add_argument('--apply', action='store_true', help='Write the changes (default: dry run)')
+    parser.add_argument('--diff', action='store_true', help='Show unified diffs in the plan')
+    parser.add_argument('--only', action='append', metavar='ID', help='Run only these migrations (repeatable)')
+    parser.add_argument('--rerun', action='append', metavar='ID', default=[],
+                        help='Run a migration even if the ledger says it was applied (repeatable)')
+    parser.add_argument('--list', action='store_true', help='List registered migrations and exit')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel writers (default: cpu count + 4, max 32)')
+    args = parser.parse_args()
+
+    known = {m.id for m in MIGRATIONS}
+    for migration_id in (args.only or []) + args.rerun:
+        if migration_id not in known:
+            parser.error(f'unknown migration {migration_id!r} (see --list)')
+    ledger = load_ledger()
+    applied = {entry['id']: entry for entry in ledger['applied']}
+    if args.list:
+        for m in MIGRATIONS:
+            status = f"applied {applied[m.id]['applied_at']}" if m.id in applied else 'pending'
+            print(f'  {m.id:28} {status:32} {m.description}')
+        return 0
+
+    pending = [m for m in MIGRATIONS if (m.id not in applied or m.id in args.rerun)
+               and (not args.only or m.id in args.only)]
+    if not pending:
+        print('No pending migrations')
+        return 0
+    started = time.perf_counter()
+    batch = Batch(load_index(), pending).run()
+    ops = batch.operations()
+    elapsed = time.perf_counter() - started
+
+    print(f"Planned {len(pending)} migration(s) in {elapsed * 1000:.0f} ms: {', '.join(m.id for m in pending)}")
+    for m in pending:
+        print(f'  {m.id}: {len(batch.changed_by[m.id])} file(s)')
+    for warning in batch.warnings:
+        print(f'  - WARNING {warning}')
+    for path, old, new in ops:
+        kind = 'A' if old is None else 'D' if new is None else 'M'
+        print(f'  {kind} {rel(path)}')
+        if args.diff:
+            sys.stdout.writelines(difflib.unified_diff(
+                (old or '').splitlines(keepends=True), (new or '').splitlines(keepends=True),
+                f'a/{rel(path)}', f'b/{rel(path)}'))
+    if not args.apply:
+        print('Dry run; re-run with --apply to write these changes as one batch')
+        return 0
+
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    ledger['applied'] = [e for e in ledger['applied'] if e['id'] not in {m.id for m in pending}]
+    ledger['applied'] += [{'id': m.id, 'applied_at': now, 'files': batch.changed_by[m.id]} for m in pending]
+    started = time.perf_counter()
+    batch.commit(ops, ledger, args.workers)
+    print(f'Applied {len(pending)} migration(s): {len(ops)} file operation(s) in '
+          f'{(time.perf_counter() - started) * 1000:.0f} ms; ledger {rel(LEDGER_PATH)} updated')
+    print('Run tools/validate_all.py to check the result')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@
 """
 Migrate narrative stage files from plural 'anchors' (array) to singular 'anchor' (string).
 Creates a backup `<file>.json.bak` before overwriting.
+Superseded by tools/migrate.py (migration 'anchors_to_anchor'), which applies it atomically with other migrations.
 """
 import json
 from pathlib import Path
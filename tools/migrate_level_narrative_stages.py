@@ -2,6 +2,7 @@
 """
 Move level_* narrative stage JSONs into data/narrative_stages/levels/
 Creates the target directory if missing. Creates a .bak copy for safety.
+Superseded by tools/migrate.py (migration 'level_stages_to_levels_dir'), which applies it atomically with other migrations.
 """
 import json
 from pathlib import Path
@@ -2,6 +2,7 @@
 """
 Narrative Stage JSON to Translation Key Migrator
 Converts hardcoded "text" fields to "text_key" and extracts text to PO file.
+Superseded by tools/migrate.py (migration 'narrative_text_keys'), which applies it atomically with other migrations.
 
 Usage:
     python3 migrate_narrative_to_translation_keys.py
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Compile level JSON files into one packed bundle per source.
+
+LevelManager.load_all_levels opens and parses every data/levels/level_XX.json
+at startup. A bundle holds the same levels behind a fixed-width index, so a
+loader can list every level (number, target, moves, objectives) by reading
+one small block and decode a single level only when it is played.
+
+Sources:
+- data/levels/level_*.json                    -> build/levels/base.pack
+- dlc_server/dlc/chapters/<id>/levels/*.json  -> build/levels/<id>.pack
+
+File format (little-endian):
+
+    header   HEADER_FORMAT: magic b'M3LP', version, index record size,
+             level count, offset of the first payload
+    index    one INDEX_FORMAT record per level, sorted by level number:
+             level_number, payload offset, payload length, payload crc32,
+             target_score, max_moves, collectible_target, unmovable_target,
+             FLAG_* bits, width, height, num_tile_types, layout kind
+    payloads one per level, in index order
+
+A payload is the level's JSON (minified, original key order) followed by its
+layout. The layout is stored as one byte per cell, row by row, plus a small
+table of the level's non-integer tokens:
+
+    u8 token count, then per token: u8 length + UTF-8 text
+    width * height cell bytes: 0x00-0x7F integer value, 0xFF integer -1,
+    0x80-0xFE index into the token table
+
+In the JSON the layout value is replaced by null, so the key keeps its place.
+String layouts are re-rendered with their original separator and array layouts
+with their original shape. A layout is packed only if that rendering gives back
+exactly the source value. Anything else (odd spacing, '01', more than 127
+distinct tokens, a wrong row count) is left in the JSON as-is (LAYOUT_RAW), so
+decoding always returns the source level unchanged.
+
+Usage:
+    python3 tools/pack_levels.py              # base levels and every chapter
+    python3 tools/pack_levels.py base gospels
+    python3 tools/pack_levels.py --verify     # rebuild, then round-trip every level against its source
+    python3 tools/pack_levels.py --list build/levels/base.pack
+"""
+import argparse
+import bisect
+import json
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+from layout_grammar import count_cells, parse_layout
+
+ROOT = Path(__file__).resolve().parents[1]
+BASE_LEVELS_DIR = ROOT / 'data' / 'levels'
+CHAPTERS_DIR = ROOT / 'dlc_server' / 'dlc' / 'chapters'
+OUTPUT_DIR = ROOT / 'build' / 'levels'
+LEVEL_FILE_RE = re.compile(r'^level_(\d+)\.json$')
+
+MAGIC = b'M3LP'
+VERSION = 1
+HEADER_FORMAT = '<4sHHII'
+INDEX_FORMAT = '<IIIIIHHHHBBBB'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(INDEX_FORMAT)
+
+# Index flags
+FLAG_COLLECTIBLE_GOAL = 1 << 0
+FLAG_UNMOVABLE_GOAL = 1 << 1
+FLAG_SPREADER_GOAL = 1 << 2
+FLAG_HAS_HARD = 1 << 3
+FLAG_HAS_SPREADERS = 1 << 4
+FLAG_HAS_COLLECTIBLES = 1 << 5
+
+# Layout kinds; the string kinds name the separator between cells
+LAYOUT_RAW = 0
+LAYOUT_SPACE = 1
+LAYOUT_COMMA = 2
+LAYOUT_CHARS = 3
+LAYOUT_2D = 4
+LAYOUT_FLAT = 5
+STRING_SEPARATORS = {LAYOUT_SPACE: ' ', LAYOUT_COMMA: ',', LAYOUT_CHARS: ''}
+
+CELL_MAX_INT = 0x7F
+CELL_MINUS_ONE = 0xFF
+CELL_TOKEN_BASE = 0x80
+MAX_TOKENS = CELL_MINUS_ONE - CELL_TOKEN_BASE
+CANONICAL_INT_RE = re.compile(r'^(-1|0|[1-9]\d*)$')
+
+LevelEntry = namedtuple('LevelEntry', 'level_number offset length crc target_score max_moves collectible_target '
+                                      'unmovable_target flags width height num_tile_types layout_kind')
+
+
+class PackError(ValueError):
+    """A corrupt or incompatible bundle."""
+
+
+def _encode_cells(cells):
+    """Cell bytes and token table for a row-major list of cells (ints or strings), or None if not representable."""
+    tokens, out = [], bytearray()
+    for cell in cells:
+        if isinstance(cell, bool):
+            return None
+        if isinstance(cell, int):
+            if cell == -1:
+                out.append(CELL_MINUS_ONE)
+            elif 0 <= cell <= CELL_MAX_INT:
+                out.append(cell)
+            else:
+                return None
+            continue
+        if not isinstance(cell, str):
+            return None
+        if cell not in tokens:
+            if len(tokens) == MAX_TOKENS or len(cell.encode('utf-8')) > 0xFF:
+                return None
+            tokens.append(cell)
+        out.append(CELL_TOKEN_BASE + tokens.index(cell))
+    return bytes(out), tokens
+
+
+def _decode_cells(data, tokens):
+    return [(-1 if b == CELL_MINUS_ONE else b) if b <= CELL_MAX_INT or b == CELL_MINUS_ONE
+            else tokens[b - CELL_TOKEN_BASE] for b in data]
+
+
+def _string_cells(layout, kind):
+    """Cells of a string layout as ints where the text is a canonical integer, else the token text."""
+    separator = STRING_SEPARATORS[kind]
+    rows = layout.split('\n')
+    cells = []
+    for row in rows:
+        for token in (row.split(separator) if separator else list(row)):
+            cells.append(int(token) if CANONICAL_INT_RE.match(token) else token)
+    return rows, cells
+
+
+def render_layout(kind, cells, width, height):
+    """Rebuild the source layout value from decoded row-major cells."""
+    if kind in STRING_SEPARATORS:
+        separator = STRING_SEPARATORS[kind]
+        return '\n'.join(separator.join(str(c) for c in cells[y * width:(y + 1) * width]) for y in range(height))
+    if kind == LAYOUT_2D:
+        return [[cells[y * width + x] for y in range(height)] for x in range(width)]
+    return list(cells)
+
+
+def encode_layout(layout, width, height):
+    """(kind, cell bytes, tokens) for a layout, or (LAYOUT_RAW, b'', []) when it cannot be packed exactly."""
+    raw = (LAYOUT_RAW, b'', [])
+    if not isinstance(width, int) or not isinstance(height, int) or not (0 < width <= 0xFF and 0 < height <= 0xFF):
+        return raw
+    if isinstance(layout, str):
+        kind = LAYOUT_COMMA if ',' in layout else LAYOUT_SPACE if ' ' in layout else LAYOUT_CHARS
+        rows, cells = _string_cells(layout, kind)
+        if len(rows) != height or len(cells) != width * height:
+            return raw
+    elif isinstance(layout, list) and layout and all(isinstance(col, list) for col in layout):
+        kind = LAYOUT_2D
+        if len(layout) != width or any(len(col) != height for col in layout):
+            return raw
+        cells = [layout[x][y] for y in range(height) for x in range(width)]
+    elif isinstance(layout, list):
+        kind, cells = LAYOUT_FLAT, layout
+        if len(cells) != width * height:
+            return raw
+    else:
+        return raw
+    encoded = _encode_cells(cells)
+    if encoded is None:
+        return raw
+    data, tokens = encoded
+    if render_layout(kind, _decode_cells(data, tokens), width, height) != layout:
+        return raw
+    return kind, data, tokens
+
+
+def level_flags(level, width, height):
+    flags = 0
+    if (level.get('collectible_target') or 0) > 0:
+        flags |= FLAG_COLLECTIBLE_GOAL
+    if (level.get('unmovable_target') or 0) > 0:
+        flags |= FLAG_UNMOVABLE_GOAL
+    if level.get('spreader_target'):
+        flags |= FLAG_SPREADER_GOAL
+    if isinstance(width, int) and isinstance(height, int) and width > 0 and height > 0:
+        kinds = count_cells(parse_layout(level.get('layout', ''), width, height))
+        if kinds.get('hard'):
+            flags |= FLAG_HAS_HARD
+        if kinds.get('spreader'):
+            flags |= FLAG_HAS_SPREADERS
+        if kinds.get('collectible'):
+            flags |= FLAG_HAS_COLLECTIBLES
+    return flags
+
+
+def _clamp(value, limit):
+    return max(0, min(limit, value)) if isinstance(value, int) else 0
+
+
+def encode_level(level):
+    """(index fields without offset/length/crc, payload) for one level dict."""
+    width = level.get('grid_width', level.get('width', 8))
+    height = level.get('grid_height', level.get('height', 8))
+    kind, cells, tokens = encode_layout(level.get('layout', ''), width, height)
+    doc = dict(level)
+    if kind != LAYOUT_RAW:
+        doc['layout'] = None
+    body = json.dumps(doc, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    table = bytearray([len(tokens)])
+    for token in tokens:
+        raw = token.encode('utf-8')
+        table += bytes([len(raw)]) + raw
+    payload = struct.pack('<I', len(body)) + body + bytes(table) + cells
+    meta = (
+        _clamp(level.get('target_score', level.get('target')), 0xFFFFFFFF),
+        _clamp(level.get('max_moves', level.get('moves')), 0xFFFF),
+        _clamp(level.get('collectible_target'), 0xFFFF),
+        _clamp(level.get('unmovable_target'), 0xFFFF),
+        level_flags(level, width, height),
+        _clamp(width, 0xFF),
+        _clamp(height, 0xFF),
+        _clamp(level.get('num_tile_types'), 0xFF),
+        kind,
+    )
+    return meta, payload
+
+
+def build_pack(levels):
+    """Bundle bytes for a list of level dicts (any order; level numbers must be unique)."""
+    levels = sorted(levels, key=lambda lv: lv['level_number'])
+    numbers = [lv['level_number'] for lv in levels]
+    duplicates = sorted({n for n in numbers if numbers.count(n) > 1})
+    if duplicates:
+        raise PackError(f'duplicate level numbers: {duplicates}')
+    encoded = [encode_level(lv) for lv in levels]
+    data_offset = HEADER_SIZE + RECORD_SIZE * len(levels)
+    index, payloads, offset = bytearray(), bytearray(), data_offset
+    for level, (meta, payload) in zip(levels, encoded):
+        index += struct.pack(INDEX_FORMAT, level['level_number'], offset, len(payload),
+                             zlib.crc32(payload) & 0xFFFFFFFF, *meta)
+        payloads += payload
+        offset += len(payload)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, len(levels), data_offset)
+    return header + bytes(index) + bytes(payloads)
+
+
+class LevelPack:
+    """Reader for a bundle. The index is parsed up front; levels are decoded on demand."""
+
+    def __init__(self, path_or_bytes):
+        if isinstance(path_or_bytes, (bytes, bytearray)):
+            self._data = bytes(path_or_bytes)
+        else:
+            with open(path_or_bytes, 'rb') as fh:
+                self._data = fh.read()
+        if len(self._data) < HEADER_SIZE:
+            raise PackError('file too short for a header')
+        magic, version, record_size, count, data_offset = struct.unpack_from(HEADER_FORMAT, self._data)
+        if magic != MAGIC:
+            raise PackError(f'bad magic {magic!r}')
+        if version != VERSION or record_size != RECORD_SIZE:
+            raise PackError(f'unsupported version {version} (record size {record_size})')
+        if data_offset != HEADER_SIZE + count * RECORD_SIZE or data_offset > len(self._data):
+            raise PackError('index does not fit the file')
+        self.entries = [LevelEntry(*fields) for fields in
+                        struct.iter_unpack(INDEX_FORMAT, self._data[HEADER_SIZE:data_offset])]
+        self._numbers = [e.level_number for e in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, level_number):
+        return self.entry(level_number) is not None
+
+    def entry(self, level_number):
+        pos = bisect.bisect_left(self._numbers, level_number)
+        if pos < len(self._numbers) and self._numbers[pos] == level_number:
+            return self.entries[pos]
+        return None
+
+    def load(self, level_number):
+        """The level dict exactly as it was in its JSON file. Raises KeyError or PackError."""
+        entry = self.entry(level_number)
+        if entry is None:
+            raise KeyError(level_number)
+        payload = self._data[entry.offset:entry.offset + entry.length]
+        if len(payload) != entry.length or zlib.crc32(payload) & 0xFFFFFFFF != entry.crc:
+            raise PackError(f'level {level_number}: payload checksum mismatch')
+        body_len = struct.unpack_from('<I', payload)[0]
+        level = json.loads(payload[4:4 + body_len].decode('utf-8'))
+        if entry.layout_kind == LAYOUT_RAW:
+            return level
+        pos = 4 + body_len
+        tokens = []
+        for _ in range(payload[pos]):
+            size = payload[pos + 1]
+            tokens.append(payload[pos + 2:pos + 2 + size].decode('utf-8'))
+            pos += 1 + size
+        cells = _decode_cells(payload[pos + 1:], tokens)
+        if len(cells) != entry.width * entry.height:
+            raise PackError(f'level {level_number}: {len(cells)} cells for a {entry.width}x{entry.height} grid')
+        level['layout'] = render_layout(entry.layout_kind, cells, entry.width, entry.height)
+        return level
+
+
+def level_files(source):
+    """Sorted (level_number, path) for a source ('base' or a chapter id)."""
+    directory = BASE_LEVELS_DIR if source == 'base' else CHAPTERS_DIR / source / 'levels'
+    files = []
+    for path in directory.glob('level_*.json'):
+        match = LEVEL_FILE_RE.match(path.name)
+        if match:
+            files.append((int(match.group(1)), path))
+    return sorted(files)
+
+
+def read_levels(source):
+    levels = []
+    for number, path in level_files(source):
+        level = json.loads(path.read_text(encoding='utf-8'))
+        if level.get('level_number') != number:
+            raise PackError(f'{path.relative_to(ROOT)}: level_number {level.get("level_number")!r} '
+                            f'does not match the file name')
+        levels.append(level)
+    return levels
+
+
+def all_sources():
+    chapters = sorted(p.name for p in CHAPTERS_DIR.iterdir() if (p / 'levels').is_dir()) if CHAPTERS_DIR.is_dir() else []
+    return ['base'] + chapters
+
+
+def write_if_changed(path, data):
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def verify(source, pack_path):
+    """Round-trip every source level through the bundle. Returns a list of problems."""
+    problems = []
+    pack = LevelPack(pack_path)
+    files = level_files(source)
+    if len(pack) != len(files):
+        problems.append(f'bundle has {len(pack)} levels, source has {len(files)}')
+    for number, path in files:
+        original = json.loads(path.read_text(encoding='utf-8'))
+        try:
+            decoded = pack.load(number)
+        except (KeyError, PackError) as e:
+            problems.append(f'level {number}: {e!r}')
+            continue
+        # json.dumps without sort_keys also compares key order
+        if json.dumps(decoded) != json.dumps(original):
+            problems.append(f'level {number}: decoded level differs from {path.relative_to(ROOT)}')
+    return problems
+
+
+def print_listing(pack_path):
+    pack = LevelPack(pack_path)
+    kinds = {LAYOUT_RAW: 'raw', LAYOUT_SPACE: 'space', LAYOUT_COMMA: 'comma', LAYOUT_CHARS: 'chars',
+             LAYOUT_2D: '2d', LAYOUT_FLAT: 'flat'}
+    flag_names = [(FLAG_COLLECTIBLE_GOAL, 'collect'), (FLAG_UNMOVABLE_GOAL, 'unmovable'),
+                  (FLAG_SPREADER_GOAL, 'spreader'), (FLAG_HAS_HARD, 'hard')]
+    for e in pack.entries:
+        goals = ','.join(name for bit, name in flag_names if e.flags & bit) or 'score'
+        print(f'  level {e.level_number:>4}  {e.width}x{e.height}  target {e.target_score:>6}  moves {e.max_moves:>3}  '
+              f'{goals:<18} layout={kinds.get(e.layout_kind, e.layout_kind)}  {e.length} bytes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack level JSON files into indexed bundles')
+    parser.add_argument('sources', nargs='*', help="'base' and/or chapter ids (default: all)")
+    parser.add_argument('--verify', action='store_true', help='Round-trip every level against its source after building')
+    parser.add_argument('--list', metavar='PACK', help='Print the index of an existing bundle and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print_listing(args.list)
+        return
+
+    sources = args.sources or all_sources()
+    failed = False
+    for source in sources:
+        files = level_files(source)
+        if not files:
+            print(f'{source}: no level files found')
+            failed = True
+            continue
+        started = time.perf_counter()
+        levels = read_levels(source)
+        json_seconds = time.perf_counter() - started
+        data = build_pack(levels)
+        out = OUTPUT_DIR / f'{source}.pack'
+        changed = write_if_changed(out, data)
+        source_bytes = sum(path.stat().st_size for _, path in files)
+        started = time.perf_counter()
+        pack = LevelPack(out)
+        index_seconds = time.perf_counter() - started
+        raw = sum(1 for e in pack.entries if e.layout_kind == LAYOUT_RAW)
+        print(f'{source}: {"wrote" if changed else "unchanged"} {out.relative_to(ROOT)} '
+              f'({len(levels)} levels, {len(data)} bytes from {source_bytes} bytes of JSON'
+              f'{f", {raw} raw layout(s)" if raw else ""})')
+        print(f'  parse all JSON {json_seconds * 1000:.2f} ms, open bundle index {index_seconds * 1000:.2f} ms')
+        if args.verify:
+            problems = verify(source, out)
+            for problem in problems:
+                print(f'  - {problem}')
+            print(f'  verify: {"OK" if not problems else "FAILED"}')
+            failed |= bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
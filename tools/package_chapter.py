@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Deterministic, parallel DLC chapter packager.
+
+Builds dlc_server/dlc/chapters/<chapter_id>.zip from the unpacked
+dlc_server/dlc/chapters/<chapter_id>/ directory. Identical input always gives
+a byte-identical archive:
+- entries are sorted by path and carry a fixed timestamp and permissions
+- no directory entries, extra fields or comments are written
+- members are compressed in parallel; already-compressed formats
+  (png, jpg, webp, mp3, ogg, ...) are stored so neither the packager nor
+  DLCManager._extract_package spends time on them
+
+Builds are incremental. A per-chapter build manifest in .cache/package_chapter/
+records each member's hash, size, mtime and compressed form. Chapters whose
+inputs are unchanged are skipped, and unchanged members have their compressed
+bytes copied out of the previous archive instead of being recompressed.
+
+Usage:
+    python3 tools/package_chapter.py gospels
+    python3 tools/package_chapter.py --all
+    python3 tools/package_chapter.py gospels --check   # exit 1 if the zip is stale
+    python3 tools/package_chapter.py --all --force     # ignore the build cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CHAPTERS_DIR = ROOT / 'dlc_server' / 'dlc' / 'chapters'
+MANIFEST_LIST = ROOT / 'dlc_server' / 'dlc' / 'manifest_list.json'
+BUILD_CACHE_DIR = ROOT / '.cache' / 'package_chapter'
+BUILD_FORMAT = 1
+
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.mp3', '.ogg', '.wav', '.zip', '.gz', '.ctex', '.ttf', '.otf'}
+IGNORED_NAMES = {'.DS_Store', 'Thumbs.db'}
+COMPRESS_LEVEL = 9
+
+# 1980-01-01 00:00:00, the earliest DOS timestamp
+DOS_TIME = 0
+DOS_DATE = (1 << 5) | 1
+EXTERNAL_ATTR = (0o100644 << 16)
+VERSION = 20
+VERSION_MADE_BY = (3 << 8) | VERSION  # unix host, so the mode bits above are honoured
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+FLAG_UTF8 = 0x800
+
+
+def collect_members(chapter_dir):
+    """Sorted (arcname, path) pairs for every file that belongs in the package."""
+    members = []
+    for dirpath, dirs, files in os.walk(chapter_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        names = set(files)
+        for name in files:
+            if name in IGNORED_NAMES or name.startswith('.'):
+                continue
+            # Skip the server's prebuilt gzip siblings (dlc_server/precompress.py)
+            if name.endswith('.gz') and name[:-3] in names:
+                continue
+            path = Path(dirpath) / name
+            members.append((path.relative_to(chapter_dir).as_posix(), path))
+    members.sort(key=lambda m: m[0])
+    return members
+
+
+def compress_member(arcname, raw):
+    """Return (arcname, method, crc, raw_size, payload) for one member."""
+    crc = zlib.crc32(raw) & 0xFFFFFFFF
+    if Path(arcname).suffix.lower() not in STORED_EXTENSIONS:
+        co = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        packed = co.compress(raw) + co.flush()
+        if len(packed) < len(raw):
+            return arcname, METHOD_DEFLATED, crc, len(raw), packed
+    return arcname, METHOD_STORED, crc, len(raw), raw
+
+
+def build_archive(entries):
+    """Serialise compressed entries (in order) into zip bytes."""
+    out = bytearray()
+    central = bytearray()
+    for arcname, method, crc, raw_size, payload in entries:
+        name = arcname.encode('utf-8')
+        flags = 0 if name.isascii() else FLAG_UTF8
+        offset = len(out)
+        if offset > 0xFFFFFFFF or len(payload) > 0xFFFFFFFF:
+            raise ValueError(f'{arcname}: archive would need zip64, which the packager does not write')
+        out += struct.pack('<IHHHHHIIIHH', 0x04034B50, VERSION, flags, method, DOS_TIME, DOS_DATE,
+                           crc, len(payload), raw_size, len(name), 0)
+        out += name
+        out += payload
+        central += struct.pack('<IHHHHHHIIIHHHHHII', 0x02014B50, VERSION_MADE_BY, VERSION, flags, method,
+                               DOS_TIME, DOS_DATE, crc, len(payload), raw_size, len(name), 0, 0, 0, 0,
+                               EXTERNAL_ATTR, offset)
+        central += name
+    cd_offset = len(out)
+    out += central
+    out += struct.pack('<IHHHHIIH', 0x06054B50, 0, 0, len(entries), len(entries), len(central), cd_offset, 0)
+    return bytes(out)
+
+
+def package_chapter(chapter_dir, workers=None):
+    """Build the archive bytes for `chapter_dir`."""
+    members = collect_members(chapter_dir)
+    if not any(arc == 'manifest.json' for arc, _ in members):
+        raise FileNotFoundError(f'{chapter_dir} has no manifest.json')
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        # zlib releases the GIL while compressing, so threads use every core
+        entries = list(pool.map(lambda m: compress_member(m[0], m[1].read_bytes()), members))
+    return build_archive(entries)
+
+
+def load_build_manifest(chapter_id):
+    """Previous build record for a chapter, or None if missing or built with different settings."""
+    try:
+        build = json.loads((BUILD_CACHE_DIR / f'{chapter_id}.json').read_text())
+    except (OSError, ValueError):
+        return None
+    if (build.get('format') != BUILD_FORMAT or build.get('zlib') != zlib.ZLIB_RUNTIME_VERSION
+            or build.get('level') != COMPRESS_LEVEL):
+        return None
+    return build
+
+
+def save_build_manifest(chapter_id, build):
+    BUILD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = BUILD_CACHE_DIR / f'{chapter_id}.json'
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(build, indent=2, sort_keys=True) + '\n')
+    os.replace(tmp, path)
+
+
+def fingerprint_members(members, previous):
+    """Hash members, trusting the recorded hash when size and mtime are unchanged.
+
+    Returns ({arcname: {sha256, size, mtime_ns}}, {arcname: raw bytes read while hashing}).
+    """
+    prints, raw = {}, {}
+    for arcname, path in members:
+        st = path.stat()
+        rec = previous.get(arcname)
+        if rec and rec['size'] == st.st_size and rec['mtime_ns'] == st.st_mtime_ns:
+            prints[arcname] = {'sha256': rec['sha256'], 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            continue
+        data = path.read_bytes()
+        raw[arcname] = data
+        prints[arcname] = {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data), 'mtime_ns': st.st_mtime_ns}
+    return prints, raw
+
+
+def archive_matches(zip_path, build):
+    """True if `zip_path` is the archive described by `build`."""
+    try:
+        st = zip_path.stat()
+    except OSError:
+        return False
+    if st.st_size != build.get('zip_size'):
+        return False
+    if st.st_mtime_ns == build.get('zip_mtime_ns'):
+        return True
+    return hashlib.sha256(zip_path.read_bytes()).hexdigest() == build.get('zip_sha256')
+
+
+def read_payloads(zip_path, build, wanted):
+    """Raw compressed bytes of `wanted` members, copied out of the previous archive."""
+    payloads = {}
+    with open(zip_path, 'rb') as fh:
+        with zipfile.ZipFile(fh) as zf:
+            infos = {i.filename: i for i in zf.infolist()}
+        for arcname in wanted:
+            info, rec = infos.get(arcname), build['members'][arcname]
+            if info is None or info.CRC != rec['crc'] or info.compress_type != rec['method']:
+                continue
+            fh.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', fh.read(4))
+            fh.seek(info.header_offset + 30 + name_len + extra_len)
+            payloads[arcname] = fh.read(info.compress_size)
+    return payloads
+
+
+def package_chapter_incremental(chapter_id, workers=None, force=False):
+    """Build or refresh <chapter_id>.zip. Returns a summary dict."""
+    chapter_dir = CHAPTERS_DIR / chapter_id
+    zip_path = CHAPTERS_DIR / f'{chapter_id}.zip'
+    members = collect_members(chapter_dir)
+    if not any(arc == 'manifest.json' for arc, _ in members):
+        raise FileNotFoundError(f'{chapter_dir} has no manifest.json')
+
+    build = None if force else load_build_manifest(chapter_id)
+    previous = build['members'] if build else {}
+    prints, raw = fingerprint_members(members, previous)
+    zip_ok = build is not None and archive_matches(zip_path, build)
+    unchanged = [a for a, fp in prints.items() if a in previous and previous[a]['sha256'] == fp['sha256']]
+
+    if zip_ok and len(unchanged) == len(prints) == len(previous):
+        if raw:
+            # Touched but identical files: record the new mtimes so they are not rehashed next time
+            for arcname in raw:
+                previous[arcname].update(prints[arcname])
+            save_build_manifest(chapter_id, build)
+        return {'status': 'unchanged', 'size': build['zip_size'], 'reused': len(unchanged), 'compressed': 0}
+
+    payloads = read_payloads(zip_path, build, unchanged) if zip_ok and unchanged else {}
+    todo = [(arc, path) for arc, path in members if arc not in payloads]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        fresh = {e[0]: e for e in pool.map(
+            lambda m: compress_member(m[0], raw[m[0]] if m[0] in raw else m[1].read_bytes()), todo)}
+
+    entries = []
+    for arcname, _ in members:
+        if arcname in payloads:
+            rec = previous[arcname]
+            entries.append((arcname, rec['method'], rec['crc'], rec['size'], payloads[arcname]))
+        else:
+            entries.append(fresh[arcname])
+    data = build_archive(entries)
+    changed = write_if_changed(zip_path, data)
+
+    st = zip_path.stat()
+    save_build_manifest(chapter_id, {
+        'format': BUILD_FORMAT,
+        'zlib': zlib.ZLIB_RUNTIME_VERSION,
+        'level': COMPRESS_LEVEL,
+        'zip_sha256': hashlib.sha256(data).hexdigest(),
+        'zip_size': len(data),
+        'zip_mtime_ns': st.st_mtime_ns,
+        'members': {
+            arcname: dict(prints[arcname], method=method, crc=crc, compressed_size=len(payload))
+            for arcname, method, crc, _size, payload in entries
+        },
+    })
+    return {'status': 'wrote' if changed else 'unchanged', 'size': len(data),
+            'reused': len(payloads), 'compressed': len(todo)}
+
+
+def write_if_changed(path, data):
+    """Atomically replace `path` with `data` unless it already holds exactly those bytes."""
+    if path.exists() and path.read_bytes() == data:
+        return False
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def listed_size(chapter_id):
+    if not MANIFEST_LIST.exists():
+        return None
+    for chapter in json.loads(MANIFEST_LIST.read_text()).get('chapters', []):
+        if chapter.get('chapter_id') == chapter_id:
+            return chapter.get('size_bytes')
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build reproducible DLC chapter zips')
+    parser.add_argument('chapters', nargs='*', help='Chapter ids (directories under dlc_server/dlc/chapters)')
+    parser.add_argument('--all', action='store_true', help='Package every chapter directory')
+    parser.add_argument('--check', action='store_true', help='Do not write; exit 1 if any zip differs from a fresh build')
+    parser.add_argument('--force', action='store_true', help='Ignore the build cache and recompress every member')
+    parser.add_argument('--workers', type=int, default=None, help='Compression threads (default: CPU count)')
+    args = parser.parse_args()
+
+    chapter_ids = list(args.chapters)
+    if args.all:
+        chapter_ids = sorted(p.name for p in CHAPTERS_DIR.iterdir() if p.is_dir() and not p.name.startswith('.'))
+    if not chapter_ids:
+        parser.error('name at least one chapter or pass --all')
+
+    stale = []
+    for chapter_id in chapter_ids:
+        chapter_dir = CHAPTERS_DIR / chapter_id
+        if not chapter_dir.is_dir():
+            print(f'Chapter directory not found: {chapter_dir}')
+            sys.exit(2)
+        zip_path = CHAPTERS_DIR / f'{chapter_id}.zip'
+        if args.check:
+            data = package_chapter(chapter_dir, args.workers)
+            up_to_date = zip_path.exists() and zip_path.read_bytes() == data
+            print(f'{chapter_id}: {"up to date" if up_to_date else "STALE"} ({zip_path.name})')
+            if not up_to_date:
+                stale.append(chapter_id)
+            continue
+        result = package_chapter_incremental(chapter_id, args.workers, args.force)
+        print(f'{chapter_id}: {result["status"]} {zip_path.relative_to(ROOT)} ({result["size"]} bytes, '
+              f'{result["compressed"]} compressed, {result["reused"]} reused)')
+        size = listed_size(chapter_id)
+        if size is not None and size != result['size']:
+            print(f'  Note: manifest_list.json lists size_bytes={size} for {chapter_id}')
+
+    if stale:
+        print(f'\n{len(stale)} chapter zip(s) do not match their directories: {", ".join(stale)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,18 @@
 #!/usr/bin/env python3
-import json
-from pathlib import Path
-from collections import defaultdict
+from content_index import load_index
 
-ROOT = Path(__file__).resolve().parents[1]
-DEFS_DIR = ROOT / 'data' / 'flow_step_definitions'
-FLOWS_DIR = ROOT / 'data' / 'experience_flows'
+index = load_index()
 
 # Gather definitions
-defs = {p.stem: json.loads(p.read_text()) for p in DEFS_DIR.glob('*.json')}
+defs = index.definitions
 
 # Map usages
-usage = defaultdict(list)
-for f in FLOWS_DIR.glob('*.json'):
-    data = json.loads(f.read_text())
-    for idx, node in enumerate(data.get('flow', [])):
-        def_id = node.get('definition_id')
-        if def_id:
-            usage[def_id].append((f.name, idx, node))
+usage = index.definition_usages
 
 # Print report
 print('Flow Step Definitions Usage Report')
 print('Definitions found: ', len(defs))
-print('Flows scanned: ', len(list(FLOWS_DIR.glob('*.json'))))
+print('Flows scanned: ', len(index.flows))
 print('')
 
 # List used definitions
@@ -0,0 +1,55 @@
+"""
+Checks validate_all.flow_reference_errors on small in-memory flows: a definition_id
+with no file is reported, and recorded as a dependency, at the top level and inside
+conditional branches.
+Run: python3 tools/test_validate_all.py
+"""
+import sys
+
+import validate_all
+
+KNOWN = 'reward_coins'
+
+
+def level(def_id=None):
+    node = {'type': 'level', 'id': 'level_1'}
+    if def_id:
+        node['definition_id'] = def_id
+    return node
+
+
+def conditional(**branches):
+    return dict({'type': 'conditional', 'id': 'check', 'condition': 'has_flag'}, **branches)
+
+
+TESTS = [
+    # (name, flow nodes, expected error paths, expected dependencies)
+    ('known top-level definition', [level(KNOWN)], [], [KNOWN]),
+    ('missing top-level definition', [level('missing_top')], ['flow/0/definition_id'], ['missing_top']),
+    ('missing definition in then branch', [conditional(then=[level(KNOWN), level('missing_then')])],
+     ['flow/0/then/1/definition_id'], [KNOWN, 'missing_then']),
+    ('missing definition in else object', [level(), conditional(then=[level()], **{'else': level('missing_else')})],
+     ['flow/1/else/definition_id'], ['missing_else']),
+    ('missing definition in nested branch',
+     [conditional(then=[conditional(true_branch=[level('missing_nested')], then=[])])],
+     ['flow/0/then/0/true_branch/0/definition_id'], ['missing_nested']),
+]
+
+
+def run_tests():
+    validate_all._definition_ids.clear()
+    validate_all._definition_ids.add(KNOWN)
+    validate_all._effect_checks = validate_all.load_validators()
+    passed = 0
+    for i, (name, nodes, expected_paths, expected_deps) in enumerate(TESTS, 1):
+        errors, deps = validate_all.flow_reference_errors({'flow': nodes})
+        paths = [e['path'] for e in errors]
+        ok = paths == expected_paths and deps == sorted(expected_deps)
+        print(f"Test {i}: {name} -> errors={paths}, deps={deps} [{'PASS' if ok else 'FAIL'}]")
+        passed += ok
+    print(f"\n{passed}/{len(TESTS)} tests passed.")
+    return passed == len(TESTS)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_tests() else 1)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Validate every content file against its JSON schema in docs/schemas/.
+
+SCHEMA_MAP maps each content file to a schema by path. Files are validated
+across a process pool. Each worker loads the schemas and builds one
+Draft7Validator per schema when it starts, so the cost of compiling a schema
+is paid once per worker rather than once per file.
+
+Before a validator is built, compile_schema rewrites each oneOf whose branches
+all pin a distinct `type` const (experience_flow's node union) into an
+if/then/else chain keyed on that const. The two forms accept exactly the same
+documents, because at most one branch can match a given type. The chain checks
+one branch per node instead of all of them, and an unknown type is reported as
+a bad enum value instead of a list of every failed branch.
+
+Results can be written as JSON (--json PATH, or - for stdout):
+
+    {"summary": {...}, "schemas": {name: sha256}, "unmapped": [...],
+     "results": [{"file", "schema", "item", "valid", "errors": [{"path", "message"}]}]}
+
+`item` is null for whole-file schemas and the array index for files validated
+per entry (manifest_list.json chapters). Exit status is 1 if any file fails.
+
+Flows also get the reference checks validate_flow does: every definition_id
+must name a file in data/flow_step_definitions/ (archived/ is not loaded by the
+game). Effects in flows and narrative stages are checked by the validators
+effect_validators.py compiles from the effects registry (types, ranges, enums,
+required params and nested timelines).
+
+Results are cached in .cache/validate_all.json. A file's result is keyed on its
+own hash, its schema's hash and, for flows and stages, the effects registry
+hash. A flow's key also includes the hash of every definition it references, so
+editing a definition re-validates exactly the flows that use it. Unchanged files (same size and
+mtime) are not even read. --watch polls for saves and re-validates what
+changed; small change sets run in-process, so a save is reported in well under
+a second.
+
+Usage:
+    python3 tools/validate_all.py
+    python3 tools/validate_all.py --json build/validation.json --workers 8
+    python3 tools/validate_all.py --schema level --schema experience_flow
+    python3 tools/validate_all.py --watch           # re-validate on save (Ctrl-C to stop)
+    python3 tools/validate_all.py --no-cache        # check everything from scratch
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from jsonschema import Draft7Validator
+
+from content_index import DEFS_DIR, REGISTRY, ROOT
+from effect_validators import flow_effect_errors, flow_nodes, load_validators, stage_effect_errors
+
+SCHEMAS_DIR = ROOT / 'docs' / 'schemas'
+CACHE_PATH = ROOT / '.cache' / 'validate_all.json'
+CACHE_FORMAT = 1
+
+# (glob relative to the repo root, schema name, key of the array whose items are validated or None)
+SCHEMA_MAP = (
+    ('data/experience_flows/*.json', 'experience_flow', None),
+    ('data/flow_step_definitions/*.json', 'flow_step_definition', None),
+    ('data/flow_step_definitions/archived/*.json', 'flow_step_definition', None),
+    ('data/narrative_stages/*.json', 'narrative_stage', None),
+    ('data/narrative_stages/levels/*.json', 'narrative_stage', None),
+    ('data/levels/level_*.json', 'level', None),
+    ('data/collections/*.json', 'collection', None),
+    ('dlc_server/dlc/chapters/*/manifest.json', 'dlc_manifest', None),
+    ('dlc_server/dlc/chapters/*/levels/level_*.json', 'level', None),
+    ('dlc_server/dlc/manifest_list.json', 'chapter', 'chapters'),
+)
+# JSON under these trees with no SCHEMA_MAP entry is listed as unmapped
+CONTENT_ROOTS = ('data', 'dlc_server/dlc')
+MAX_MESSAGE = 300
+# Schemas whose documents carry effects, so their results also depend on the registry
+EFFECT_SCHEMAS = ('experience_flow', 'narrative_stage')
+# Change sets this small are validated in-process; starting a pool costs more than it saves
+INLINE_LIMIT = 16
+
+_validators = {}
+_effect_checks = None
+_definition_ids = set()
+_worker_context = None
+
+
+def schema_files():
+    return {p.stem: p for p in sorted(SCHEMAS_DIR.glob('*.json'))}
+
+
+def schema_hashes():
+    return {name: hashlib.sha256(path.read_bytes()).hexdigest() for name, path in schema_files().items()}
+
+
+def _resolve(schema, node):
+    """Follow a local '#/...' $ref; anything else is returned as is."""
+    ref = node.get('$ref') if isinstance(node, dict) else None
+    if not (isinstance(ref, str) and ref.startswith('#/')):
+        return node
+    target = schema
+    for part in ref[2:].split('/'):
+        target = target.get(part) if isinstance(target, dict) else None
+    return target
+
+
+def _discriminator(schema, branches, key='type'):
+    """The const each branch requires for `key`, or None unless every branch pins a distinct one."""
+    consts = []
+    for branch in branches:
+        resolved = _resolve(schema, branch)
+        if not isinstance(resolved, dict) or key not in resolved.get('required', []):
+            return None
+        prop = resolved.get('properties', {}).get(key)
+        if not isinstance(prop, dict) or 'const' not in prop:
+            return None
+        consts.append(prop['const'])
+    return consts if len(set(map(json.dumps, consts))) == len(consts) else None
+
+
+def compile_schema(schema, key='type'):
+    """Copy of `schema` with discriminated oneOf unions rewritten as if/then/else chains on `key`."""
+    def rewrite(node):
+        if isinstance(node, list):
+            return [rewrite(n) for n in node]
+        if not isinstance(node, dict):
+            return node
+        out = {k: rewrite(v) for k, v in node.items()}
+        consts = _discriminator(schema, node['oneOf'], key) if isinstance(node.get('oneOf'), list) else None
+        if consts:
+            chain = {'required': [key], 'properties': {key: {'enum': consts}}}
+            for const, branch in reversed(list(zip(consts, out.pop('oneOf')))):
+                chain = {'if': {'required': [key], 'properties': {key: {'const': const}}}, 'then': branch, 'else': chain}
+            # Keep any if/then/else the node already had by nesting the chain under allOf
+            out.setdefault('allOf', []).append(chain)
+        return out
+    return rewrite(schema)
+
+
+def _init_worker(names, definition_ids):
+    global _effect_checks
+    for name in names:
+        schema = json.loads(schema_files()[name].read_text())
+        _validators[name] = Draft7Validator(compile_schema(schema))
+    _definition_ids.clear()
+    _definition_ids.update(definition_ids)
+    _effect_checks = load_validators()
+
+
+def _walk_json(relative_root):
+    """Relative paths of every .json file under a directory, skipping hidden dirs and the chunk store."""
+    out = []
+    for dirpath, dirs, files in os.walk(ROOT / relative_root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != 'chunks')
+        out += [os.path.relpath(os.path.join(dirpath, f), ROOT).replace(os.sep, '/')
+                for f in sorted(files) if f.endswith('.json')]
+    return out
+
+
+def map_files(schema_filter=None):
+    """([(relative path, schema, item key)], [unmapped relative paths]) for every content file."""
+    candidates = [p for root in CONTENT_ROOTS for p in _walk_json(root)]
+    mapped, unmapped = [], []
+    for rel in candidates:
+        for pattern, schema, items in SCHEMA_MAP:
+            # fnmatch's * also crosses '/', so compare directory depth too
+            if rel.count('/') == pattern.count('/') and fnmatch.fnmatchcase(rel, pattern):
+                if schema_filter is None or schema in schema_filter:
+                    mapped.append((rel, schema, items))
+                break
+        else:
+            unmapped.append(rel)
+    return mapped, unmapped
+
+
+def _error_dict(error):
+    message = error.message if len(error.message) <= MAX_MESSAGE else error.message[:MAX_MESSAGE] + '...'
+    return {'path': '/'.join(str(p) for p in error.absolute_path), 'message': message}
+
+
+def flow_reference_errors(flow):
+    """(errors, referenced definition ids) for a flow, as validate_flow checks them.
+
+    Nodes inside conditional branches are included, as compile_flows resolves them.
+    """
+    errors, deps = [], set()
+    for path, node in flow_nodes(flow):
+        def_id = node.get('definition_id')
+        if isinstance(def_id, str) and def_id:
+            deps.add(def_id)
+            if def_id not in _definition_ids:
+                errors.append({'path': f'{path}/definition_id',
+                               'message': f'{def_id!r} has no file in data/flow_step_definitions/'})
+    errors += flow_effect_errors(flow, _effect_checks)
+    return errors, sorted(deps)
+
+
+def validate_file(task):
+    """Worker: validate one file. Returns (result dicts, one per validated document; definition ids it references)."""
+    rel, schema, items = task
+    try:
+        doc = json.loads((ROOT / rel).read_bytes().decode('utf-8'))
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        return [{'file': rel, 'schema': schema, 'item': None, 'valid': False,
+                 'errors': [{'path': '', 'message': f'cannot parse: {e}'}]}], []
+    validator = _validators[schema]
+    if items is None:
+        documents = [(None, doc)]
+    elif isinstance(doc, dict) and isinstance(doc.get(items), list):
+        documents = list(enumerate(doc[items]))
+    else:
+        return [{'file': rel, 'schema': schema, 'item': None, 'valid': False,
+                 'errors': [{'path': items, 'message': f'expected an array at {items!r}'}]}], []
+    results, deps = [], []
+    for item, document in documents:
+        errors = sorted(validator.iter_errors(document),
+                        key=lambda e: [(0, p, '') if isinstance(p, int) else (1, 0, str(p)) for p in e.absolute_path])
+        errors = [_error_dict(e) for e in errors]
+        if schema == 'experience_flow':
+            ref_errors, deps = flow_reference_errors(document)
+            errors += ref_errors
+        elif schema == 'narrative_stage':
+            errors += stage_effect_errors(document, _effect_checks)
+        results.append({'file': rel, 'schema': schema, 'item': item, 'valid': not errors, 'errors': errors})
+    return results, deps
+
+
+def run_tasks(tasks, workers=None, definition_ids=()):
+    """validate_file over (path, schema, items) tasks, in task order.
+
+    Small batches (or --workers 1) run in this process, reusing its validators
+    between calls; larger ones go to a process pool.
+    """
+    global _worker_context
+    if not tasks:
+        return []
+    workers = workers or os.cpu_count() or 1
+    names = sorted({schema for _, schema, _ in tasks})
+    definition_ids = sorted(definition_ids)
+    if workers == 1 or len(tasks) <= INLINE_LIMIT:
+        # Schemas and the registry are re-read whenever their hashes (part of the context) change
+        context = (tuple(names), tuple(definition_ids), tuple(sorted(schema_hashes().items())), _file_sha(REGISTRY))
+        if context != _worker_context:
+            _init_worker(names, definition_ids)
+            _worker_context = context
+        return [validate_file(task) for task in tasks]
+    # A few chunks per worker keeps them all busy without paying IPC per file
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(names, definition_ids)) as pool:
+        return list(pool.map(validate_file, tasks, chunksize=chunksize))
+
+
+def validate_all(tasks, workers=None):
+    """Validate every task from scratch; returns the flat list of result dicts in task order."""
+    return [r for results, _ in run_tasks(tasks, workers, definition_ids()) for r in results]
+
+
+def _file_sha(path):
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _tool_sha():
+    # This script's checks plus the effect validator generator it imports
+    return _file_sha(__file__) + _file_sha(Path(__file__).with_name('effect_validators.py'))
+
+
+def definition_ids():
+    return {e.name[:-5] for e in os.scandir(DEFS_DIR) if e.is_file() and e.name.endswith('.json')}
+
+
+def _load_cache():
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    # Results depend on this script's checks too, so a new version starts over
+    if cache.get('format') != CACHE_FORMAT or cache.get('tool') != _tool_sha():
+        return None
+    return cache
+
+
+def _save_cache(cache):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_name(CACHE_PATH.name + '.tmp')
+    tmp.write_text(json.dumps(cache, separators=(',', ':')))
+    os.replace(tmp, CACHE_PATH)
+
+
+class IncrementalValidator:
+    """Validation results cached per (file hash, schema hash, registry hash, referenced definition hashes).
+
+    `stamps` remembers [size, mtime_ns, sha256] per file so that unchanged files
+    are hashed from the stamp instead of being read.
+    """
+
+    def __init__(self, workers=None, use_cache=True):
+        self.workers = workers
+        self.use_cache = use_cache
+        cache = _load_cache() if use_cache else None
+        self.stamps = cache['stamps'] if cache else {}
+        self.entries = cache['entries'] if cache else {}
+        self.dirty = False
+        self.seen = set()
+
+    def file_hash(self, rel):
+        """sha256 of a repo-relative file, or None if it does not exist."""
+        self.seen.add(rel)
+        try:
+            st = os.stat(ROOT / rel)
+        except OSError:
+            self.dirty |= self.stamps.pop(rel, None) is not None
+            return None
+        stamp = self.stamps.get(rel)
+        if stamp and stamp[0] == st.st_size and stamp[1] == st.st_mtime_ns:
+            return stamp[2]
+        digest = _file_sha(ROOT / rel)
+        self.stamps[rel] = [st.st_size, st.st_mtime_ns, digest]
+        self.dirty = True
+        return digest
+
+    def run(self, tasks, prune=True):
+        """Validate tasks, reusing cached results. Returns (results in task order, re-validated paths)."""
+        self.seen = set()
+        schemas = {name: self.file_hash(os.path.relpath(path, ROOT).replace(os.sep, '/'))
+                   for name, path in schema_files().items()}
+        registry = self.file_hash(os.path.relpath(REGISTRY, ROOT).replace(os.sep, '/'))
+        defs_rel = os.path.relpath(DEFS_DIR, ROOT).replace(os.sep, '/')
+        definitions = {def_id: self.file_hash(f'{defs_rel}/{def_id}.json') for def_id in sorted(definition_ids())}
+
+        def key(rel, schema, sha, deps):
+            parts = [sha, schemas.get(schema)]
+            if schema in EFFECT_SCHEMAS:
+                parts.append(registry)
+            if schema == 'experience_flow':
+                parts.append({d: definitions.get(d) for d in deps})
+            return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+        todo, shas = [], {}
+        for rel, schema, items in tasks:
+            shas[rel] = sha = self.file_hash(rel)
+            entry = self.entries.get(rel)
+            # A flow's dependencies come from its own content, so they are only reused while its hash holds
+            if entry and entry['sha'] == sha and entry['key'] == key(rel, schema, sha, entry['deps']):
+                continue
+            todo.append((rel, schema, items))
+        for (rel, schema, _), (results, deps) in zip(todo, run_tasks(todo, self.workers, definitions)):
+            self.entries[rel] = {'sha': shas[rel], 'deps': deps, 'key': key(rel, schema, shas[rel], deps),
+                                 'results': results}
+            self.dirty = True
+        if prune:
+            live = {rel for rel, _, _ in tasks}
+            for rel in set(self.entries) - live:
+                del self.entries[rel]
+                self.dirty = True
+            for rel in set(self.stamps) - self.seen:
+                del self.stamps[rel]
+                self.dirty = True
+        if self.use_cache and self.dirty:
+            _save_cache({'format': CACHE_FORMAT, 'tool': _tool_sha(), 'stamps': self.stamps,
+                         'entries': self.entries})
+            self.dirty = False
+        results = [r for rel, _, _ in tasks for r in self.entries[rel]['results']]
+        return results, [rel for rel, _, _ in todo]
+
+
+def print_failures(results, out, limit=5):
+    for r in results:
+        if r['valid']:
+            continue
+        where = r['file'] if r['item'] is None else f"{r['file']}[{r['item']}]"
+        print(f"{where} ({r['schema']}): {len(r['errors'])} error(s)", file=out)
+        for e in r['errors'][:limit]:
+            print(f"  - {e['path'] or '<root>'}: {e['message'][:200]}", file=out)
+        if len(r['errors']) > limit:
+            print(f"  ... {len(r['errors']) - limit} more", file=out)
+
+
+def watch(validator, schema_filter, interval):
+    """Poll for changes and re-validate them until interrupted."""
+    print(f'Watching {", ".join(CONTENT_ROOTS)} every {interval:.2f}s (Ctrl-C to stop)')
+    try:
+        while True:
+            started = time.perf_counter()
+            tasks, _ = map_files(schema_filter)
+            results, revalidated = validator.run(tasks, prune=schema_filter is None)
+            if revalidated:
+                changed = set(revalidated)
+                print(f"\n[{time.strftime('%H:%M:%S')}] re-validated {len(changed)} file(s) in "
+                      f"{(time.perf_counter() - started) * 1000:.0f} ms")
+                for rel in revalidated:
+                    mine = [r for r in results if r['file'] == rel]
+                    if all(r['valid'] for r in mine):
+                        print(f'{rel}: OK')
+                print_failures([r for r in results if r['file'] in changed], sys.stdout)
+                print(f"  {sum(not r['valid'] for r in results)} of {len(results)} document(s) invalid overall")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate all content files against docs/schemas')
+    parser.add_argument('--json', metavar='PATH', help="Write machine-readable results to PATH ('-' for stdout)")
+    parser.add_argument('--schema', action='append', help='Only validate files mapped to this schema (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--quiet', action='store_true', help='Only print the summary')
+    parser.add_argument('--no-cache', action='store_true', help='Re-validate everything and do not touch the cache')
+    parser.add_argument('--watch', action='store_true', help='Keep running and re-validate files as they change')
+    parser.add_argument('--interval', type=float, default=0.25, help='Polling interval for --watch in seconds (default: 0.25)')
+    args = parser.parse_args()
+
+    known = schema_files()
+    for name in args.schema or []:
+        if name not in known:
+            parser.error(f'unknown schema {name!r} (have: {", ".join(known)})')
+    schema_filter = set(args.schema) if args.schema else None
+    validator = IncrementalValidator(args.workers, use_cache=not args.no_cache)
+    if args.watch:
+        watch(validator, schema_filter, args.interval)
+        return
+    started = time.perf_counter()
+    tasks, unmapped = map_files(schema_filter)
+    results, revalidated = validator.run(tasks, prune=schema_filter is None)
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in results if not r['valid']]
+    used = {schema for _, schema, _ in tasks}
+    summary = {'files': len(tasks), 'documents': len(results), 'invalid': len(failed),
+               'revalidated': len(revalidated), 'seconds': round(elapsed, 3), 'unused_schemas': sorted(set(known) - used) if not args.schema else []}
+    out = sys.stderr if args.json == '-' else sys.stdout
+
+    if not args.quiet:
+        print_failures(failed, out)
+    by_schema = {}
+    for r in results:
+        counts = by_schema.setdefault(r['schema'], [0, 0])
+        counts[0] += 1
+        counts[1] += not r['valid']
+    print(f"\nValidated {summary['documents']} document(s) from {summary['files']} file(s) "
+          f"in {elapsed:.2f}s: {summary['invalid']} invalid "
+          f"({len(revalidated)} file(s) re-validated, {len(tasks) - len(revalidated)} cached)", file=out)
+    for schema, (total, bad) in sorted(by_schema.items()):
+        print(f'  {schema:<22} {total:>5} checked, {bad:>4} invalid', file=out)
+    if summary['unused_schemas']:
+        print(f"  schemas with no mapped files: {', '.join(summary['unused_schemas'])}", file=out)
+    if unmapped and not args.quiet:
+        print(f'  {len(unmapped)} JSON file(s) have no schema mapping (see --json output)', file=out)
+
+    if args.json:
+        report = json.dumps({'summary': summary, 'schemas': schema_hashes(), 'unmapped': unmapped,
+                             'results': results}, indent=2) + '\n'
+        if args.json == '-':
+            sys.stdout.write(report)
+        else:
+            Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.json).write_text(report)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Validate DLC chapter zips in place, without extracting them.
+
+Each archive is streamed member by member and the members are checked in
+parallel worker processes:
+- manifest.json: required fields, chapter id, level list
+- levels/level_NN.json: grid size, layout (parsed with the same grammar as
+  LevelManager.parse_string_layout, see layout_grammar.py), moves and score
+- particles/*.json: the fields AssetRegistry._load_json_particle reads
+- any other .json member must at least parse
+Then the manifest is checked against the archive. Every level file, asset and
+background image it references must be present, and each level file's
+level_number must match its manifest entry. Corrupt members (bad CRC) are
+reported as errors.
+
+Usage:
+    python3 tools/validate_chapter.py dlc_server/dlc/chapters/gospels.zip
+    python3 tools/validate_chapter.py --all --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from layout_grammar import layout_problems
+
+ROOT = Path(__file__).resolve().parents[1]
+CHAPTERS_DIR = ROOT / 'dlc_server' / 'dlc' / 'chapters'
+LEVEL_MEMBER_RE = re.compile(r'^levels/level_(\d+)\.json$')
+MANIFEST_REQUIRED = ('chapter_id', 'version', 'name', 'levels')
+LEVEL_POSITIVE_INTS = ('target_score', 'max_moves')
+PARTICLE_NUMBERS = ('initial_velocity_min', 'initial_velocity_max', 'lifetime', 'emission_sphere_radius')
+
+
+def member_kind(name):
+    if name == 'manifest.json':
+        return 'manifest'
+    if LEVEL_MEMBER_RE.match(name):
+        return 'level'
+    if name.startswith('particles/') and name.endswith('.json'):
+        return 'particle'
+    if name.endswith('.json'):
+        return 'json'
+    return None
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_level(doc):
+    errors = []
+    width = doc.get('grid_width', doc.get('width'))
+    height = doc.get('grid_height', doc.get('height'))
+    if width is None or height is None:
+        errors.append('missing grid_width/grid_height')
+    elif 'layout' not in doc:
+        errors.append('missing layout')
+    else:
+        errors += layout_problems(doc['layout'], width, height, doc.get('num_tile_types'))
+    for key in LEVEL_POSITIVE_INTS:
+        value = doc.get(key)
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            errors.append(f'{key} must be a positive integer, got {value!r}')
+    if not isinstance(doc.get('level_number'), int):
+        errors.append('missing integer level_number')
+    return errors
+
+
+def check_particle(doc):
+    errors = []
+    gravity = doc.get('gravity')
+    if gravity is not None:
+        if not isinstance(gravity, dict):
+            errors.append('gravity must be an object with x/y/z')
+        else:
+            errors += [f'gravity.{axis} must be a number' for axis, v in gravity.items() if not _is_number(v)]
+    for key in PARTICLE_NUMBERS:
+        if key in doc and not _is_number(doc[key]):
+            errors.append(f'{key} must be a number, got {doc[key]!r}')
+    lo, hi = doc.get('initial_velocity_min'), doc.get('initial_velocity_max')
+    if _is_number(lo) and _is_number(hi) and lo > hi:
+        errors.append(f'initial_velocity_min ({lo}) exceeds initial_velocity_max ({hi})')
+    if _is_number(doc.get('lifetime')) and doc['lifetime'] <= 0:
+        errors.append('lifetime must be positive')
+    return errors
+
+
+def validate_member(task):
+    """Worker: parse and check one member. Returns (name, errors, summary)."""
+    name, kind, data = task
+    try:
+        doc = json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        return name, [f'invalid JSON: {e}'], None
+    if kind != 'json' and not isinstance(doc, dict):
+        return name, ['top level must be an object'], None
+    if kind == 'level':
+        return name, check_level(doc), {'level_number': doc.get('level_number')}
+    if kind == 'particle':
+        return name, check_particle(doc), None
+    if kind == 'manifest':
+        return name, [], doc
+    return name, [], None
+
+
+def asset_paths(assets):
+    """Relative paths referenced by a manifest `assets` block (id->path maps or [{id, file}] lists)."""
+    paths = []
+    for category, entries in (assets or {}).items():
+        if isinstance(entries, dict):
+            paths += [(f'assets.{category}.{k}', v) for k, v in entries.items() if isinstance(v, str)]
+        elif isinstance(entries, list):
+            paths += [(f'assets.{category}.{e.get("id", i)}', e.get('file')) for i, e in enumerate(entries)
+                      if isinstance(e, dict) and isinstance(e.get('file'), str)]
+    return paths
+
+
+def check_manifest(chapter_id, manifest, names, level_numbers):
+    """Cross-check the manifest against the archive. Returns (errors, warnings)."""
+    errors, warnings = [], []
+    for key in MANIFEST_REQUIRED:
+        if key not in manifest:
+            errors.append(f'missing required field {key!r}')
+    if manifest.get('chapter_id') not in (None, chapter_id):
+        errors.append(f"chapter_id {manifest['chapter_id']!r} does not match archive name {chapter_id!r}")
+
+    listed = set()
+    levels = manifest.get('levels', [])
+    if not isinstance(levels, list):
+        errors.append('levels must be an array')
+        levels = []
+    for i, level in enumerate(levels):
+        if not isinstance(level, dict):
+            errors.append(f'levels[{i}] must be an object')
+            continue
+        number, path = level.get('number'), level.get('file')
+        if not isinstance(number, int):
+            errors.append(f'levels[{i}] has no integer number')
+            continue
+        if number in listed:
+            errors.append(f'level {number} listed more than once')
+        listed.add(number)
+        if not isinstance(path, str) or not path:
+            errors.append(f'level {number} has no file')
+        elif path not in names:
+            errors.append(f'level {number}: {path} is not in the archive')
+        elif level_numbers.get(path) not in (None, number):
+            errors.append(f'level {number}: {path} declares level_number {level_numbers[path]}')
+
+    references = asset_paths(manifest.get('assets'))
+    entry = manifest.get('world_map_entry')
+    background = entry.get('background_image') if isinstance(entry, dict) else None
+    if isinstance(background, str) and background:
+        references.append(('world_map_entry.background_image', background))
+    for where, path in references:
+        if path.startswith('res://'):
+            continue
+        if path not in names:
+            errors.append(f'{where}: {path} is not in the archive')
+
+    listed_files = {level.get('file') for level in levels
+                    if isinstance(level, dict) and isinstance(level.get('file'), str)}
+    for name in sorted(names):
+        if LEVEL_MEMBER_RE.match(name) and name not in listed_files:
+            warnings.append(f'{name} is not listed in manifest levels')
+    return errors, warnings
+
+
+def stream_members(zip_path):
+    """Yield (name, kind, bytes) for each checkable member, or (name, None, error message)."""
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            kind = member_kind(info.filename)
+            if kind is None:
+                yield info.filename, 'other', None
+                continue
+            try:
+                yield info.filename, kind, zf.read(info)
+            except (zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+                yield info.filename, None, f'cannot read member: {e}'
+
+
+def validate_archives(zip_paths, workers=None):
+    """Validate every archive; returns {zip_path: {'members', 'errors', 'warnings'}}."""
+    reports = {}
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for zip_path in zip_paths:
+            report = reports[zip_path] = {'members': 0, 'errors': [], 'warnings': [], 'names': set()}
+            try:
+                for name, kind, payload in stream_members(zip_path):
+                    report['members'] += 1
+                    report['names'].add(name)
+                    if kind is None:
+                        report['errors'].append(f'{name}: {payload}')
+                    elif kind != 'other':
+                        pending[pool.submit(validate_member, (name, kind, payload))] = (zip_path, kind)
+            except (OSError, zipfile.BadZipFile) as e:
+                report['errors'].append(f'cannot open archive: {e}')
+
+        manifests, level_numbers = {}, {}
+        for future, (zip_path, kind) in pending.items():
+            name, errors, summary = future.result()
+            reports[zip_path]['errors'] += [f'{name}: {e}' for e in errors]
+            if kind == 'manifest' and summary is not None:
+                manifests[zip_path] = summary
+            elif kind == 'level' and summary is not None:
+                level_numbers.setdefault(zip_path, {})[name] = summary['level_number']
+
+    for zip_path, report in reports.items():
+        names = report.pop('names')
+        if zip_path not in manifests:
+            if 'manifest.json' not in names:
+                report['errors'].append('manifest.json is missing')
+            continue
+        chapter_id = Path(zip_path).stem
+        errors, warnings = check_manifest(chapter_id, manifests[zip_path], names, level_numbers.get(zip_path, {}))
+        report['errors'] += [f'manifest.json: {e}' for e in errors]
+        report['warnings'] += [f'manifest.json: {w}' for w in warnings]
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate DLC chapter zips without extracting them')
+    parser.add_argument('zips', nargs='*', help='Chapter zip files')
+    parser.add_argument('--all', action='store_true', help='Validate every zip in dlc_server/dlc/chapters')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    zip_paths = list(args.zips)
+    if args.all:
+        zip_paths += sorted(str(p) for p in CHAPTERS_DIR.glob('*.zip'))
+    if not zip_paths:
+        parser.error('name at least one zip or pass --all')
+    for path in zip_paths:
+        if not os.path.isfile(path):
+            print(f'Archive not found: {path}')
+            sys.exit(2)
+
+    reports = validate_archives(zip_paths, args.workers)
+    failed = 0
+    for zip_path, report in reports.items():
+        status = 'OK' if not report['errors'] else 'FAILED'
+        print(f"{Path(zip_path).name}: {status} ({report['members']} members, "
+              f"{len(report['errors'])} error(s), {len(report['warnings'])} warning(s))")
+        for e in report['errors']:
+            print(f'  - ERROR {e}')
+        for w in report['warnings']:
+            print(f'  - warning {w}')
+        failed += bool(report['errors'])
+
+    if failed:
+        print(f'\n{failed} of {len(reports)} chapter(s) failed validation')
+        sys.exit(1)
+    print(f'\nAll {len(reports)} chapter(s) valid')
+
+
+if __name__ == '__main__':
+    main()
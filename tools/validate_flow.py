@@ -2,15 +2,16 @@
 """
 Validate a flow JSON against the experience_flow schema and check effects registry.
 Usage: python3 tools/validate_flow.py data/experience_flows/test_definition_flow.json
+To validate every content file against its schema, use tools/validate_all.py.
 """
 import json, sys
 from pathlib import Path
 from jsonschema import Draft7Validator
 
-ROOT = Path(__file__).resolve().parents[1]
+from content_index import ROOT, load_index
+from effect_validators import flow_effect_errors, load_validators
+
 SCHEMA = ROOT / 'docs' / 'schemas' / 'experience_flow.json'
-REGISTRY = ROOT / 'data' / 'effects' / 'effects_registry.json'
-DEFS_DIR = ROOT / 'data' / 'flow_step_definitions'
 
 if len(sys.argv) < 2:
     print('Usage: validate_flow.py <flow.json>')
@@ -21,9 +22,15 @@ if not flow_path.exists():
     print(f'Flow file not found: {flow_path}')
     sys.exit(2)
 
+index = load_index()
 schema = json.loads(SCHEMA.read_text())
 validator = Draft7Validator(schema)
-flow = json.loads(flow_path.read_text())
+# Flows under data/experience_flows come parsed from the index; anything else is read directly
+indexed = index.path_of('flows', flow_path.stem)
+if indexed is not None and indexed == flow_path.resolve() and flow_path.stem in index.flows:
+    flow = index.flows[flow_path.stem]
+else:
+    flow = json.loads(flow_path.read_text())
 
 # Schema validation
 errors = list(validator.iter_errors(flow))
@@ -38,7 +45,7 @@ else:
 missing_defs = []
 for i, node in enumerate(flow.get('flow', [])):
     def_id = node.get('definition_id')
-    if def_id and not (DEFS_DIR / f"{def_id}.json").exists():
+    if def_id and index.path_of('definitions', def_id) is None:
         missing_defs.append((i, def_id))
 if missing_defs:
     print('Missing flow_step_definitions for definition_id:')
@@ -47,42 +54,12 @@ if missing_defs:
 else:
     print('Definition files: OK')
 
-# registry checks
-registry = {}
-if REGISTRY.exists():
-    reg = json.loads(REGISTRY.read_text())
-    for e in reg.get('effects', []):
-        registry[e['id']] = e
-
-invalid_effects = []
-for i, node in enumerate(flow.get('flow', [])):
-    md = node.get('metadata', {})
-    effs = []
-    if isinstance(md, dict) and isinstance(md.get('effects'), list):
-        effs.extend(md['effects'])
-    if 'effect' in node:
-        effs.append(node['effect'])
-    for eff in effs:
-        if not isinstance(eff, dict) or 'type' not in eff:
-            invalid_effects.append((i, eff, 'malformed'))
-            continue
-        etype = eff['type']
-        if etype not in registry:
-            invalid_effects.append((i, eff, 'unknown_type'))
-            continue
-        # loose type checks from registry params
-        r = registry[etype]
-        params = eff.get('params', {})
-        for pkey, pdef in r.get('params', {}).items():
-            if pdef['type'] == 'number' and pkey in params and not isinstance(params[pkey], (int, float)):
-                invalid_effects.append((i, eff, f'param {pkey} expected number'))
-            if pdef['type'] == 'integer' and pkey in params and not isinstance(params[pkey], int):
-                invalid_effects.append((i, eff, f'param {pkey} expected integer'))
-
+# registry checks: validators compiled from data/effects/effects_registry.json
+invalid_effects = flow_effect_errors(flow, load_validators())
 if invalid_effects:
     print('Invalid effects found:')
-    for idx, e, reason in invalid_effects:
-        print(f' - node {idx}: reason={reason}, effect={e}')
+    for e in invalid_effects:
+        print(f" - {e['path']}: {e['message']}")
 else:
     print('Effects: OK (registry checks)')
 
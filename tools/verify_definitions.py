@@ -1,13 +1,10 @@
 #!/usr/bin/env python3
-import json
-from pathlib import Path
+from content_index import DEFS_DIR, load_index
 
-ROOT = Path(__file__).resolve().parents[1]
-DEFS_DIR = ROOT / 'data' / 'flow_step_definitions'
-FLOW_FILE = ROOT / 'data' / 'experience_flows' / 'test_definition_flow.json'
+FLOW_ID = 'test_definition_flow'
 
-with open(FLOW_FILE) as f:
-    flow = json.load(f)
+index = load_index()
+flow = index.flows[FLOW_ID]
 
 print('Verifying flow:', flow.get('experience_id'))
 
@@ -16,8 +13,8 @@ for i, node in enumerate(flow.get('flow', [])):
     def_id = node.get('definition_id')
     if def_id:
         candidate = DEFS_DIR / f"{def_id}.json"
-        if candidate.exists():
-            d = json.loads(candidate.read_text())
+        if def_id in index.definitions:
+            d = index.definitions[def_id]
             merged = dict(d)
             # inline override
             for k in node.keys():